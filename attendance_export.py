@@ -0,0 +1,242 @@
+"""Stream attendance history to CSV or JSON Lines.
+
+    python attendance_export.py --from 2025-08-25 --to 2026-06-12 -o history.csv.gz
+    python attendance_export.py --kind break --student 123456 --format jsonl -o -
+
+Every record has the same fields, so one file can hold all three kinds:
+
+    kind       attendance | break | nurse
+    date       YYYY-MM-DD (of the check-in / start)
+    student_id, name
+    start      check-in, break or visit start  (YYYY-MM-DD HH:MM:SS.ffffff)
+    end        check-out, break or visit end   (empty while open)
+    duration_minutes
+
+Rows are read in keyset pages of EXPORT_PAGE rows on a read-only
+connection: each page is its own short query that resumes after the last
+row written, so memory stays flat, the kiosk's writes are never held up by
+a long-running read, and time goes to formatting and the disk. Timestamps
+are formatted by SQLite from the stored integers instead of going through
+datetime objects. Output ending in .gz (or --gzip) is compressed. Days
+moved to term archives (StudentDatabase.archive_term) are read from the
+archive files.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from student_db import to_epoch_us
+
+EXPORT_PAGE = 5000
+FIELDS = ("kind", "date", "student_id", "name", "start", "end", "duration_minutes")
+KINDS = ("attendance", "break", "nurse")
+
+
+def _timestamp(column):
+    """SQL formatting a stored timestamp as 'YYYY-MM-DD HH:MM:SS.ffffff' ('' for NULL).
+
+    SQLite formats several times faster than datetime objects in Python.
+    """
+    return (f"COALESCE(strftime('%Y-%m-%d %H:%M:%S', {column} / 1000000, 'unixepoch', 'localtime')"
+            f" || printf('.%06d', {column} % 1000000), '')")
+
+
+# Each row is a record in FIELDS order followed by the keyset the next page resumes
+# after: (date, student_key) for attendance, which the unique index orders, and
+# (start, id) for breaks and visits.
+# The keyset is the only lower bound so SQLite seeks to it instead of rescanning the range.
+# {schema} is 'main' or an attached term archive.
+_QUERIES = {
+    "attendance": f"""
+        SELECT 'attendance', a.date, s.student_id, s.name,
+               {_timestamp('a.check_in')}, {_timestamp('a.check_out')}, '',
+               a.date, a.student_key
+        FROM {{schema}}.attendance a JOIN {{schema}}.students s ON s.student_key = a.student_key
+        WHERE (a.date, a.student_key) > (?, ?) AND a.date < ? {{students}}
+        ORDER BY a.date, a.student_key
+        LIMIT ?
+    """,
+    "break": f"""
+        SELECT 'break', date(b.break_start / 1000000, 'unixepoch', 'localtime'), s.student_id, s.name,
+               {_timestamp('b.break_start')}, {_timestamp('b.break_end')}, COALESCE(b.duration_minutes, ''),
+               b.break_start, b.id
+        FROM {{schema}}.bathroom_breaks b JOIN {{schema}}.students s ON s.student_key = b.student_key
+        WHERE (b.break_start, b.id) > (?, ?) AND b.break_start < ? {{students}}
+        ORDER BY b.break_start, b.id
+        LIMIT ?
+    """,
+    "nurse": f"""
+        SELECT 'nurse', date(n.visit_start / 1000000, 'unixepoch', 'localtime'), s.student_id, s.name,
+               {_timestamp('n.visit_start')}, {_timestamp('n.visit_end')}, COALESCE(n.duration_minutes, ''),
+               n.visit_start, n.id
+        FROM {{schema}}.nurse_visits n JOIN {{schema}}.students s ON s.student_key = n.student_key
+        WHERE (n.visit_start, n.id) > (?, ?) AND n.visit_start < ? {{students}}
+        ORDER BY n.visit_start, n.id
+        LIMIT ?
+    """,
+}
+_STUDENT_COLUMN = {"attendance": "a.student_key", "break": "b.student_key", "nurse": "n.student_key"}
+
+
+def open_readonly(db_name):
+    """Open the database for reading only, without the datetime converters"""
+    return sqlite3.connect(f"file:{db_name}?mode=ro", uri=True)
+
+
+def attach_archives(conn, db_name, start=None, end=None):
+    """Attach (read-only) the term archives holding any of dates start..end.
+
+    Returns the schemas to export from, oldest first, ending with 'main'.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archives'").fetchone():
+        return ["main"]
+    archives = conn.execute(
+        "SELECT path FROM archives WHERE first_date <= ? AND last_date >= ? ORDER BY first_date",
+        ((end or date.max).isoformat(), (start or date.min).isoformat())).fetchall()
+    schemas = []
+    for number, (path,) in enumerate(archives, 1):
+        path = os.path.join(os.path.dirname(os.path.abspath(db_name)), path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Archive {path} is missing")
+        conn.execute(f"ATTACH DATABASE ? AS archive_{number}", (f"file:{path}?mode=ro",))
+        schemas.append(f"archive_{number}")
+    return schemas + ["main"]
+
+
+def student_keys(conn, identifiers):
+    """Resolve student_ids / NFC UIDs to student keys (unknown ones are skipped)"""
+    keys = []
+    for identifier in identifiers:
+        row = conn.execute("SELECT student_key FROM students WHERE id = ? OR student_id = ?",
+                           (identifier, identifier)).fetchone()
+        if row:
+            keys.append(row[0])
+    return keys
+
+
+def iter_pages(conn, kinds=KINDS, start=None, end=None, keys=None, page=EXPORT_PAGE, schemas=("main",)):
+    """Yield lists of export records (tuples in FIELDS order) for dates start..end inclusive.
+
+    keys limits the export to those student keys; None exports everyone.
+    Each kind is read from every schema in turn (see attach_archives).
+    """
+    first_day = start or date.min
+    after_last = (end or date.max - timedelta(days=1)) + timedelta(days=1)
+    students = ""
+    key_params = ()
+    if keys is not None:
+        if not keys:
+            return
+        key_params = tuple(keys)
+    for kind in kinds:
+        if keys is not None:
+            students = f"AND {_STUDENT_COLUMN[kind]} IN ({', '.join('?' * len(keys))})"
+        for schema in schemas:
+            sql = _QUERIES[kind].format(schema=schema, students=students)
+            if kind == "attendance":
+                cursor_position, high = (first_day.isoformat(), -1), after_last.isoformat()
+            else:
+                low = to_epoch_us(datetime.combine(start, datetime.min.time())) if start else -2 ** 63
+                high = to_epoch_us(datetime.combine(after_last, datetime.min.time())) if end else 2 ** 63 - 1
+                cursor_position = (low, -1)
+            while True:
+                rows = conn.execute(sql, (*cursor_position, high, *key_params, page)).fetchall()
+                if rows:
+                    yield [row[:-2] for row in rows]
+                if len(rows) < page:
+                    break
+                cursor_position = rows[-1][-2:]
+
+
+def iter_records(conn, kinds=KINDS, start=None, end=None, keys=None, schemas=("main",)):
+    """Yield export records one at a time (see iter_pages)"""
+    for records in iter_pages(conn, kinds, start, end, keys, schemas=schemas):
+        yield from records
+
+
+def write_csv(pages, out):
+    writer = csv.writer(out)
+    writer.writerow(FIELDS)
+    count = 0
+    for records in pages:
+        writer.writerows(records)
+        count += len(records)
+    return count
+
+
+def write_jsonl(pages, out):
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    count = 0
+    for records in pages:
+        out.write("".join([encode(dict(zip(FIELDS, record))) + "\n" for record in records]))
+        count += len(records)
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def export(db_name, output, fmt=None, kinds=KINDS, start=None, end=None, students=None, compress=None):
+    """Export records to a file path ('-' for stdout); returns the number of records written.
+
+    fmt defaults to jsonl for a .jsonl/.ndjson output and csv otherwise;
+    compress defaults to whether output ends in .gz.
+    """
+    if fmt is None:
+        fmt = "jsonl" if ".jsonl" in output or ".ndjson" in output else "csv"
+    if compress is None:
+        compress = output.endswith(".gz")
+    conn = open_readonly(db_name)
+    try:
+        keys = student_keys(conn, students) if students else None
+        schemas = attach_archives(conn, db_name, start, end)
+        pages = iter_pages(conn, kinds, start, end, keys, schemas=schemas)
+        if output == "-":
+            if compress:
+                with gzip.open(sys.stdout.buffer, "wt", newline="", encoding="utf-8") as out:
+                    return WRITERS[fmt](pages, out)
+            return WRITERS[fmt](pages, sys.stdout)
+        if compress:
+            # Level 6 keeps gzip close to disk speed; 9 costs far more CPU for little gain
+            with gzip.open(output, "wt", compresslevel=6, newline="", encoding="utf-8") as out:
+                return WRITERS[fmt](pages, out)
+        with open(output, "w", newline="", encoding="utf-8", buffering=io.DEFAULT_BUFFER_SIZE * 16) as out:
+            return WRITERS[fmt](pages, out)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export attendance, break and nurse history")
+    parser.add_argument("--db", default="student_attendance.db")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None,
+                        help="first date (YYYY-MM-DD, default: the beginning)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None,
+                        help="last date, inclusive (default: today and after)")
+    parser.add_argument("--kind", choices=KINDS + ("all",), default="all")
+    parser.add_argument("--student", action="append", default=None,
+                        help="student_id or NFC UID to include (repeatable; default everyone)")
+    parser.add_argument("--format", choices=sorted(WRITERS), default=None,
+                        help="default: jsonl for a .jsonl/.ndjson output, else csv")
+    parser.add_argument("--gzip", action="store_true", default=None, help="compress (implied by a .gz output)")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout (default)")
+    args = parser.parse_args(argv)
+
+    kinds = KINDS if args.kind == "all" else (args.kind,)
+    started = time.perf_counter()
+    count = export(args.db, args.output, args.format, kinds, args.start, args.end, args.student, args.gzip)
+    if args.output != "-":
+        print(f"{count} records written to {args.output} in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,777 @@
+"""Share one attendance database between many kiosks over TCP.
+
+Several kiosks pointing StudentDatabase at one file on a network share fight
+over SQLite's file locks. Instead one AttendanceServer process owns the
+database and the kiosks talk to it with RemoteStudentDatabase, which has the
+same methods as StudentDatabase:
+
+    export ATTENDANCE_SERVER_TOKEN=...    # the same secret on the server and every kiosk
+    python attendance_server.py serve --db student_attendance.db --host 0.0.0.0 --port 8765
+    python nfc_reader_gui.py --server attendance-host:8765
+
+The server listens on 127.0.0.1 unless given another --host, and then only
+with a shared token (--token or $ATTENDANCE_SERVER_TOKEN): every request
+must carry it, or it is refused before any method runs.
+
+The protocol is newline-delimited JSON, one object per line. A request is
+
+    {"id": 7, "method": "check_in", "args": ["04A1B2C3"], "kwargs": {}, "event_id": "...", "token": "..."}
+
+and is answered by {"id": 7, "result": ...} or {"id": 7, "error": "..."}.
+Several requests can be sent in one {"id": 8, "batch": [...]} message,
+answered by {"id": 8, "results": [...]}; a batch's writes commit in one
+transaction (StudentDatabase.batch), so a burst of taps costs one fsync.
+Clients may pipeline: send any number of requests before reading the
+replies, which come back in order.
+Datetimes travel as {"$datetime": iso} and dates as {"$date": iso}.
+
+Writes carry a client-generated event_id; the server applies each event at
+most once (StudentDatabase.settle_event), so a client that lost a reply can
+simply resend. Their replies also carry "settled": false when the write
+failed and the event may be sent again, true once it applied or was
+rejected. Every change the database announces goes into a numbered
+change feed that clients poll, so a dashboard on one kiosk sees taps made
+at another. tests/test_attendance_server.py runs a server on localhost
+against several clients.
+"""
+
+import argparse
+import hmac
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, datetime, timedelta
+
+from student_db import IMPORT_BATCH_SIZE, KEEP_EVENTS_DAYS, SEARCH_LIMIT, SYNC_INTERVAL, StudentDatabase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+READ_CHUNK = 65536
+MAX_MESSAGE = 16 * 1024 * 1024   # bytes in one request line (a batch of imported rows fits)
+CHANGE_LOG = 10000               # changes kept for clients to poll
+CLIENT_TIMEOUT = 10.0            # seconds a client waits for a reply
+TOKEN_ENV = "ATTENDANCE_SERVER_TOKEN"   # shared secret, when not given explicitly
+OFFLINE_MESSAGE = "Saved; it will be sent when the attendance server is back"
+
+# Methods that change the database; each call is applied once per event_id
+WRITE_METHODS = {
+    'add_student', 'check_in', 'check_out', 'start_bathroom_break', 'end_bathroom_break',
+    'start_nurse_visit', 'end_nurse_visit', 'auto_checkout_students', 'import_students',
+}
+READ_METHODS = {
+    'get_today_attendance', 'get_today_breaks', 'get_today_nurse_visits',
+    'is_checked_in', 'is_on_break', 'is_at_nurse',
+    'summary_by_student', 'summary_by_day', 'student_days', 'school_days', 'archives',
+    'search_students',
+}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return date.fromisoformat(obj["$date"])
+    return obj
+
+
+def encode_message(message):
+    """Return one protocol line for a message"""
+    return (json.dumps(message, default=_encode, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+def decode_message(line):
+    return json.loads(line, object_hook=_decode)
+
+
+def is_loopback(host):
+    """Whether host only accepts connections from this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        return False
+
+
+def parse_address(address, default_port=DEFAULT_PORT):
+    """Split 'host:port' (or just 'host') into (host, port)"""
+    host, _, port = address.rpartition(':')
+    if not host:
+        return port, default_port
+    return host.strip('[]'), int(port)
+
+
+class RemoteError(RuntimeError):
+    """The server could not carry out a request"""
+
+
+class _Connection:
+    """Buffers for one client socket"""
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+
+
+class AttendanceServer:
+    """Serve one StudentDatabase to many clients from a single selector loop.
+
+    The socket is bound on construction (port 0 picks a free one, see
+    .address); the database is opened by serve_forever(), on the thread
+    that serves it, because SQLite connections stay on their thread.
+    With a token, requests without it are refused; one is required to
+    listen on anything but a loopback address.
+    """
+
+    def __init__(self, db_name="student_attendance.db", host="127.0.0.1", port=DEFAULT_PORT,
+                 keep_events_days=KEEP_EVENTS_DAYS, token=None):
+        if not token and not is_loopback(host):
+            raise ValueError(f"Listening on {host} needs a token")
+        self.db_name = db_name
+        self.keep_events_days = keep_events_days
+        self._token = token.encode('utf-8') if token else None
+        self.db = None
+        self.requests = 0
+        self.instance = uuid.uuid4().hex   # lets clients notice a restart (the change feed starts over)
+        self._changes = deque(maxlen=CHANGE_LOG)
+        self._change_seq = 0
+        self._running = False
+        self._listener = socket.create_server((host, port))
+        self._listener.setblocking(False)
+        self.address = self._listener.getsockname()[:2]
+        self._wake_receiver, self._wake_sender = socket.socketpair()
+        self._wake_receiver.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ, "accept")
+        self._selector.register(self._wake_receiver, selectors.EVENT_READ, "wake")
+        self._queries = {
+            'roster': self._roster,
+            'changes': self._changes_since,
+        }
+
+    def serve_forever(self):
+        """Open the database and answer requests until stop() is called"""
+        self.db = StudentDatabase(self.db_name)
+        self.db.add_listener(self._record_change)
+        pruned = self.db.prune_events(datetime.now() - timedelta(days=self.keep_events_days))
+        logger.info("Serving %s on %s:%d (%d old event IDs pruned)", self.db_name, *self.address, pruned)
+        self._running = True
+        try:
+            while self._running:
+                for key, mask in self._selector.select():
+                    if key.data == "accept":
+                        self._accept()
+                    elif key.data == "wake":
+                        self._drain_wake()
+                    else:
+                        if mask & selectors.EVENT_READ:
+                            self._read(key.data)
+                        if mask & selectors.EVENT_WRITE and key.data.sock.fileno() != -1:
+                            self._flush(key.data)
+        finally:
+            for key in list(self._selector.get_map().values()):
+                if isinstance(key.data, _Connection):
+                    self._close(key.data)
+            self._selector.close()
+            self._listener.close()
+            self._wake_receiver.close()
+            self._wake_sender.close()
+            self.db.close()
+
+    def start(self):
+        """Serve on a daemon thread; returns the thread"""
+        thread = threading.Thread(target=self.serve_forever, name="attendance-server", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Ask serve_forever() to return (safe from any thread)"""
+        self._running = False
+        try:
+            self._wake_sender.send(b'\0')
+        except OSError:
+            pass
+
+    def _drain_wake(self):
+        try:
+            while self._wake_receiver.recv(256):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _accept(self):
+        try:
+            sock, address = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._selector.register(sock, selectors.EVENT_READ, _Connection(sock, address))
+        logger.debug("Client %s connected", address)
+
+    def _close(self, connection):
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+        logger.debug("Client %s disconnected", connection.address)
+
+    def _read(self, connection):
+        try:
+            data = connection.sock.recv(READ_CHUNK)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(connection)
+            return
+        connection.inbox += data
+        # Answer every complete line that arrived; the replies go out together
+        while True:
+            end = connection.inbox.find(b'\n')
+            if end < 0:
+                break
+            line = bytes(connection.inbox[:end])
+            del connection.inbox[:end + 1]
+            connection.outbox += encode_message(self._handle(line))
+        if len(connection.inbox) > MAX_MESSAGE:
+            logger.warning("Dropping %s: request larger than %d bytes", connection.address, MAX_MESSAGE)
+            self._close(connection)
+            return
+        self._flush(connection)
+
+    def _flush(self, connection):
+        if connection.outbox:
+            try:
+                sent = connection.sock.send(connection.outbox)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                self._close(connection)
+                return
+            del connection.outbox[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if connection.outbox else 0)
+        self._selector.modify(connection.sock, events, connection)
+
+    def _handle(self, line):
+        """Return the reply to one request line"""
+        try:
+            message = decode_message(line)
+        except ValueError as e:
+            return {"id": None, "error": f"Malformed request: {e}"}
+        if not isinstance(message, dict):
+            return {"id": None, "error": "A request must be a JSON object"}
+        if self._token is not None and not hmac.compare_digest(
+                str(message.get("token", "")).encode('utf-8'), self._token):
+            return {"id": message.get("id"), "error": "Not authorized: missing or wrong token"}
+        if "batch" in message:
+            try:
+                with self.db.batch():
+                    results = [self._call(request) for request in message["batch"]]
+            except Exception as e:
+                logger.exception("Batch failed to commit")
+                return {"id": message.get("id"), "error": f"{type(e).__name__}: {e}"}
+            return {"id": message.get("id"), "results": results}
+        reply = self._call(message)
+        reply["id"] = message.get("id")
+        return reply
+
+    def _call(self, request):
+        self.requests += 1
+        method = request.get("method")
+        args = request.get("args") or []
+        kwargs = request.get("kwargs") or {}
+        try:
+            if method in WRITE_METHODS:
+                event_id = request.get("event_id")
+                if event_id:
+                    result, settled = self.db.settle_event(event_id, method, *args, **kwargs)
+                    return {"result": result, "settled": settled}
+                else:
+                    result = getattr(self.db, method)(*args, **kwargs)
+            elif method in READ_METHODS:
+                result = getattr(self.db, method)(*args, **kwargs)
+            elif method in self._queries:
+                result = self._queries[method](*args, **kwargs)
+            else:
+                return {"error": f"Unknown method {method!r}"}
+        except Exception as e:
+            logger.exception("Request %s failed", method)
+            return {"error": f"{type(e).__name__}: {e}"}
+        return {"result": result}
+
+    def _record_change(self, kind, details):
+        self._change_seq += 1
+        self._changes.append((self._change_seq, kind, details))
+
+    def _changes_since(self, since=None):
+        """Changes after sequence number since; complete=False if some were already dropped"""
+        reply = {"server": self.instance, "seq": self._change_seq, "changes": [], "complete": True}
+        if since is None:
+            return reply
+        oldest = self._changes[0][0] if self._changes else self._change_seq + 1
+        reply["complete"] = since >= oldest - 1 and since <= self._change_seq
+        if reply["complete"]:
+            reply["changes"] = [change for change in self._changes if change[0] > since]
+        return reply
+
+    def _roster(self, since=0):
+        """Students with a key above since, plus the roster version"""
+        version, students = self.db.roster_since(since)
+        return {"version": version, "students": students}
+
+
+class RemoteStudentDatabase:
+    """StudentDatabase's interface, served by an AttendanceServer.
+
+    The roster is cached locally, as StudentDatabase does, so identifier
+    lookups never leave the kiosk; everything else is a request. Each write
+    is sent with a fresh event ID together with a poll of the change feed
+    (one round trip), so listeners hear about this kiosk's change and
+    anything other kiosks did since the last poll. If the connection drops,
+    the requests are resent once on a new connection; the event IDs make
+    that safe. Writes that still fail return the same (False, message)
+    their local versions return for a database error.
+
+    With a journal (tap_journal.TapJournal), taps by known students are
+    appended to it first and sent with every earlier record the server has
+    not acknowledged, so taps made while the server is down are kept,
+    reported as accepted, and delivered, with their original times and
+    event IDs, once it is back.
+
+    token is the server's shared secret, by default $ATTENDANCE_SERVER_TOKEN.
+    """
+
+    import_from_csv = StudentDatabase.import_from_csv
+    import_from_json = StudentDatabase.import_from_json
+
+    def __init__(self, address, timeout=CLIENT_TIMEOUT, journal=None, token=None):
+        self.address = address
+        self.db_name = address
+        self.timeout = timeout
+        self.token = token or os.environ.get(TOKEN_ENV)
+        self._host, self._port = parse_address(address)
+        self._sock = None
+        self._buffer = bytearray()
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._students = {}
+        self._key_by_uid = {}
+        self._key_by_student_id = {}
+        self._max_key = 0
+        self._roster_version = None
+        self._server = None
+        self._change_seq = None
+        self._synced_at = 0.0
+        self._listeners = []
+        self.journal = journal
+        self.load_roster()
+        if journal is not None:
+            self._send_journal_quietly()
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def __del__(self):
+        self.close()
+
+    # --- transport ---
+
+    def _connect(self):
+        self._sock = socket.create_connection((self._host, self._port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = bytearray()
+
+    def _exchange(self, messages):
+        """Send messages back to back, then return their replies in order"""
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    for message in messages:
+                        message["id"] = next(self._ids)
+                        if self.token:
+                            message["token"] = self.token
+                    self._sock.sendall(b''.join(encode_message(message) for message in messages))
+                    replies = {}
+                    while len(replies) < len(messages):
+                        reply = self._receive()
+                        replies[reply.get("id")] = reply
+                    return [replies[message["id"]] for message in messages]
+                except OSError as e:
+                    self.close()
+                    if attempt == 2:
+                        raise ConnectionError(f"Attendance server {self.address} unreachable: {e}") from e
+                    logger.warning("Lost connection to %s (%s); resending", self.address, e)
+
+    def _receive(self):
+        while True:
+            end = self._buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self._buffer[:end])
+                del self._buffer[:end + 1]
+                return decode_message(line)
+            data = self._sock.recv(READ_CHUNK)
+            if not data:
+                raise ConnectionResetError("server closed the connection")
+            self._buffer += data
+
+    @staticmethod
+    def _result(reply):
+        if "error" in reply:
+            raise RemoteError(reply["error"])
+        return reply["result"]
+
+    def call(self, method, *args, **kwargs):
+        """Run one server method and return its result"""
+        return self._result(self._exchange([{"method": method, "args": args, "kwargs": kwargs}])[0])
+
+    def call_many(self, calls):
+        """Pipeline [(method, args, kwargs)] in one round trip; return their results in order"""
+        replies = self._exchange([{"method": method, "args": args, "kwargs": kwargs}
+                                  for method, args, kwargs in calls])
+        return [self._result(reply) for reply in replies]
+
+    def submit_events(self, events):
+        """Send [(method, args, kwargs, event_id)] writes as one batch and return their results.
+
+        event_id may be None for a fresh one; pass the same ID again to
+        resend an event whose outcome is unknown. A change-feed poll rides
+        along, and listeners are told about the changes before this returns.
+        """
+        return [self._result(reply) for reply in self._submit_batch(events)]
+
+    def _submit_batch(self, events):
+        """submit_events, returning each event's reply ({"result", "settled"} or {"error"})"""
+        batch = [{"method": method, "args": args, "kwargs": kwargs, "event_id": event_id or uuid.uuid4().hex}
+                 for method, args, kwargs, event_id in events]
+        reply, changes = self._exchange([{"batch": batch}, self._changes_request()])
+        self._apply_changes(self._result(changes))
+        if "error" in reply:
+            raise RemoteError(reply["error"])
+        return reply["results"]
+
+    def _submit(self, method, *args, **kwargs):
+        """One write; a server that cannot be reached reads as a failed write"""
+        try:
+            result = self.submit_events([(method, args, kwargs, None)])[0]
+        except (ConnectionError, RemoteError) as e:
+            return False, str(e)
+        return tuple(result) if isinstance(result, list) else result
+
+    def _tap(self, method, kwargs, at=None):
+        """A check-in, break or visit write, through the journal if there is one"""
+        if self.journal is None:
+            return self._submit(method, **kwargs, **({"at": at} if at else {}))
+        identifier = kwargs.get("nfc_uid") or kwargs.get("student_id") or kwargs.get("identifier")
+        if self.key_for(identifier) is None:
+            return False, "Student not found in database"
+        record = self.journal.append(method, kwargs, at)
+        try:
+            result = self._send_journal().get(record.event_id)
+        except (ConnectionError, RemoteError) as e:
+            logger.warning("Journaled %s for %s: %s", method, identifier, e)
+            result = None
+        if result is None:
+            return True, OFFLINE_MESSAGE
+        return tuple(result) if isinstance(result, list) else result
+
+    def _send_journal(self):
+        """Send every journal record not yet acknowledged as one batch; returns {event_id: result}.
+
+        Only records the server settled (applied or rejected) are marked
+        applied; one whose write failed there is kept, resent with the next
+        batch, and has no result here.
+        """
+        records = list(self.journal.pending())
+        if not records:
+            return {}
+        replies = self._submit_batch([(record.method, (), dict(record.kwargs, at=record.at), record.event_id)
+                                      for record in records])
+        results = {}
+        for record, reply in zip(records, replies):
+            if "error" in reply or not reply.get("settled"):
+                logger.warning("Server could not apply journaled %s %s; keeping it: %s",
+                               record.method, record.kwargs, reply.get("error", reply.get("result")))
+                continue
+            self.journal.mark_applied(record)
+            results[record.event_id] = reply["result"]
+        return results
+
+    def _send_journal_quietly(self):
+        try:
+            sent = self._send_journal()
+        except (ConnectionError, RemoteError) as e:
+            logger.warning("Journaled taps not sent yet: %s", e)
+            return
+        if sent:
+            logger.info("Sent %d journaled taps to %s", len(sent), self.address)
+
+    # --- roster and change feed ---
+
+    def _changes_request(self):
+        return {"method": "changes", "args": [self._change_seq]}
+
+    def load_roster(self):
+        """(Re)load the roster cache from the server"""
+        roster, changes = self.call_many([("roster", (0,), {}), ("changes", (None,), {})])
+        with self._lock:
+            self._students = {}
+            self._key_by_uid = {}
+            self._key_by_student_id = {}
+            self._max_key = 0
+            self._cache_students(roster)
+            self._server = changes["server"]
+            self._change_seq = changes["seq"]
+            self._synced_at = time.monotonic()
+        self._notify('roster_reloaded')
+
+    def load_day_state(self):
+        """The server keeps the day state; just tell listeners to reload"""
+        self._notify('day_reloaded')
+
+    def _cache_students(self, roster):
+        for key, nfc_uid, student_id, name in roster["students"]:
+            self._students[key] = (nfc_uid, student_id, name)
+            if nfc_uid:
+                self._key_by_uid[nfc_uid] = key
+            self._key_by_student_id[student_id] = key
+            self._max_key = max(self._max_key, key)
+        self._roster_version = roster["version"]
+
+    def _sync(self):
+        """Poll the change feed (at most every SYNC_INTERVAL)"""
+        if time.monotonic() - self._synced_at < SYNC_INTERVAL:
+            return
+        if self.journal is not None:
+            self._send_journal_quietly()
+        try:
+            self._apply_changes(self.call("changes", self._change_seq))
+        except (ConnectionError, RemoteError) as e:
+            logger.warning("Could not poll %s for changes: %s", self.address, e)
+
+    def _apply_changes(self, feed):
+        """Bring the roster cache up to date with a change-feed reply, then notify listeners"""
+        self._synced_at = time.monotonic()
+        if feed["server"] != self._server or not feed["complete"]:
+            # Restarted server or too far behind: start over
+            self.load_roster()
+            self._notify('day_reloaded')
+            return
+        self._change_seq = max(self._change_seq, feed["seq"])
+        kinds = {kind for _, kind, _ in feed["changes"]}
+        if 'roster_reloaded' in kinds:
+            roster = self.call("roster", 0)
+            with self._lock:
+                self._students, self._key_by_uid, self._key_by_student_id, self._max_key = {}, {}, {}, 0
+                self._cache_students(roster)
+        elif 'student_added' in kinds:
+            roster = self.call("roster", self._max_key)
+            with self._lock:
+                self._cache_students(roster)
+        for _, kind, details in feed["changes"]:
+            self._notify(kind, **details)
+
+    def add_listener(self, callback):
+        """Register callback(kind, details), as for StudentDatabase.add_listener.
+
+        Changes made at any kiosk are delivered, on the thread that made a
+        request, when this client next polls the change feed.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, kind, **details):
+        for callback in list(self._listeners):
+            callback(kind, details)
+
+    def key_for(self, identifier):
+        """Return the student_key for an NFC UID or student_id from the cache, or None"""
+        key = self._key_by_uid.get(identifier)
+        if key is None:
+            key = self._key_by_student_id.get(identifier)
+        return key
+
+    def student_by_key(self, key):
+        """Return (nfc_uid, student_id, name) for a student_key from the cache, or None"""
+        return self._students.get(key)
+
+    def student_for(self, identifier):
+        """Return (nfc_uid, student_id, name) for an NFC UID or student_id from the cache, or None"""
+        return self._students.get(self.key_for(identifier))
+
+    def roster_since(self, key=0):
+        """Return (roster version, [(student_key, nfc_uid, student_id, name)] for keys above key) from the cache"""
+        self._sync()
+        return self._roster_version, [(k, *student) for k, student in self._students.items() if k > key]
+
+    def get_student_by_uid(self, nfc_uid):
+        """Get student information by NFC UID"""
+        self._sync()
+        student = self._students.get(self._key_by_uid.get(nfc_uid))
+        return (student[1], student[2]) if student else None
+
+    def get_student_by_student_id(self, student_id):
+        """Get student information by school student_id"""
+        self._sync()
+        student = self._students.get(self._key_by_student_id.get(student_id))
+        return (student[0], student[2]) if student else None
+
+    def get_identifier(self, nfc_uid=None, student_id=None):
+        """Return the identifier to use for attendance/breaks: NFC UID if present, else student_id."""
+        return nfc_uid or student_id or None
+
+    # --- reads ---
+
+    def is_checked_in(self, identifier):
+        return self.call("is_checked_in", identifier)
+
+    def is_on_break(self, identifier):
+        return self.call("is_on_break", identifier)
+
+    def is_at_nurse(self, identifier):
+        return self.call("is_at_nurse", identifier)
+
+    def get_today_attendance(self):
+        return [tuple(row) for row in self.call("get_today_attendance")]
+
+    def get_today_breaks(self):
+        return [tuple(row) for row in self.call("get_today_breaks")]
+
+    def get_today_nurse_visits(self):
+        return [tuple(row) for row in self.call("get_today_nurse_visits")]
+
+    def summary_by_student(self, start, end, identifier=None):
+        return [tuple(row) for row in self.call("summary_by_student", start, end, identifier)]
+
+    def summary_by_day(self, start, end):
+        return [tuple(row) for row in self.call("summary_by_day", start, end)]
+
+    def student_days(self, identifier, start, end):
+        return [tuple(row) for row in self.call("student_days", identifier, start, end)]
+
+    def school_days(self, start, end):
+        return self.call("school_days", start, end)
+
+    def archives(self):
+        return [tuple(row) for row in self.call("archives")]
+
+    def search_students(self, text, limit=SEARCH_LIMIT):
+        return [tuple(row) for row in self.call("search_students", text, limit)]
+
+    # --- writes ---
+
+    def add_student(self, nfc_uid, student_id, name):
+        return self._submit("add_student", nfc_uid, student_id, name) is True
+
+    def check_in(self, nfc_uid=None, student_id=None, at=None):
+        return self._tap("check_in", {"nfc_uid": nfc_uid, "student_id": student_id}, at)
+
+    def check_out(self, student_id, at=None):
+        return self._tap("check_out", {"student_id": student_id}, at)
+
+    def start_bathroom_break(self, identifier, at=None):
+        return self._tap("start_bathroom_break", {"identifier": identifier}, at)
+
+    def end_bathroom_break(self, identifier, at=None):
+        return self._tap("end_bathroom_break", {"identifier": identifier}, at)
+
+    def start_nurse_visit(self, nfc_uid=None, student_id=None, at=None):
+        return self._tap("start_nurse_visit", {"nfc_uid": nfc_uid, "student_id": student_id}, at)
+
+    def end_nurse_visit(self, nfc_uid=None, student_id=None, at=None):
+        return self._tap("end_nurse_visit", {"nfc_uid": nfc_uid, "student_id": student_id}, at)
+
+    def auto_checkout_students(self):
+        result = self._submit("auto_checkout_students")
+        if result and result[0] is False:
+            logger.warning("Auto-checkout failed: %s", result[1])
+            return 0, 0, 0
+        return result
+
+    def import_students(self, students, upsert=False, progress=None, fraction=None, labels=("object", "student")):
+        """Send an iterable of student mappings to the server IMPORT_BATCH_SIZE rows per event.
+
+        Each batch is its own transaction on the server; the results of all
+        batches are added up into one {"success", "failed", "updated", "errors"}.
+        """
+        results = {"success": 0, "failed": 0, "updated": 0, "errors": []}
+        rows = 0
+        batch = []
+        for student in itertools.chain(students, [None]):
+            if student is not None:
+                batch.append(dict(student))
+                rows += 1
+                if len(batch) < IMPORT_BATCH_SIZE:
+                    continue
+            if batch:
+                part = self.submit_events([("import_students", (batch, upsert), {"labels": labels}, None)])[0]
+                for name in ("success", "failed", "updated"):
+                    results[name] += part[name]
+                results["errors"].extend(part["errors"])
+                batch = []
+            if progress:
+                progress(rows, 1.0 if student is None else fraction() if fraction else 0.0)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance database server for several kiosks")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="serve a database")
+    serve.add_argument("--db", default="student_attendance.db")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="address to listen on (default %(default)s; 0.0.0.0 for every interface, "
+                            "which needs a token)")
+    serve.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                       help=f"shared secret every request must carry (default ${TOKEN_ENV})")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--keep-events-days", type=int, default=KEEP_EVENTS_DAYS,
+                       help="how long processed event IDs are remembered (default %(default)s)")
+    args = parser.parse_args(argv)
+    if not args.token and not is_loopback(args.host):
+        parser.error(f"listening on {args.host} needs --token or ${TOKEN_ENV}")
+    logging.basicConfig(level=getattr(logging, args.log_level),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    server = AttendanceServer(args.db, args.host, args.port, args.keep_events_days, args.token)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Bell schedules loaded from bell_schedules.json.
+
+The file holds any number of named schedules and a calendar that says which
+one applies on a given date::
+
+    {
+      "default": "regular",
+      "schedules": {
+        "regular":       [[1, "07:25", "08:08"], ["HR", "08:55", "09:01"], ...],
+        "early_release": [...]
+      },
+      "calendar": {"2025-11-26": "early_release", "2025-12-24": null},
+      "rotation": {"anchor": "2025-08-25", "schedules": ["a_day", "b_day"]}
+    }
+
+A date listed in ``calendar`` uses that schedule (null means no school). If
+``rotation`` is present, other weekdays cycle through its schedules (A/B
+days), counting school days from ``anchor`` and skipping the no-school dates.
+Every remaining day uses ``default``.
+
+Each schedule is compiled once into per-minute lookup tables, so finding the
+period for a time is two list indexes rather than a scan. Because the
+schedule is picked by date, lookups for past dates use the schedule that was
+in effect on that day.
+"""
+
+import bisect
+import json
+import os
+from datetime import date, datetime, time, timedelta
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bell_schedules.json')
+
+MINUTES_PER_DAY = 24 * 60
+
+# Used when no config file exists (the original single schedule)
+DEFAULT_PERIODS = [
+    (1, time(7, 25), time(8, 8)),
+    (2, time(8, 12), time(8, 55)),
+    ('HR', time(8, 55), time(9, 1)),
+    (3, time(9, 5), time(9, 48)),
+    (4, time(9, 52), time(10, 35)),
+    (5, time(10, 39), time(11, 22)),
+    (6, time(11, 26), time(12, 9)),
+    (7, time(12, 13), time(12, 56)),
+    (8, time(13, 0), time(13, 43)),
+    (9, time(13, 47), time(14, 30)),
+]
+
+
+class BellSchedule:
+    """One day's periods, compiled into minute-of-day lookup tables.
+
+    A time is in a period when start <= time <= end, and when periods touch
+    the one listed first wins, exactly as the old linear scan behaved. The
+    end bound is inclusive only at hh:mm:00 sharp, so there are two tables:
+    one for the instant a minute begins and one for the rest of that minute.
+    """
+
+    def __init__(self, name, periods):
+        self.name = name
+        self.periods = list(periods)
+        self.ends = sorted(end for _, _, end in self.periods)
+        self.first_bell = min((start for _, start, _ in self.periods), default=None)
+        self._at_minute = [None] * MINUTES_PER_DAY      # time == hh:mm:00
+        self._in_minute = [None] * MINUTES_PER_DAY      # hh:mm:00 < time < hh:mm+1:00
+        for period, start, end in reversed(self.periods):
+            if end < start:
+                raise ValueError(f"Period {period} of schedule {name!r} ends before it starts")
+            entry = (period, end)
+            first = _minute(start) + (1 if start.second or start.microsecond else 0)
+            for minute in range(first, _minute(end) + 1):
+                self._at_minute[minute] = entry
+            for minute in range(_minute(start), _minute(end)):
+                self._in_minute[minute] = entry
+
+    def period_at(self, t):
+        """Return (period, end time) for a time of day, or (None, None)"""
+        minute = t.hour * 60 + t.minute
+        if t.second or t.microsecond:
+            entry = self._in_minute[minute]
+        else:
+            entry = self._at_minute[minute]
+        return entry or (None, None)
+
+    def __repr__(self):
+        return f"BellSchedule({self.name!r}, {len(self.periods)} periods)"
+
+
+NO_SCHOOL = BellSchedule(None, [])
+
+
+class BellCalendar:
+    """Named schedules plus the rules that pick one for each date"""
+
+    def __init__(self, schedules, default, calendar=None, rotation=None):
+        self.schedules = schedules
+        self.default = schedules[default]
+        self.calendar = {}
+        for day, name in (calendar or {}).items():
+            if name is not None and name not in schedules:
+                raise ValueError(f"Calendar entry {day} uses unknown schedule {name!r}")
+            self.calendar[day] = schedules[name] if name is not None else NO_SCHOOL
+        self.rotation = None
+        if rotation:
+            anchor, names = rotation
+            for name in names:
+                if name not in schedules:
+                    raise ValueError(f"Rotation uses unknown schedule {name!r}")
+            self.rotation = (anchor, [schedules[name] for name in names])
+        # Weekdays without school, for counting rotation days
+        self._closed_weekdays = sorted(day for day, schedule in self.calendar.items()
+                                       if schedule is NO_SCHOOL and day.weekday() < 5)
+
+    @classmethod
+    def from_dict(cls, config):
+        schedules = {name: BellSchedule(name, [(_period_label(period), _parse_time(start), _parse_time(end))
+                                               for period, start, end in periods])
+                     for name, periods in config['schedules'].items()}
+        calendar = {date.fromisoformat(day): name for day, name in config.get('calendar', {}).items()}
+        rotation = config.get('rotation')
+        if rotation:
+            rotation = (date.fromisoformat(rotation['anchor']), rotation['schedules'])
+        return cls(schedules, config.get('default', 'regular'), calendar, rotation)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as file:
+            return cls.from_dict(json.load(file))
+
+    def schedule_for(self, day):
+        """Return the BellSchedule in effect on a date"""
+        schedule = self.calendar.get(day)
+        if schedule is not None:
+            return schedule
+        if self.rotation and day.weekday() < 5:
+            anchor, cycle = self.rotation
+            return cycle[self._school_days(anchor, day) % len(cycle)]
+        return self.default
+
+    def period_at(self, dt):
+        """Return (period, end time) for a datetime, using that date's schedule"""
+        return self.schedule_for(dt.date()).period_at(dt.time())
+
+    def first_bell(self, day):
+        """Return when the first period starts on a date, or None if there is no school"""
+        start = self.schedule_for(day).first_bell
+        return datetime.combine(day, start) if start is not None else None
+
+    def next_period_end(self, now):
+        """Return the first period end after now, looking ahead up to a year"""
+        day = now.date()
+        for offset in range(367):
+            current = day + timedelta(days=offset)
+            ends = self.schedule_for(current).ends
+            index = bisect.bisect_right(ends, now.time()) if offset == 0 else 0
+            if index < len(ends):
+                return datetime.combine(current, ends[index])
+        return None
+
+    def last_period_end(self, now):
+        """Return the latest period end at or before now, looking back up to a year"""
+        day = now.date()
+        for offset in range(367):
+            current = day - timedelta(days=offset)
+            ends = self.schedule_for(current).ends
+            index = bisect.bisect_right(ends, now.time()) if offset == 0 else len(ends)
+            if index > 0:
+                return datetime.combine(current, ends[index - 1])
+        return None
+
+    def _school_days(self, anchor, day):
+        """Signed count of school weekdays from anchor up to (not including) day"""
+        if day < anchor:
+            return -self._school_days(day, anchor)
+        closed = (bisect.bisect_left(self._closed_weekdays, day)
+                  - bisect.bisect_left(self._closed_weekdays, anchor))
+        return _weekdays_between(anchor, day) - closed
+
+
+def _weekdays_between(start, end):
+    """Number of Monday-Friday dates in [start, end)"""
+    days = (end - start).days
+    weeks, remainder = divmod(days, 7)
+    count = weeks * 5
+    for offset in range(remainder):
+        if (start.weekday() + offset) % 7 < 5:
+            count += 1
+    return count
+
+
+def _minute(t):
+    return t.hour * 60 + t.minute
+
+
+def _parse_time(text):
+    return time.fromisoformat(text)
+
+
+def _period_label(value):
+    """Periods are numbered except for named ones such as 'HR'"""
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def load_calendar(path=CONFIG_FILE):
+    """Load the bell calendar, falling back to the original single schedule"""
+    if path and os.path.exists(path):
+        return BellCalendar.from_file(path)
+    return BellCalendar({'regular': BellSchedule('regular', DEFAULT_PERIODS)}, 'regular')
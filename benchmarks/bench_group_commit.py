@@ -0,0 +1,98 @@
+"""Burst-of-taps benchmark for the StudentDatabase write path.
+
+A bell rings and every student taps within a few seconds. This replays that
+burst as check-ins against a fresh database, first with the default
+commit-per-write path (one tap at a time, as the GUI does) and then with
+StudentDatabase(group_commit=True) driven by several threads (several
+readers or client connections), and reports throughput and tap latency.
+
+    python -m benchmarks.bench_group_commit --taps 300 --threads 8
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.common import build_database, remove_database, synthetic_students
+from student_db import StudentDatabase
+
+
+def run_burst(path, uids, threads=1, group_commit=False):
+    """Check every uid in once, spread over threads; return timing stats"""
+    db = StudentDatabase(path, group_commit=group_commit)
+    latencies = []
+    failures = []
+    pending = list(reversed(uids))
+    pending_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with pending_lock:
+                if not pending:
+                    return
+                uid = pending.pop()
+            start = time.perf_counter()
+            success, message = db.check_in(nfc_uid=uid)
+            elapsed = time.perf_counter() - start
+            with pending_lock:
+                latencies.append(elapsed)
+                if not success:
+                    failures.append(message)
+
+    start = time.perf_counter()
+    if threads == 1:
+        worker()
+    else:
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    seconds = time.perf_counter() - start
+    batches = db._committer.batches if db._committer else len(uids)
+    db.close()
+
+    latencies.sort()
+    return {
+        "mode": "group commit" if group_commit else "commit per write",
+        "threads": threads,
+        "taps": len(uids),
+        "seconds": seconds,
+        "taps_per_second": len(uids) / seconds if seconds else float('inf'),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "commits": batches,
+        "failures": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare write paths on a burst of check-ins")
+    parser.add_argument("--taps", type=int, default=300, help="students tapping in the burst")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent writers in group-commit mode")
+    parser.add_argument("--dir", default=None,
+                        help="directory for the scratch database (use the real disk, not tmpfs, for honest fsync costs)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.gettempdir()
+    path = os.path.join(directory, "bench_group_commit.db")
+    runs = [(1, False), (1, True), (args.threads, True)]
+    try:
+        for threads, group_commit in runs:
+            build_database(path, args.taps, days=0)
+            uids = [uid for uid, _, _ in synthetic_students(args.taps)]
+            stats = run_burst(path, uids, threads, group_commit)
+            print(f"{stats['mode']:<17} threads={stats['threads']:<3} "
+                  f"{stats['taps']} taps in {stats['seconds']:.3f}s "
+                  f"({stats['taps_per_second']:.0f} taps/s)  "
+                  f"p50 {stats['p50_ms']:.2f}ms  p99 {stats['p99_ms']:.2f}ms  "
+                  f"commits {stats['commits']}  failures {stats['failures']}")
+    finally:
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
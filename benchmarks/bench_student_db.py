@@ -0,0 +1,235 @@
+"""StudentDatabase benchmarks at school and district scale.
+
+For each roster size this builds a synthetic database holding a full school
+year of history (attendance for most students every school day, a share of
+them taking bathroom breaks or visiting the nurse), then times the calls the
+kiosk makes: check_in, start/end_bathroom_break, start/end_nurse_visit, the
+get_today_* listings, auto_checkout_students and both roster importers.
+Each operation reports throughput and p50/p99 latency, and each size its
+database size and build time.
+
+Results are written as JSON. Pass a previous results file as --baseline to
+compare: any p50 or p99 slower than the baseline by more than --tolerance
+is reported and the exit status is 1.
+
+    python -m benchmarks.bench_student_db --sizes 1000,5000,50000 --output results.json
+    python -m benchmarks.bench_student_db --baseline results.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import SCHOOL_DAYS, build_database, remove_database, synthetic_students
+from student_db import StudentDatabase
+
+DEFAULT_SIZES = (1000, 5000, 50000)
+
+
+def database_bytes(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def summarize(latencies):
+    """Return throughput and p50/p99 (milliseconds) for a list of per-call seconds"""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "ops_per_second": len(latencies) / total if total else float('inf'),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_operations(path, students, calls, group_commit=False):
+    """Time the per-tap and listing calls against a built database"""
+    db = StudentDatabase(path, group_commit=group_commit)
+    rng = random.Random(1)
+    uids = [uid for uid, _, _ in rng.sample(synthetic_students(students), min(calls, students))]
+    latencies = {name: [] for name in ("check_in", "start_bathroom_break", "end_bathroom_break",
+                                       "start_nurse_visit", "end_nurse_visit", "get_today_attendance",
+                                       "get_today_breaks", "get_today_nurse_visits", "auto_checkout_students")}
+    failures = 0
+
+    def record(name, function, *args, **kwargs):
+        nonlocal failures
+        elapsed, result = timed(function, *args, **kwargs)
+        latencies[name].append(elapsed)
+        if isinstance(result, tuple) and result and result[0] is False:
+            failures += 1
+
+    for uid in uids:
+        record("check_in", db.check_in, nfc_uid=uid)
+    # Only one student may be out on a break at a time, so each break ends before the next starts
+    for uid in uids:
+        record("start_bathroom_break", db.start_bathroom_break, uid)
+        record("end_bathroom_break", db.end_bathroom_break, uid)
+        record("start_nurse_visit", db.start_nurse_visit, nfc_uid=uid)
+        record("end_nurse_visit", db.end_nurse_visit, nfc_uid=uid)
+    listings = max(5, calls // 50)
+    for _ in range(listings):
+        record("get_today_attendance", db.get_today_attendance)
+        record("get_today_breaks", db.get_today_breaks)
+        record("get_today_nurse_visits", db.get_today_nurse_visits)
+    # Make every check-in of today due, then time a pass that checks them all out
+    today = date.today()
+    due = datetime.now() - timedelta(minutes=1)
+    for _ in range(listings):
+        db.conn.execute("UPDATE attendance SET check_out = NULL, scheduled_check_out = ? WHERE date = ?",
+                        (due, today))
+        db.conn.commit()
+        record("auto_checkout_students", db.auto_checkout_students)
+    db.close()
+    return {name: summarize(values) for name, values in latencies.items()}, failures
+
+
+def bench_imports(directory, students):
+    """Time both importers loading a roster of the given size into an empty database"""
+    roster = [{"id": uid, "student_id": student_id, "name": name}
+              for uid, student_id, name in synthetic_students(students)]
+    csv_path = os.path.join(directory, "bench_roster.csv")
+    json_path = os.path.join(directory, "bench_roster.json")
+    with open(csv_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=["id", "student_id", "name"])
+        writer.writeheader()
+        writer.writerows(roster)
+    with open(json_path, 'w') as file:
+        json.dump(roster, file)
+    results = {}
+    db_path = os.path.join(directory, "bench_import.db")
+    try:
+        for name, importer, source in (("import_from_csv", StudentDatabase.import_from_csv, csv_path),
+                                       ("import_from_json", StudentDatabase.import_from_json, json_path)):
+            remove_database(db_path)
+            db = StudentDatabase(db_path)
+            elapsed, outcome = timed(importer, db, source)
+            db.close()
+            results[name] = {
+                "rows": students,
+                "seconds": elapsed,
+                "rows_per_second": students / elapsed if elapsed else float('inf'),
+                "imported": outcome["success"],
+            }
+    finally:
+        remove_database(db_path)
+        os.remove(csv_path)
+        os.remove(json_path)
+    return results
+
+
+def run(sizes, days, calls, directory, group_commit=False):
+    results = {}
+    for students in sizes:
+        path = os.path.join(directory, f"bench_student_db_{students}.db")
+        try:
+            build_seconds, rows = timed(build_database, path, students, days)
+            size = database_bytes(path)
+            operations, failures = bench_operations(path, students, calls, group_commit)
+            operations.update(bench_imports(directory, students))
+        finally:
+            remove_database(path)
+        results[str(students)] = {
+            "students": students,
+            "history_rows": rows,
+            "build_seconds": build_seconds,
+            "db_bytes": size,
+            "failures": failures,
+            "operations": operations,
+        }
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "days": days,
+            "calls": calls,
+            "group_commit": group_commit,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Return messages for operations slower than baseline by more than tolerance (a fraction)"""
+    regressions = []
+    for size, result in current["results"].items():
+        previous = baseline.get("results", {}).get(size)
+        if not previous:
+            continue
+        for name, stats in result["operations"].items():
+            before = previous["operations"].get(name)
+            if not before:
+                continue
+            for metric in ("p50_ms", "p99_ms", "seconds"):
+                if metric in stats and metric in before and before[metric] > 0:
+                    change = stats[metric] / before[metric] - 1
+                    if change > tolerance:
+                        regressions.append(f"{size} students {name} {metric}: "
+                                           f"{before[metric]:.3f} -> {stats[metric]:.3f} (+{change:.0%})")
+    return regressions
+
+
+def print_results(report):
+    for size, result in report["results"].items():
+        print(f"{size} students: {result['history_rows']} history rows, "
+              f"{result['db_bytes'] / 1024 / 1024:.1f} MiB, built in {result['build_seconds']:.1f}s, "
+              f"{result['failures']} failed calls")
+        for name, stats in result["operations"].items():
+            if "p50_ms" in stats:
+                print(f"  {name:<24} {stats['ops_per_second']:>9.0f}/s  "
+                      f"p50 {stats['p50_ms']:>8.3f}ms  p99 {stats['p99_ms']:>8.3f}ms")
+            else:
+                print(f"  {name:<24} {stats['rows_per_second']:>9.0f} rows/s  "
+                      f"{stats['rows']} rows in {stats['seconds']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark StudentDatabase on synthetic school-year data")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated roster sizes")
+    parser.add_argument("--days", type=int, default=SCHOOL_DAYS, help="school days of history to generate")
+    parser.add_argument("--calls", type=int, default=300, help="taps timed per operation")
+    parser.add_argument("--group-commit", action="store_true", help="open the database with group_commit=True")
+    parser.add_argument("--dir", default=None,
+                        help="directory for scratch databases (use the real disk, not tmpfs, for honest fsync costs)")
+    parser.add_argument("--output", default="bench_student_db.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    report = run(sizes, args.days, args.calls, args.dir or tempfile.gettempdir(), args.group_commit)
+    print_results(report)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Synthetic databases shared by the benchmarks.
+
+build_database() creates a roster of synthetic students and, optionally,
+school days of attendance, bathroom-break and nurse-visit history before
+today; remove_database() deletes a database together with its WAL files.
+"""
+
+import os
+import random
+from datetime import date, datetime, timedelta
+
+from student_db import StudentDatabase, to_epoch_us
+
+SCHOOL_DAYS = 180
+ATTENDANCE_RATE = 0.95
+BREAK_RATE = 0.10        # share of present students taking a bathroom break each day
+NURSE_RATE = 0.02        # share of present students visiting the nurse each day
+HISTORY_BATCH = 10000    # rows per executemany while building history
+
+
+def remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def synthetic_students(count, offset=0):
+    """Return [(nfc_uid, student_id, name)] for count synthetic students"""
+    return [(f"{index:08X}", f"{index:06d}", f"Student {index:06d}")
+            for index in range(offset, offset + count)]
+
+
+def school_days(today, count):
+    """The count weekdays before today, oldest first"""
+    days = []
+    day = today - timedelta(days=1)
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return list(reversed(days))
+
+
+def _history(keys, days, rng):
+    """Yield (table, row) pairs for a year of attendance, breaks and nurse visits"""
+    minute = 60 * 1000000
+    for day in days:
+        opening = to_epoch_us(datetime.combine(day, datetime.min.time()) + timedelta(hours=7, minutes=20))
+        for key in keys:
+            if rng.random() >= ATTENDANCE_RATE:
+                continue
+            check_in = opening + rng.randrange(20 * minute)
+            check_out = opening + 420 * minute
+            yield 'attendance', (key, day, check_in, check_out, check_out)
+            if rng.random() < BREAK_RATE:
+                start = check_in + rng.randrange(30, 400) * minute
+                length = rng.randrange(2, 12)
+                yield 'bathroom_breaks', (key, start, start + length * minute, length)
+            if rng.random() < NURSE_RATE:
+                start = check_in + rng.randrange(30, 400) * minute
+                length = rng.randrange(5, 40)
+                yield 'nurse_visits', (key, start, start + length * minute, length)
+
+
+def build_database(path, students, days=SCHOOL_DAYS, seed=0):
+    """Create a database with a synthetic roster and days of history before today"""
+    remove_database(path)
+    db = StudentDatabase(path)
+    db.conn.executemany("INSERT INTO students (id, student_id, name) VALUES (?, ?, ?)",
+                        synthetic_students(students))
+    keys = [row[0] for row in db.conn.execute("SELECT student_key FROM students ORDER BY student_key")]
+    sql = {
+        'attendance': "INSERT INTO attendance (student_key, date, check_in, check_out, scheduled_check_out) "
+                      "VALUES (?, ?, ?, ?, ?)",
+        'bathroom_breaks': "INSERT INTO bathroom_breaks (student_key, break_start, break_end, duration_minutes) "
+                           "VALUES (?, ?, ?, ?)",
+        'nurse_visits': "INSERT INTO nurse_visits (student_key, visit_start, visit_end, duration_minutes) "
+                        "VALUES (?, ?, ?, ?)",
+    }
+    pending = {table: [] for table in sql}
+    rows = 0
+    for table, row in _history(keys, school_days(date.today(), days), random.Random(seed)):
+        pending[table].append(row)
+        rows += 1
+        if len(pending[table]) >= HISTORY_BATCH:
+            db.conn.executemany(sql[table], pending[table])
+            pending[table] = []
+    for table, batch in pending.items():
+        if batch:
+            db.conn.executemany(sql[table], batch)
+    db.conn.commit()
+    db.conn.execute("ANALYZE")
+    db.close()
+    return rows
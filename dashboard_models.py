@@ -0,0 +1,194 @@
+"""Table models for the attendance dashboard.
+
+Each model loads today's rows once and then follows StudentDatabase change
+events, so a tap touches only the affected row (a dataChanged for one cell
+or a single row insert) instead of rebuilding the whole table. Cells are
+formatted in data(), i.e. only for the rows a view actually paints.
+"""
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QObject, Qt, pyqtSignal
+
+TIME_FORMAT = "%H:%M:%S"
+
+
+class ChangeFeed(QObject):
+    """Forward StudentDatabase change events as a Qt signal.
+
+    Listeners may be called from a worker thread (group-commit writers, the
+    import worker); the signal delivers them on the GUI thread.
+    """
+
+    changed = pyqtSignal(str, object)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        db.add_listener(self._forward)
+
+    def _forward(self, kind, details):
+        self.changed.emit(kind, details)
+
+    def close(self):
+        self.db.remove_listener(self._forward)
+
+
+class AttendanceModel(QAbstractTableModel):
+    """Every student with today's check-in time, ordered by name"""
+
+    HEADERS = ["Name", "Check In"]
+
+    def __init__(self, db, feed, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self._rows = []       # [student_id, name, check_in, check_out]
+        self._row_of = {}     # student_id -> row number
+        feed.changed.connect(self.apply_change)
+        self.reload()
+
+    def reload(self):
+        self.beginResetModel()
+        self._rows = [list(row) for row in self.db.get_today_attendance()]
+        self._reindex()
+        self.endResetModel()
+
+    def _reindex(self):
+        self._row_of = {row[0]: number for number, row in enumerate(self._rows)}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole:
+            return None
+        student_id, name, check_in, _ = self._rows[index.row()]
+        if index.column() == 0:
+            return name or "Unknown"
+        return check_in.strftime(TIME_FORMAT) if check_in else "Not checked in"
+
+    def apply_change(self, kind, details):
+        if kind in ('roster_reloaded', 'day_reloaded'):
+            self.reload()
+        elif kind == 'checked_in':
+            student = self.db.student_by_key(details['student_key'])
+            row = self._row_of.get(student[1]) if student else None
+            if row is not None and self._rows[row][2] is None:
+                self._rows[row][2] = details['time']
+                cell = self.index(row, 1)
+                self.dataChanged.emit(cell, cell, [Qt.DisplayRole])
+        elif kind == 'student_added':
+            name = details['name']
+            row = len(self._rows)
+            for number, existing in enumerate(self._rows):
+                if existing[1] > name:
+                    row = number
+                    break
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._rows.insert(row, [details['student_id'], name, None, None])
+            self._reindex()
+            self.endInsertRows()
+
+
+class VisitLogModel(QAbstractTableModel):
+    """Today's bathroom breaks or nurse visits, newest first"""
+
+    def __init__(self, db, feed, load, started, ended, headers, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self._load = load
+        self._started = started
+        self._ended = ended
+        self.headers = headers
+        # Oldest first, so row numbers of existing entries never shift;
+        # the view order is reversed in data()
+        self._entries = []    # [student_id, start, end, duration]
+        self._entry_of = {}   # (student_id, start) -> entry number
+        feed.changed.connect(self.apply_change)
+        self.reload()
+
+    def reload(self):
+        self.beginResetModel()
+        self._entries = [list(row) for row in reversed(self._load())]
+        self._entry_of = {(entry[0], entry[1]): number for number, entry in enumerate(self._entries)}
+        self.endResetModel()
+
+    def active_count(self):
+        return sum(1 for entry in self._entries if entry[2] is None)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole:
+            return None
+        student_id, start, end, duration = self._entries[len(self._entries) - 1 - index.row()]
+        column = index.column()
+        if column == 0:
+            student = self.db.student_for(student_id)
+            return student[2] if student else student_id
+        if column == 1:
+            return start.strftime(TIME_FORMAT) if start else ""
+        if column == 2:
+            return end.strftime(TIME_FORMAT) if end else "In progress"
+        return f"{duration} min" if duration else ""
+
+    def apply_change(self, kind, details):
+        if kind in ('roster_reloaded', 'day_reloaded'):
+            self.reload()
+            return
+        if kind not in (self._started, self._ended):
+            return
+        student = self.db.student_by_key(details['student_key'])
+        if not student:
+            return
+        key = (student[1], details['start'])
+        if kind == self._started:
+            if key in self._entry_of:
+                return
+            # Newest entries are shown at the top
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            self._entry_of[key] = len(self._entries)
+            self._entries.append([student[1], details['start'], None, None])
+            self.endInsertRows()
+        else:
+            number = self._entry_of.get(key)
+            if number is None:
+                return
+            entry = self._entries[number]
+            entry[2] = details['end']
+            entry[3] = details['duration']
+            row = len(self._entries) - 1 - number
+            self.dataChanged.emit(self.index(row, 2), self.index(row, 3), [Qt.DisplayRole])
+
+
+def breaks_model(db, feed, parent=None):
+    return VisitLogModel(db, feed, db.get_today_breaks, 'break_started', 'break_ended',
+                         ["Name", "Break Start", "Break End", "Duration"], parent)
+
+
+def nurse_visits_model(db, feed, parent=None):
+    return VisitLogModel(db, feed, db.get_today_nurse_visits, 'nurse_started', 'nurse_ended',
+                         ["Name", "Visit Start", "Visit End", "Duration"], parent)
@@ -12,104 +12,200 @@
 #define PN532_MISO (19)
 #define PN532_SS   (5)  // Chip select pin
 
+// Serial protocol (see reader_protocol.py on the host side).
+// Every message is one line: <kind><version>:<payload>*<crc8 hex>
+#define PROTOCOL_VERSION    (1)
+#define POLL_TIMEOUT_MS     (50)   // Keep polls short so host commands are serviced
+#define COMMAND_BUFFER_SIZE (64)
+
 // Create an instance of the PN532 class using SPI
 Adafruit_PN532 nfc(PN532_SS);
 
+// Runtime settings, switched by the host with C1:VERBOSE=0|1 and C1:SECTOR=0|1
+bool verboseMode = false;     // Human-readable debug output as '#' lines
+bool sectorReadMode = false;  // Authenticate and dump blocks 4-7 after each tap
+
+char commandBuffer[COMMAND_BUFFER_SIZE];
+uint8_t commandLength = 0;
+
+// CRC-8, polynomial 0x07, initial value 0x00
+uint8_t crc8(const char *data, size_t length) {
+  uint8_t crc = 0;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint8_t)data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void sendFrame(char kind, const String &payload) {
+  String body = String(kind) + String(PROTOCOL_VERSION) + ":" + payload;
+  uint8_t crc = crc8(body.c_str(), body.length());
+  Serial.print(body);
+  Serial.print('*');
+  if (crc < 0x10) Serial.print('0');
+  Serial.println(crc, HEX);
+}
+
+String toHex(const uint8_t *data, uint8_t length) {
+  String hex = "";
+  for (uint8_t i = 0; i < length; i++) {
+    if (data[i] < 0x10) hex += "0";
+    hex += String(data[i], HEX);
+  }
+  hex.toUpperCase();
+  return hex;
+}
+
+// Boot messages and verbose output are '#' lines, which the host ignores
+void logLine(const String &text) {
+  Serial.print("# ");
+  Serial.println(text);
+}
+
+void debugLine(const String &text) {
+  if (verboseMode) logLine(text);
+}
+
 void setup() {
   Serial.begin(115200);
   while (!Serial) delay(10); // Wait for Serial to be ready
-  
-  Serial.println("\n\nESP32 NFC Reader Starting...");
-  Serial.println("Initializing SPI...");
-  
+
+  logLine("ESP32 NFC Reader Starting...");
+  logLine("Initializing SPI...");
+
   // Initialize SPI
   SPI.begin(PN532_SCK, PN532_MISO, PN532_MOSI, PN532_SS);
-  Serial.println("SPI Initialized");
-  
+  logLine("SPI Initialized");
+
   // Add a small delay after SPI initialization
   delay(100);
-  
-  Serial.println("Initializing PN532...");
+
+  logLine("Initializing PN532...");
   nfc.begin();
-  Serial.println("PN532 begin() called");
+  logLine("PN532 begin() called");
 
   // Add a small delay after PN532 initialization
   delay(100);
 
   // Get the firmware version
-  Serial.println("Checking firmware version...");
+  logLine("Checking firmware version...");
   uint32_t versiondata = nfc.getFirmwareVersion();
   if (!versiondata) {
-    Serial.println("ERROR: Didn't find PN532 board");
-    Serial.println("Please check your wiring and try again");
-    Serial.println("Make sure:");
-    Serial.println("1. SCK is connected to GPIO 18");
-    Serial.println("2. MOSI is connected to GPIO 23");
-    Serial.println("3. MISO is connected to GPIO 19");
-    Serial.println("4. SS/CS is connected to GPIO 5");
-    Serial.println("5. VCC is connected to 3.3V");
-    Serial.println("6. GND is connected to GND");
-    Serial.println("7. IRQ is connected to GPIO 4");
-    Serial.println("\nTroubleshooting tips:");
-    Serial.println("- Check if the module is getting power (measure VCC-GND)");
-    Serial.println("- Try pressing the reset button on the ESP32");
-    Serial.println("- Make sure all SPI connections are secure");
+    sendFrame('E', "NOPN532");
+    logLine("ERROR: Didn't find PN532 board");
+    logLine("Please check your wiring and try again");
+    logLine("Make sure:");
+    logLine("1. SCK is connected to GPIO 18");
+    logLine("2. MOSI is connected to GPIO 23");
+    logLine("3. MISO is connected to GPIO 19");
+    logLine("4. SS/CS is connected to GPIO 5");
+    logLine("5. VCC is connected to 3.3V");
+    logLine("6. GND is connected to GND");
+    logLine("7. IRQ is connected to GPIO 4");
+    logLine("Troubleshooting tips:");
+    logLine("- Check if the module is getting power (measure VCC-GND)");
+    logLine("- Try pressing the reset button on the ESP32");
+    logLine("- Make sure all SPI connections are secure");
     while (1); // halt
   }
-  
+
   // Got ok data, print it out!
-  Serial.println("PN532 Found!");
-  Serial.print("Found chip PN5"); Serial.println((versiondata >> 24) & 0xFF, HEX);
-  Serial.print("Firmware ver. "); Serial.print((versiondata >> 16) & 0xFF, DEC);
-  Serial.print('.'); Serial.println((versiondata >> 8) & 0xFF, DEC);
+  logLine("PN532 Found!");
+  logLine("Found chip PN5" + String((versiondata >> 24) & 0xFF, HEX));
+  logLine("Firmware ver. " + String((versiondata >> 16) & 0xFF, DEC) + "." + String((versiondata >> 8) & 0xFF, DEC));
 
   // Configure the PN532 to read RFID tags
-  Serial.println("Configuring SAM...");
+  logLine("Configuring SAM...");
   nfc.SAMConfig();
-  Serial.println("SAM configured");
-  
-  Serial.println("System ready!");
-  Serial.println("Waiting for an ISO14443A Card ...");
+  logLine("SAM configured");
+
+  sendFrame('I', "READY");
+}
+
+void handleCommand(const char *line) {
+  String text = String(line);
+  int star = text.lastIndexOf('*');
+  if (star < 0 || text.length() != (unsigned int)(star + 3)) {
+    sendFrame('E', "BADCRC");
+    return;
+  }
+  uint8_t expected = (uint8_t)strtol(text.substring(star + 1).c_str(), NULL, 16);
+  if (crc8(line, star) != expected) {
+    sendFrame('E', "BADCRC");
+    return;
+  }
+  String body = text.substring(0, star);
+  String prefix = String('C') + String(PROTOCOL_VERSION) + ":";
+  if (!body.startsWith(prefix)) {
+    sendFrame('E', "UNKNOWN");
+    return;
+  }
+  String command = body.substring(prefix.length());
+  if (command == "STATUS") {
+    sendFrame('A', String("VERBOSE=") + (verboseMode ? "1" : "0"));
+    sendFrame('A', String("SECTOR=") + (sectorReadMode ? "1" : "0"));
+  } else if (command == "VERBOSE=0" || command == "VERBOSE=1") {
+    verboseMode = command.endsWith("1");
+    sendFrame('A', command);
+  } else if (command == "SECTOR=0" || command == "SECTOR=1") {
+    sectorReadMode = command.endsWith("1");
+    sendFrame('A', command);
+  } else {
+    sendFrame('E', "UNKNOWN");
+  }
 }
 
-void printCardType(uint8_t cardType) {
-  switch (cardType) {
-    case PN532_MIFARE_ISO14443A:
-      Serial.println("Card Type: MIFARE Classic 1K");
-      break;
-    default:
-      Serial.println("Card Type: Unknown");
-      break;
+void pollCommands() {
+  while (Serial.available()) {
+    char c = Serial.read();
+    if (c == '\n' || c == '\r') {
+      if (commandLength > 0) {
+        commandBuffer[commandLength] = '\0';
+        handleCommand(commandBuffer);
+        commandLength = 0;
+      }
+    } else if (commandLength < COMMAND_BUFFER_SIZE - 1) {
+      commandBuffer[commandLength++] = c;
+    } else {
+      commandLength = 0;  // Overlong line, drop it
+    }
   }
 }
 
 void readMifareClassic(uint8_t uid[], uint8_t uidLength) {
+  debugLine("Attempting to read card data...");
   // Try to authenticate block 4 (first block of sector 1)
   uint8_t keyA[6] = { 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF }; // Default key
   uint8_t success = nfc.mifareclassic_AuthenticateBlock(uid, uidLength, 4, 0, keyA);
-  
+
   if (success) {
-    Serial.println("Authentication successful!");
-    
+    debugLine("Authentication successful!");
+
     // Read blocks 4-7 (sector 1)
     for (uint8_t block = 4; block < 8; block++) {
       uint8_t data[16];
       success = nfc.mifareclassic_ReadDataBlock(block, data);
-      
+
       if (success) {
-        Serial.print("Block "); Serial.print(block); Serial.print(": ");
-        for (uint8_t i = 0; i < 16; i++) {
-          if (data[i] < 0x10) Serial.print("0");
-          Serial.print(data[i], HEX);
-          Serial.print(" ");
+        if (verboseMode) {
+          String line = "Block " + String(block) + ": ";
+          for (uint8_t i = 0; i < 16; i++) {
+            line += toHex(&data[i], 1) + " ";
+          }
+          logLine(line);
         }
-        Serial.println();
+        sendFrame('B', String(block) + ":" + toHex(data, 16));
       } else {
-        Serial.print("Failed to read block "); Serial.println(block);
+        debugLine("Failed to read block " + String(block));
+        sendFrame('E', "READ" + String(block));
       }
     }
   } else {
-    Serial.println("Authentication failed!");
+    debugLine("Authentication failed!");
+    sendFrame('E', "AUTH");
   }
 }
 
@@ -118,31 +214,37 @@ void loop() {
   uint8_t uid[] = { 0, 0, 0, 0, 0, 0, 0 };  // Buffer to store the returned UID
   uint8_t uidLength;                        // Length of the UID (4 or 7 bytes depending on ISO14443A card type)
 
-  // Wait for an ISO14443A type cards (Mifare, etc.).  When one is found
-  // 'uid' will be populated with the UID, and uidLength will indicate
-  // if the uid is 4 bytes (Mifare Classic) or 7 bytes (Mifare Ultralight)
-  success = nfc.readPassiveTargetID(PN532_MIFARE_ISO14443A, uid, &uidLength);
+  pollCommands();
+
+  // Poll for an ISO14443A type card (Mifare, etc.) with a short timeout so
+  // host commands are not starved. When one is found 'uid' will be
+  // populated with the UID, and uidLength will indicate if the uid is
+  // 4 bytes (Mifare Classic) or 7 bytes (Mifare Ultralight)
+  success = nfc.readPassiveTargetID(PN532_MIFARE_ISO14443A, uid, &uidLength, POLL_TIMEOUT_MS);
 
   if (success) {
-    // Display basic information about the card
-    Serial.println("\nFound an ISO14443A card");
-    Serial.print("  UID Length: "); Serial.print(uidLength, DEC); Serial.println(" bytes");
-    Serial.print("  UID Value: ");
-    for (uint8_t i = 0; i < uidLength; i++) {
-      Serial.print(" 0x"); Serial.print(uid[i], HEX);
+    // The UID frame goes out first so the host sees the tap immediately
+    sendFrame('U', toHex(uid, uidLength));
+
+    if (verboseMode) {
+      String uidValue = "  UID Value: ";
+      for (uint8_t i = 0; i < uidLength; i++) {
+        String byteHex = String(uid[i], HEX);  // No leading zero, as before
+        byteHex.toUpperCase();
+        uidValue += " 0x" + byteHex;
+      }
+      logLine("Found an ISO14443A card");
+      logLine("  UID Length: " + String(uidLength, DEC) + " bytes");
+      logLine(uidValue);
+      logLine("Card Type: MIFARE Classic 1K");
     }
-    Serial.println("");
-    
-    // Print card type
-    printCardType(PN532_MIFARE_ISO14443A);
-    
-    // Try to read card data
-    if (uidLength == 4) {
-      Serial.println("Attempting to read card data...");
+
+    // Sector 1 dump only when the host asked for it
+    if (sectorReadMode && uidLength == 4) {
       readMifareClassic(uid, uidLength);
     }
-    
+
     // Wait 1 second before continuing
     delay(1000);
   }
-} 
\ No newline at end of file
+}
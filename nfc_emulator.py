@@ -0,0 +1,228 @@
+"""Pure-Python stand-in for esp32_nfc_reader.ino.
+
+ReaderEmulator produces byte-for-byte the same serial output as the firmware
+(compact frames by default, the '#' debug block in verbose mode, block frames
+in sector-read mode, or the old verbose-only output with legacy=True) and
+answers host commands. It behaves like a pyserial port (read, readline,
+write, in_waiting), so the host parser can be exercised without a PN532.
+
+Run it directly to measure host parser throughput and error handling:
+
+    python nfc_emulator.py --taps 100000 --corrupt 0.01
+"""
+
+import argparse
+import random
+import time
+from reader_protocol import (ACK, BLOCK, COMMAND, ERROR, INFO, UID, SETTINGS,
+                             LineFramer, ProtocolError, decode_frame, encode_frame,
+                             parse_uid, uid_string)
+
+DEFAULT_BLOCK = bytes(16)
+CRLF = b"\r\n"
+
+BOOT_LINES = [
+    "ESP32 NFC Reader Starting...",
+    "Initializing SPI...",
+    "SPI Initialized",
+    "Initializing PN532...",
+    "PN532 begin() called",
+    "Checking firmware version...",
+    "PN532 Found!",
+    "Found chip PN532",
+    "Firmware ver. 1.6",
+    "Configuring SAM...",
+    "SAM configured",
+]
+
+
+class ReaderEmulator:
+    """Emulate the reader's serial behaviour in memory"""
+
+    def __init__(self, verbose=False, sector_read=False, legacy=False, blocks=None):
+        self.verbose = verbose
+        self.sector_read = sector_read
+        self.legacy = legacy
+        self.blocks = blocks or {block: DEFAULT_BLOCK for block in range(4, 8)}
+        self._output = bytearray()
+        self._command_buffer = bytearray()
+        self.is_open = True
+        self.boot()
+
+    def boot(self):
+        """Emit the start-up output the firmware prints from setup()"""
+        if self.legacy:
+            self._output.extend(b"\n\n")
+        for line in BOOT_LINES:
+            self._debug(line)
+        if self.legacy:
+            self._debug("System ready!")
+            self._debug("Waiting for an ISO14443A Card ...")
+        else:
+            self._println(encode_frame(INFO, 'READY'))
+
+    # Firmware behaviour
+
+    def _println(self, text=""):
+        self._output.extend(text.encode('ascii') + CRLF)
+
+    def _debug(self, text):
+        self._println(text if self.legacy else f"# {text}")
+
+    def tap(self, uid):
+        """Simulate a card tap; uid is bytes or a zero-padded hex string"""
+        if isinstance(uid, str):
+            uid = bytes.fromhex(uid)
+        if not self.legacy:
+            self._println(encode_frame(UID, uid.hex().upper()))
+        if self.verbose or self.legacy:
+            if self.legacy:
+                self._output.extend(b"\n")
+            self._debug("Found an ISO14443A card")
+            self._debug(f"  UID Length: {len(uid)} bytes")
+            self._debug("  UID Value: " + ''.join(f" 0x{byte:X}" for byte in uid))
+            self._debug("Card Type: MIFARE Classic 1K")
+        if len(uid) == 4 and (self.sector_read or self.legacy):
+            self._read_sector()
+
+    def _read_sector(self):
+        if self.verbose or self.legacy:
+            self._debug("Attempting to read card data...")
+            self._debug("Authentication successful!")
+        for block in range(4, 8):
+            data = self.blocks.get(block, DEFAULT_BLOCK)
+            if self.legacy or self.verbose:
+                self._debug(f"Block {block}: " + ''.join(f"{byte:02X} " for byte in data))
+            if not self.legacy:
+                self._println(encode_frame(BLOCK, f"{block}:{data.hex().upper()}"))
+
+    def _handle_command(self, line):
+        try:
+            frame = decode_frame(line)
+        except ProtocolError:
+            self._println(encode_frame(ERROR, 'BADCRC'))
+            return
+        if frame.kind != COMMAND:
+            self._println(encode_frame(ERROR, 'UNKNOWN'))
+            return
+        if frame.payload == 'STATUS':
+            self._println(encode_frame(ACK, f"VERBOSE={int(self.verbose)}"))
+            self._println(encode_frame(ACK, f"SECTOR={int(self.sector_read)}"))
+            return
+        setting, _, value = frame.payload.partition('=')
+        if setting not in SETTINGS or value not in ('0', '1'):
+            self._println(encode_frame(ERROR, 'UNKNOWN'))
+            return
+        if setting == 'VERBOSE':
+            self.verbose = value == '1'
+        else:
+            self.sector_read = value == '1'
+        self._println(encode_frame(ACK, f"{setting}={value}"))
+
+    # pyserial-like interface
+
+    @property
+    def in_waiting(self):
+        return len(self._output)
+
+    def read(self, size=1):
+        data = bytes(self._output[:size])
+        del self._output[:size]
+        return data
+
+    def readline(self):
+        end = self._output.find(b"\n")
+        size = end + 1 if end >= 0 else len(self._output)
+        return self.read(size)
+
+    def write(self, data):
+        if self.legacy:
+            return len(data)
+        self._command_buffer.extend(data)
+        while True:
+            end = self._command_buffer.find(b"\n")
+            if end < 0:
+                break
+            line = self._command_buffer[:end].decode('ascii', errors='replace').strip()
+            del self._command_buffer[:end + 1]
+            if line:
+                self._handle_command(line)
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._output.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def random_uid(rng, length=4):
+    return bytes(rng.randrange(256) for _ in range(length))
+
+
+def corrupt_line(line, rng):
+    """Flip one payload character so the checksum no longer matches"""
+    index = rng.randrange(3, max(4, line.index(b'*')))
+    flipped = b'0' if line[index:index + 1] != b'0' else b'1'
+    return line[:index] + flipped + line[index + 1:]
+
+
+def run_benchmark(taps, corrupt_rate, verbose, seed=0):
+    """Generate a tap stream, parse it the way the host does and report stats"""
+    rng = random.Random(seed)
+    emulator = ReaderEmulator(verbose=verbose)
+    expected = []
+    stream = bytearray(emulator.read(emulator.in_waiting))
+    corrupted = 0
+    for _ in range(taps):
+        uid = random_uid(rng, rng.choice((4, 7)))
+        emulator.tap(uid)
+        chunk = emulator.read(emulator.in_waiting)
+        if rng.random() < corrupt_rate:
+            first, _, rest = chunk.partition(b"\n")
+            chunk = corrupt_line(first, rng) + b"\n" + rest
+            corrupted += 1
+        else:
+            expected.append(uid_string(uid))
+        stream.extend(chunk)
+
+    framer = LineFramer()
+    parsed = []
+    rejected = 0
+    start = time.perf_counter()
+    for offset in range(0, len(stream), 64):
+        for line in framer.feed(stream[offset:offset + 64]):
+            try:
+                uid = parse_uid(line)
+            except ProtocolError:
+                rejected += 1
+                continue
+            if uid:
+                parsed.append(uid)
+    elapsed = time.perf_counter() - start
+    return {
+        "taps": taps,
+        "bytes": len(stream),
+        "seconds": elapsed,
+        "taps_per_second": taps / elapsed if elapsed else float('inf'),
+        "corrupted": corrupted,
+        "rejected": rejected,
+        "parsed_ok": parsed == expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure host parser throughput against the reader emulator")
+    parser.add_argument("--taps", type=int, default=100000)
+    parser.add_argument("--corrupt", type=float, default=0.0, help="fraction of UID frames to damage")
+    parser.add_argument("--verbose", action="store_true", help="emulate the reader in verbose mode")
+    args = parser.parse_args()
+    stats = run_benchmark(args.taps, args.corrupt, args.verbose)
+    print(f"{stats['taps']} taps, {stats['bytes']} bytes in {stats['seconds']:.3f}s "
+          f"({stats['taps_per_second']:.0f} taps/s)")
+    print(f"corrupted {stats['corrupted']}, rejected {stats['rejected']}, "
+          f"UIDs match: {stats['parsed_ok']}")
+
+
+if __name__ == '__main__':
+    main()
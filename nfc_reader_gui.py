@@ -1,16 +1,33 @@
+import time
+from tracing import NULL_TRACE, TRACER, StartupProfile
+
+# Created before the other imports so --profile-startup can time them
+STARTUP = StartupProfile()
+
 import sys
-import serial
-import serial.tools.list_ports
+import argparse
+import logging
+from bisect import bisect_left
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QLabel, QComboBox, QPushButton, 
-                            QMessageBox, QTableWidget, QTableWidgetItem,
+                            QHBoxLayout, QLabel, QPushButton, 
+                            QMessageBox, QTableView,
                             QHeaderView, QTabWidget, QLineEdit, QDialog,
                             QFormLayout, QFileDialog, QFrame, QGroupBox,
-                            QGridLayout, QSizePolicy)
-from PyQt5.QtCore import QTimer, Qt, QTime
-from PyQt5.QtGui import QFont, QColor, QPainter, QPen
-from student_db import StudentDatabase
+                            QGridLayout, QSizePolicy, QCheckBox, QProgressDialog, QListWidget)
+from PyQt5.QtCore import QTimer, Qt, QTime, QThread, QEvent, QObject, pyqtSignal
+from PyQt5.QtGui import QFont, QColor, QPainter, QPen, QPixmap
+STARTUP.mark("Qt imported")
+from student_db import StudentDatabase, next_period_end
+from tap_journal import TapJournal
+from dashboard_models import AttendanceModel, ChangeFeed, breaks_model, nurse_visits_model
+from reader_manager import ReaderConfig, ReaderManager, load_readers
+STARTUP.mark("modules imported")
+
+logger = logging.getLogger(__name__)
+
+STARTUP_DEFER_MS = 2000   # run the deferred startup work by now even if the window never paints
+TICK_SLACK_MS = 5         # clock ticks fire this long after the second, so an early timer still sees it
 
 class AddStudentDialog(QDialog):
     def __init__(self, parent=None):
@@ -56,6 +73,10 @@ class ImportDialog(QDialog):
         file_layout.addWidget(self.browse_button)
         layout.addLayout(file_layout)
         
+        # Upsert mode
+        self.update_existing = QCheckBox("Update existing students (matched by Student ID)")
+        layout.addWidget(self.update_existing)
+        
         # Buttons
         button_layout = QHBoxLayout()
         self.import_button = QPushButton("Import")
@@ -78,6 +99,90 @@ class ImportDialog(QDialog):
         if file_path:
             self.file_path.setText(file_path)
 
+class ImportWorker(QThread):
+    """Run a roster import off the GUI thread, on its own database connection"""
+
+    progress = pyqtSignal(int, int)   # rows read, percent of the file consumed
+    completed = pyqtSignal(dict)     # the importer's results dict
+
+    def __init__(self, open_database, file_path, upsert=False, parent=None):
+        super().__init__(parent)
+        self.open_database = open_database
+        self.file_path = file_path
+        self.upsert = upsert
+
+    def run(self):
+        db = self.open_database()
+        try:
+            report = lambda rows, fraction: self.progress.emit(rows, int(fraction * 100))
+            if self.file_path.endswith('.csv'):
+                results = db.import_from_csv(self.file_path, self.upsert, report)
+            else:
+                results = db.import_from_json(self.file_path, self.upsert, report)
+        except Exception as e:
+            results = {"success": 0, "failed": 0, "updated": 0, "errors": [str(e)]}
+        finally:
+            db.close()
+        self.completed.emit(results)
+
+class CacheWarmer(QThread):
+    """Run the database's warm_cache() off the GUI thread once the kiosk is up"""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+
+    def run(self):
+        try:
+            self.db.warm_cache()
+        except Exception as e:
+            # Only a head start for the first taps; they work without it
+            logger.warning("Warming the database cache failed: %s", e)
+
+class ActivityMonitor(QObject):
+    """Call back on every click, touch or key press anywhere in the application"""
+    INPUT_EVENTS = (QEvent.MouseButtonPress, QEvent.TouchBegin, QEvent.KeyPress)
+
+    def __init__(self, callback, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        QApplication.instance().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.INPUT_EVENTS:
+            self.callback()
+        return False
+
+class FeedbackProbe(QObject):
+    """Finish scan traces when their on-screen feedback is first painted.
+
+    Created the first time a trace needs it and installed on the whole
+    application, so it costs nothing unless tracing is on. expect() is
+    called just before the feedback is shown; the next paint event for the
+    given widget (or for any message box) marks the trace 'painted'.
+    """
+    MAX_WAITING = 8  # feedback that never paints must not pile up
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._waiting = []  # (trace, widget or None for a message box)
+        QApplication.instance().installEventFilter(self)
+
+    def expect(self, trace, widget=None):
+        self._waiting.append((trace, widget))
+        if len(self._waiting) > self.MAX_WAITING:
+            TRACER.finish(self._waiting.pop(0)[0])
+
+    def eventFilter(self, obj, event):
+        if self._waiting and event.type() == QEvent.Paint:
+            for entry in list(self._waiting):
+                trace, widget = entry
+                if obj is widget or (widget is None and isinstance(obj, QMessageBox)):
+                    self._waiting.remove(entry)
+                    trace.mark("painted")
+                    TRACER.finish(trace)
+        return False
+
 class StatusIndicator(QFrame):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -94,23 +199,89 @@ class StatusIndicator(QFrame):
         else:
             self.setStyleSheet("background-color: #44ff44;")  # Green
 
+class DashboardDialog(QDialog):
+    """Today's attendance, bathroom breaks and nurse visits, kept current from database change events"""
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Dashboard")
+        self.resize(700, 500)
+        self.feed = ChangeFeed(db, self)
+        self.attendance_model = AttendanceModel(db, self.feed, self)
+        self.breaks_model = breaks_model(db, self.feed, self)
+        self.nurse_model = nurse_visits_model(db, self.feed, self)
+        
+        layout = QVBoxLayout(self)
+        
+        # Bathroom status indicator
+        status_layout = QHBoxLayout()
+        self.bathroom_status = StatusIndicator()
+        status_layout.addWidget(self.bathroom_status)
+        status_layout.addWidget(QLabel("Bathroom"))
+        status_layout.addStretch()
+        layout.addLayout(status_layout)
+        
+        tabs = QTabWidget()
+        for title, model in (("Attendance", self.attendance_model),
+                             ("Bathroom Breaks", self.breaks_model),
+                             ("Nurse Visits", self.nurse_model)):
+            view = QTableView()
+            view.setModel(model)
+            view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            view.verticalHeader().setVisible(False)
+            view.setEditTriggers(QTableView.NoEditTriggers)
+            tabs.addTab(view, title)
+        layout.addWidget(tabs)
+        
+        self.breaks_model.rowsInserted.connect(self.update_bathroom_status)
+        self.breaks_model.dataChanged.connect(self.update_bathroom_status)
+        self.breaks_model.modelReset.connect(self.update_bathroom_status)
+        self.update_bathroom_status()
+    
+    def update_bathroom_status(self, *args):
+        self.bathroom_status.set_status(self.breaks_model.active_count() > 0)
+
 # Add custom AnalogClock widget
 class AnalogClock(QWidget):
+    """Clock face with hour, minute and (unless hidden) second hands.
+
+    The face and ticks are drawn once into a pixmap, again only when the
+    widget is resized, so each tick repaints just the hands over it. The
+    clock has no timer of its own: the window calls set_time().
+    """
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setMinimumSize(220, 220)
-        timer = QTimer(self)
-        timer.timeout.connect(self.update)
-        timer.start(1000)
+        self.time = QTime.currentTime()
+        self.show_seconds = True
+        self._face = None
 
-    def paintEvent(self, event):
+    def set_time(self, time, show_seconds=True):
+        """Show time (a QTime); without show_seconds the second hand is hidden"""
+        if time == self.time and show_seconds == self.show_seconds:
+            return
+        self.time = time
+        self.show_seconds = show_seconds
+        self.update()
+
+    def resizeEvent(self, event):
+        self._face = None
+        super().resizeEvent(event)
+
+    def _scale(self, painter):
         side = min(self.width(), self.height())
-        time = QTime.currentTime()
-        painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         painter.translate(self.width() / 2, self.height() / 2)
         painter.scale(side / 200.0, side / 200.0)
 
+    def _render_face(self):
+        ratio = self.devicePixelRatioF()
+        face = QPixmap(self.size() * ratio)
+        face.setDevicePixelRatio(ratio)
+        face.fill(Qt.transparent)
+        painter = QPainter(face)
+        self._scale(painter)
+
         # Draw clock face
         painter.setPen(QPen(QColor("#2bb3a3"), 8))
         painter.drawEllipse(-90, -90, 180, 180)
@@ -131,6 +302,16 @@ class AnalogClock(QWidget):
                 painter.rotate(i * 6)
                 painter.drawLine(0, -85, 0, -90)
                 painter.restore()
+        painter.end()
+        return face
+
+    def paintEvent(self, event):
+        if self._face is None:
+            self._face = self._render_face()
+        time = self.time
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._face)
+        self._scale(painter)
 
         # Draw hour hand
         painter.setPen(QPen(Qt.black, 8, Qt.SolidLine, Qt.RoundCap))
@@ -149,18 +330,83 @@ class AnalogClock(QWidget):
         painter.restore()
 
         # Draw second hand (red)
-        painter.setPen(QPen(Qt.red, 2, Qt.SolidLine, Qt.RoundCap))
-        second_angle = 6 * time.second()
-        painter.save()
-        painter.rotate(second_angle)
-        painter.drawLine(0, 10, 0, -75)
-        painter.restore()
+        if self.show_seconds:
+            painter.setPen(QPen(Qt.red, 2, Qt.SolidLine, Qt.RoundCap))
+            second_angle = 6 * time.second()
+            painter.save()
+            painter.rotate(second_angle)
+            painter.drawLine(0, 10, 0, -75)
+            painter.restore()
 
         # Draw center dot
         painter.setBrush(Qt.black)
         painter.setPen(Qt.NoPen)
         painter.drawEllipse(-6, -6, 12, 12)
 
+class StudentIdIndex:
+    """Sorted student_ids for matching keypad input as it is typed.
+
+    match() is two bisections, so it can run on every digit. The arrays
+    are rebuilt from the roster cache on the next match after a student
+    is added or the roster is reloaded.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._ids = []
+        self._names = []
+        self._stale = True
+        db.add_listener(self._roster_changed)
+
+    def _roster_changed(self, kind, details):
+        # May run on a worker thread; the rebuild happens on the next match
+        if kind in ('student_added', 'roster_reloaded'):
+            self._stale = True
+
+    def _rebuild(self):
+        self._stale = False
+        _, roster = self.db.roster_since(0)
+        roster.sort(key=lambda student: student[2])
+        self._ids = [student_id for _, _, student_id, _ in roster]
+        self._names = [name for _, _, _, name in roster]
+
+    def warm(self):
+        """Build the arrays now rather than on the next match"""
+        if self._stale:
+            self._rebuild()
+
+    def match(self, prefix):
+        """Return (how many student_ids start with prefix, (student_id, name) of the first)"""
+        if self._stale:
+            self._rebuild()
+        low = bisect_left(self._ids, prefix)
+        high = bisect_left(self._ids, prefix + "\U0010ffff", low)
+        return high - low, (self._ids[low], self._names[low]) if high > low else None
+
+
+def show_match(label, student_ids, text):
+    """Show what keypad input matches so far; returns the student_id to confirm, if any.
+
+    Input that is a whole student_id no other ID extends is confirmed
+    right away; a partial ID is never assumed to be the one student it
+    happens to narrow to.
+    """
+    if not text:
+        label.setText("")
+        return None
+    count, first = student_ids.match(text)
+    if count == 0:
+        label.setStyleSheet("color: #b71c1c;")
+        label.setText(f"No student ID starts with {text}")
+        return None
+    label.setStyleSheet("color: #23405a;")
+    if count == 1:
+        label.setText(first[1] or first[0])
+        return first[0] if first[0] == text else None
+    label.setText(f"{first[1]} (ID {text})" if first[0] == text else f"{count} students")
+    return None
+
+
 class KeypadOverlay(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -177,7 +423,7 @@ class KeypadOverlay(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
         container = QWidget()
         container.setStyleSheet("background: white; border-radius: 24px;")
-        container.setFixedSize(340, 440)
+        container.setFixedSize(340, 480)
         vbox = QVBoxLayout(container)
         vbox.setAlignment(Qt.AlignCenter)
         vbox.setContentsMargins(24, 24, 24, 24)
@@ -188,7 +434,13 @@ class KeypadOverlay(QWidget):
         self.input.setStyleSheet(
             "QLineEdit { background: #fff; color: #23405a; border: 2px solid #23405a; border-radius: 10px; padding: 8px; }"
         )
+        self.input.textChanged.connect(self.update_match)
         vbox.addWidget(self.input)
+        # Who the digits so far match
+        self.match_label = QLabel("")
+        self.match_label.setAlignment(Qt.AlignCenter)
+        self.match_label.setFont(QFont('Arial', 14, QFont.Bold))
+        vbox.addWidget(self.match_label)
         grid = QGridLayout()
         buttons = [
             ('1', 0, 0), ('2', 0, 1), ('3', 0, 2),
@@ -234,6 +486,12 @@ class KeypadOverlay(QWidget):
         vbox.addWidget(cancel_btn)
         layout.addWidget(container)
 
+    def update_match(self, text):
+        student_id = show_match(self.match_label, self.parent.student_ids, text)
+        if student_id:
+            self.hide()
+            self.parent.handle_manual_id_entry(student_id)
+
     def ok_pressed(self):
         student_id = self.input.text()
         self.hide()
@@ -263,9 +521,24 @@ class SettingsOverlay(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
         container = QWidget()
         container.setStyleSheet("background: white; border-radius: 24px;")
-        container.setFixedSize(400, 300)
+        container.setFixedSize(440, 580)
         vbox = QVBoxLayout(container)
         vbox.setAlignment(Qt.AlignCenter)
+        vbox.setContentsMargins(24, 24, 24, 24)
+        # Student search: ranked matches by name, student ID or card UID as the admin types
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search students by name or ID")
+        self.search_box.setFont(QFont('Arial', 16))
+        self.search_box.setStyleSheet("QLineEdit { background: #fff; color: #23405a; border: 2px solid #23405a; border-radius: 10px; padding: 8px; }")
+        self.search_box.textChanged.connect(self.update_search)
+        vbox.addWidget(self.search_box)
+        self.search_results = QListWidget()
+        self.search_results.setFont(QFont('Arial', 14))
+        self.search_results.setStyleSheet("QListWidget { border: 1px solid #ccc; border-radius: 8px; color: #23405a; }")
+        self.search_results.setFixedHeight(240)
+        self.search_results.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.search_results.setTextElideMode(Qt.ElideRight)
+        vbox.addWidget(self.search_results)
         vbox.addStretch()
         # Add New Student button
         add_btn = QPushButton('Add New Student')
@@ -273,6 +546,18 @@ class SettingsOverlay(QWidget):
         add_btn.setStyleSheet('QPushButton { background: #2bb3a3; color: white; border-radius: 16px; padding: 12px 0; } QPushButton:hover { background: #249e90; } QPushButton:pressed { background: #1e857a; }')
         add_btn.clicked.connect(self.show_add_student_dialog)
         vbox.addWidget(add_btn)
+        # Import Students button
+        import_btn = QPushButton('Import Students')
+        import_btn.setFont(QFont('Arial', 18, QFont.Bold))
+        import_btn.setStyleSheet('QPushButton { background: #23405a; color: white; border-radius: 16px; padding: 12px 0; } QPushButton:hover { background: #1a2e3d; } QPushButton:pressed { background: #162534; }')
+        import_btn.clicked.connect(self.show_import_dialog)
+        vbox.addWidget(import_btn)
+        # Dashboard button
+        dashboard_btn = QPushButton('View Dashboard')
+        dashboard_btn.setFont(QFont('Arial', 18, QFont.Bold))
+        dashboard_btn.setStyleSheet('QPushButton { background: #23405a; color: white; border-radius: 16px; padding: 12px 0; } QPushButton:hover { background: #1a2e3d; } QPushButton:pressed { background: #162534; }')
+        dashboard_btn.clicked.connect(self.show_dashboard)
+        vbox.addWidget(dashboard_btn)
         vbox.addStretch()
         layout.addWidget(container)
 
@@ -295,10 +580,28 @@ class SettingsOverlay(QWidget):
             else:
                 QMessageBox.warning(self, "Error", "Student with this NFC UID or Student ID already exists.")
 
+    def update_search(self, text):
+        self.search_results.clear()
+        for nfc_uid, student_id, name in self.parent.db.search_students(text):
+            card = f"card {nfc_uid}" if nfc_uid else "no card"
+            self.search_results.addItem(f"{name}  ·  {student_id}  ·  {card}")
+        if text.strip() and not self.search_results.count():
+            self.search_results.addItem("No matching students")
+
+    def show_import_dialog(self):
+        self.hide()
+        self.parent.show_import_dialog()
+
+    def show_dashboard(self):
+        self.hide()
+        self.parent.show_dashboard()
+
     def show_overlay(self):
         self.setGeometry(self.parent.rect())
+        self.search_box.clear()
         self.setVisible(True)
         self.raise_()
+        self.search_box.setFocus()
 
     def mousePressEvent(self, event):
         # Dismiss if click outside the white box
@@ -325,7 +628,7 @@ class BathroomOverlay(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
         container = QWidget()
         container.setStyleSheet("background: white; border-radius: 24px;")
-        container.setFixedSize(400, 520)
+        container.setFixedSize(400, 560)
         vbox = QVBoxLayout(container)
         vbox.setAlignment(Qt.AlignCenter)
         vbox.setContentsMargins(24, 24, 24, 24)
@@ -350,7 +653,12 @@ class BathroomOverlay(QWidget):
         self.input.setStyleSheet(
             "QLineEdit { background: #fff; color: #23405a; border: 2px solid #23405a; border-radius: 10px; padding: 8px; }"
         )
+        self.input.textChanged.connect(self.update_match)
         vbox.addWidget(self.input)
+        self.match_label = QLabel("")
+        self.match_label.setAlignment(Qt.AlignCenter)
+        self.match_label.setFont(QFont('Arial', 14, QFont.Bold))
+        vbox.addWidget(self.match_label)
         grid = QGridLayout()
         buttons = [
             ('1', 0, 0), ('2', 0, 1), ('3', 0, 2),
@@ -415,29 +723,40 @@ class BathroomOverlay(QWidget):
         self.message_label.hide()
         self.message_label.setText("")
 
+    def update_match(self, text):
+        student_id = show_match(self.match_label, self.parent.student_ids, text)
+        if student_id:
+            self.parent.process_bathroom_entry(student_id=student_id)
+            self.hide()
+
     def ok_pressed(self):
         student_id = self.input.text()
         if student_id:
             self.parent.process_bathroom_entry(student_id=student_id)
             self.hide()
 
-    def process_card(self, nfc_uid):
-        self.parent.process_bathroom_entry(nfc_uid=nfc_uid)
+    def process_card(self, nfc_uid, trace=NULL_TRACE):
+        self.parent.process_bathroom_entry(nfc_uid=nfc_uid, trace=trace)
         self.hide()
 
 class NFCReaderGUI(QMainWindow):
-    def __init__(self):
+    started_up = pyqtSignal()   # the work deferred until after the first paint is done
+
+    def __init__(self, port=None, readers=None, server=None, journal=None, idle_after=None):
         super().__init__()
         self.setWindowTitle("Student Attendance System")
         self.setGeometry(100, 100, 800, 500)
         
-        # Initialize database
-        self.db = StudentDatabase()
+        # Initialize database (local file, or an attendance_server.py shared by several kiosks);
+        # with a journal directory every tap is made durable there first, see tap_journal.py
+        self.server = server
+        self.journal = TapJournal(journal) if journal else None
+        self.db = self.open_database(self.journal)
+        STARTUP.mark("database opened")
         
-        # Serial connection variables
-        self.serial_port = None
-        self.serial_connection = None
-        self.connection_error_count = 0
+        # All NFC readers are serviced by one background thread that delivers
+        # parsed UIDs tagged with the reader's role; see reader_manager.py
+        self.reader_manager = None
         
         # Create main widget and layout
         main_widget = QWidget()
@@ -516,25 +835,43 @@ class NFCReaderGUI(QMainWindow):
         self.prompt.setStyleSheet("color: #23405a; background: #f5f7fa; padding: 24px 0 24px 0; border-bottom-left-radius: 24px; border-bottom-right-radius: 24px;")
         main_layout.addWidget(self.prompt)
         
-        # Timer for updating header date and time
-        self.time_timer = QTimer()
-        self.time_timer.timeout.connect(self.update_header_datetime)
-        self.time_timer.start(1000)
-        self.update_header_datetime()
+        # One timer drives the header and the clock, firing just after each second;
+        # with idle_after, once a minute after that many seconds without input or taps
+        self.idle_after = idle_after
+        self.idle = False
+        self.last_activity = time.monotonic()
+        self.activity_monitor = ActivityMonitor(self.note_activity, self) if idle_after else None
+        self.clock_timer = QTimer(self)
+        self.clock_timer.setSingleShot(True)
+        self.clock_timer.setTimerType(Qt.PreciseTimer)
+        self.clock_timer.timeout.connect(self.tick)
+        self.tick()
         
         # Current student ID
         self.current_student_id = None
         
-        # Auto-checkout on startup
-        self.db.auto_checkout_students()
-        # Periodic auto-checkout every minute
+        # Background roster import, see show_import_dialog
+        self.import_worker = None
+        self.import_progress = None
+        
+        # Dashboard, built the first time it is opened
+        self.dashboard = None
+        
+        # Paint hook for scan traces, created on the first traced tap
+        self.feedback_probe = None
+        
+        # Auto-checkout once the window is up, then again at each period end
         self.auto_checkout_timer = QTimer(self)
-        self.auto_checkout_timer.timeout.connect(self.db.auto_checkout_students)
-        self.auto_checkout_timer.start(60 * 1000)  # every 60 seconds
+        self.auto_checkout_timer.setSingleShot(True)
+        self.auto_checkout_timer.setTimerType(Qt.PreciseTimer)
+        self.auto_checkout_timer.timeout.connect(self.run_auto_checkout)
         
-        self.keypad_overlay = KeypadOverlay(self)
+        # Overlays, each built the first time it is shown
+        self.student_ids = StudentIdIndex(self.db)
+        self.keypad_overlay = None
+        self.settings_overlay = None
+        self.bathroom_overlay = None
         self.analog_clock.mousePressEvent = self.show_keypad_overlay
-        self.settings_overlay = SettingsOverlay(self)
         self.header.installEventFilter(self)
         self._header_press_time = None
         self._header_timer = QTimer(self)
@@ -542,71 +879,111 @@ class NFCReaderGUI(QMainWindow):
         self._header_timer.timeout.connect(self._show_settings_overlay)
         self.bathroom_mode = False
         self.break_start_button.clicked.connect(self.show_bathroom_overlay)
-        self.bathroom_overlay = BathroomOverlay(self)
+        STARTUP.mark("widgets built")
+        
+        # A single port given on the command line replaces the configured readers
+        if port:
+            readers = [ReaderConfig('Main door', port, 'checkin')]
+        self.start_readers(readers or load_readers())
+        STARTUP.mark("readers started")
+        
+        # Work that can wait until the window is up (see finish_startup) starts on
+        # the header's first paint, or after STARTUP_DEFER_MS if it is never painted
+        self.cache_warmer = None
+        self.first_painted = False
+        self._startup_steps = None
+        QTimer.singleShot(STARTUP_DEFER_MS, self.finish_startup)
     
-    def refresh_ports(self):
-        """Refresh the list of available serial ports"""
-        self.port_combo.clear()
-        ports = [port.device for port in serial.tools.list_ports.comports() 
-                if not port.device.endswith('debugconsole')]
-        if not ports:
-            self.status_label.setText("Status: No serial ports found")
-        self.port_combo.addItems(ports)
+    def open_database(self, journal=None):
+        """Open a new connection to the attendance data this kiosk uses"""
+        if self.server:
+            from attendance_server import RemoteStudentDatabase
+            return RemoteStudentDatabase(self.server, journal=journal)
+        return StudentDatabase(journal=journal)
     
-    def validate_port(self, port):
-        """Check if the port is valid and accessible"""
-        try:
-            test_connection = serial.Serial(port)
-            test_connection.close()
-            return True
-        except:
-            return False
+    def start_readers(self, readers):
+        """Start the background reader thread for a list of ReaderConfig"""
+        self.stop_readers()
+        self.reader_manager = ReaderManager(readers)
+        self.reader_manager.uid_scanned.connect(self.route_tap)
+        self.reader_manager.error.connect(
+            lambda name, message: logger.warning("Reader %s: %s", name, message))
+        self.reader_manager.connection_changed.connect(
+            lambda name, connected, port: logger.info("Reader %s %s %s", name,
+                                                      "connected on" if connected else "disconnected from", port))
+        self.reader_manager.start()
     
-    def toggle_connection(self):
-        """Connect to or disconnect from the selected serial port"""
-        if self.serial_connection is None:
-            try:
-                port = self.port_combo.currentText()
-                if not port:
-                    QMessageBox.warning(self, "Connection Error", "No port selected")
-                    return
-                
-                if not self.validate_port(port):
-                    QMessageBox.warning(self, "Connection Error", 
-                                      f"Port {port} is not accessible. Please check if the device is connected.")
-                    return
-                
-                self.serial_connection = serial.Serial(port, 115200, timeout=1)
-                self.status_label.setText(f"Status: Connected to {port}")
-                self.connect_button.setText("Disconnect")
-                self.timer.start(100)  # Read every 100ms
-                self.connection_error_count = 0
-            except Exception as e:
-                QMessageBox.critical(self, "Connection Error", str(e))
+    def route_tap(self, uid, reader, role, trace=NULL_TRACE):
+        """Send a tap to the handling for the role of the reader it came from"""
+        logger.debug("Tap %s on reader %s (%s)", uid, reader, role)
+        self.note_activity()
+        if role == 'bathroom':
+            self.process_bathroom_entry(nfc_uid=uid, trace=trace)
+        elif role == 'nurse':
+            self.process_nurse_entry(uid, trace)
         else:
-            self.disconnect()
+            self.read_serial(uid, trace)
     
-    def disconnect(self):
-        """Safely disconnect from the serial port"""
-        try:
-            if self.serial_connection and self.serial_connection.is_open:
-                self.serial_connection.close()
-        except:
-            pass
-        finally:
-            self.serial_connection = None
-            self.status_label.setText("Status: Disconnected")
-            self.connect_button.setText("Connect")
-            self.timer.stop()
-            self.button_widget.hide()
+    def finish_startup(self):
+        """Run the startup work that waits for the window to be up.
+
+        One step per pass of the event loop, so a tap that comes in
+        meanwhile is handled between steps, then the database cache is
+        warmed on a background thread; started_up is emitted at the end.
+        """
+        if self._startup_steps is not None:
+            return
+        self._startup_steps = [("auto-checkout", self.run_auto_checkout),
+                               ("student ID index", self.student_ids.warm)]
+        QTimer.singleShot(0, self.run_startup_step)
     
-    def parse_uid(self, data):
-        """Extract UID from the serial data"""
-        if "UID Value:" in data:
-            uid_part = data.split("UID Value:")[1].strip()
-            uid = uid_part.replace("0x", "").replace(" ", "")
-            return uid
-        return None
+    def run_startup_step(self):
+        milestone, step = self._startup_steps.pop(0)
+        step()
+        STARTUP.mark(milestone)
+        if self._startup_steps:
+            QTimer.singleShot(0, self.run_startup_step)
+        elif self.server:
+            self.started_up.emit()   # the server keeps its own database warm
+        else:
+            self.cache_warmer = CacheWarmer(self.db, self)
+            self.cache_warmer.finished.connect(self.cache_warmed)
+            self.cache_warmer.start()
+    
+    def cache_warmed(self):
+        STARTUP.mark("cache warmed")
+        self.started_up.emit()
+    
+    def run_auto_checkout(self):
+        """Run the end-of-period pass and arm the timer for the next period end"""
+        self.db.auto_checkout_students()
+        self.schedule_auto_checkout()
+    
+    def schedule_auto_checkout(self):
+        now = datetime.now()
+        period_end = next_period_end(now)
+        if period_end is None:
+            return  # no bells scheduled in the coming year
+        delay = period_end - now
+        self.auto_checkout_timer.start(int(delay.total_seconds() * 1000) + 1)
+    
+    def stop_readers(self):
+        """Stop the background reader thread if it is running"""
+        if self.reader_manager is not None:
+            self.reader_manager.stop()
+            self.reader_manager = None
+    
+    def closeEvent(self, event):
+        self.stop_readers()
+        if self.cache_warmer is not None:
+            self.cache_warmer.wait()
+        if self.import_worker is not None:
+            self.import_worker.wait()
+        if self.journal is not None:
+            # Let the background writes land before the journal closes
+            self.db.close()
+            self.journal.close()
+        super().closeEvent(event)
     
     def show_add_student_dialog(self):
         """Show dialog to add a new student"""
@@ -635,10 +1012,7 @@ class NFCReaderGUI(QMainWindow):
         self.nurse_button.setEnabled(False)
         success, message = self.db.start_bathroom_break(self.current_student_id)
         if success:
-            # Update the bathroom status indicator immediately
-            self.bathroom_status.set_status(True)
-            # Update the tables to show the new break
-            self.update_tables()
+            # The dashboard follows database change events on its own
             # Show success message
             self.prompt.setText("Break started successfully")
         else:
@@ -653,142 +1027,101 @@ class NFCReaderGUI(QMainWindow):
             
         success, message = self.db.start_nurse_visit(self.current_student_id)
         if success:
-            # Update the tables to show the new nurse visit
-            self.update_tables()
             # Show success message
             self.prompt.setText("Nurse visit started successfully")
         else:
             # Show error message
             self.prompt.setText(message)
     
-    def update_tables(self):
-        """Update attendance and breaks tables"""
-        # Update attendance table
-        attendance_data = self.db.get_today_attendance()
-        print(f"Updating attendance table with {len(attendance_data)} records")
-        
-        self.attendance_table.setRowCount(len(attendance_data))
-        for i, (student_id, name, check_in, _) in enumerate(attendance_data):
-            print(f"Processing student {name} (ID: {student_id})")
-            
-            # Name column
-            name_item = QTableWidgetItem(name or "Unknown")
-            name_item.setTextAlignment(Qt.AlignCenter)
-            self.attendance_table.setItem(i, 0, name_item)
-            
-            # Check-in column
-            if check_in:
-                check_in_str = check_in.strftime("%H:%M:%S")
-                print(f"  Check-in time: {check_in_str}")
-            else:
-                check_in_str = "Not checked in"
-                print(f"  No check-in time")
-            check_in_item = QTableWidgetItem(check_in_str)
-            check_in_item.setTextAlignment(Qt.AlignCenter)
-            self.attendance_table.setItem(i, 1, check_in_item)
-        
-        # Update breaks table
-        breaks_data = self.db.get_today_breaks()
-        self.breaks_table.setRowCount(len(breaks_data))
-        for i, (name, start, end, duration) in enumerate(breaks_data):
-            # Name column
-            name_item = QTableWidgetItem(name)
-            name_item.setTextAlignment(Qt.AlignCenter)
-            self.breaks_table.setItem(i, 0, name_item)
-            
-            # Break start column
-            start_str = start.strftime("%H:%M:%S") if start else ""
-            start_item = QTableWidgetItem(start_str)
-            start_item.setTextAlignment(Qt.AlignCenter)
-            self.breaks_table.setItem(i, 1, start_item)
-            
-            # Break end column
-            end_str = end.strftime("%H:%M:%S") if end else "In progress"
-            end_item = QTableWidgetItem(end_str)
-            end_item.setTextAlignment(Qt.AlignCenter)
-            self.breaks_table.setItem(i, 2, end_item)
-            
-            # Duration column
-            duration_str = f"{duration} min" if duration else ""
-            duration_item = QTableWidgetItem(duration_str)
-            duration_item.setTextAlignment(Qt.AlignCenter)
-            self.breaks_table.setItem(i, 3, duration_item)
-        
-        # Update bathroom status indicator
-        has_active_breaks = any(break_end is None for _, _, break_end, _ in breaks_data)
-        self.bathroom_status.set_status(has_active_breaks)
-        
-        # Update nurse visits table
-        nurse_data = self.db.get_today_nurse_visits()
-        self.nurse_table.setRowCount(len(nurse_data))
-        for i, (name, start, end, duration) in enumerate(nurse_data):
-            # Name column
-            name_item = QTableWidgetItem(name)
-            name_item.setTextAlignment(Qt.AlignCenter)
-            self.nurse_table.setItem(i, 0, name_item)
-            
-            # Visit start column
-            start_str = start.strftime("%H:%M:%S") if start else ""
-            start_item = QTableWidgetItem(start_str)
-            start_item.setTextAlignment(Qt.AlignCenter)
-            self.nurse_table.setItem(i, 1, start_item)
-            
-            # Visit end column
-            end_str = end.strftime("%H:%M:%S") if end else "In progress"
-            end_item = QTableWidgetItem(end_str)
-            end_item.setTextAlignment(Qt.AlignCenter)
-            self.nurse_table.setItem(i, 2, end_item)
-            
-            # Duration column
-            duration_str = f"{duration} min" if duration else ""
-            duration_item = QTableWidgetItem(duration_str)
-            duration_item.setTextAlignment(Qt.AlignCenter)
-            self.nurse_table.setItem(i, 3, duration_item)
-        
-        # Force the table to update
-        self.attendance_table.viewport().update()
+    def show_dashboard(self):
+        """Show the attendance dashboard (non-modal; it keeps itself up to date)"""
+        if self.dashboard is None:
+            self.dashboard = DashboardDialog(self.db, self)
+        self.dashboard.show()
+        self.dashboard.raise_()
     
     def show_import_dialog(self):
-        """Show dialog to import students from file"""
+        """Show dialog to import students from file; the import runs on a worker thread"""
+        if self.import_worker is not None:
+            QMessageBox.warning(self, "Import", "An import is already running")
+            return
         dialog = ImportDialog(self)
         if dialog.exec_():
             file_path = dialog.file_path.text()
             if not file_path:
                 return
-                
-            try:
-                if file_path.endswith('.csv'):
-                    results = self.db.import_from_csv(file_path)
-                elif file_path.endswith('.json'):
-                    results = self.db.import_from_json(file_path)
-                else:
-                    QMessageBox.warning(self, "Error", "Unsupported file format")
-                    return
-                
-                # Show results
-                message = f"Import completed:\n"
-                message += f"Successfully imported: {results['success']}\n"
-                message += f"Failed to import: {results['failed']}\n"
-                
-                if results['errors']:
-                    message += "\nErrors:\n"
-                    for error in results['errors'][:5]:  # Show first 5 errors
-                        message += f"- {error}\n"
-                    if len(results['errors']) > 5:
-                        message += f"... and {len(results['errors']) - 5} more errors"
-                
-                QMessageBox.information(self, "Import Results", message)
-                
-            except Exception as e:
-                QMessageBox.critical(self, "Import Error", str(e))
-
-    def update_header_datetime(self):
+            if not file_path.endswith(('.csv', '.json')):
+                QMessageBox.warning(self, "Error", "Unsupported file format")
+                return
+            
+            # Non-modal progress so taps keep being handled during the import
+            self.import_progress = QProgressDialog("Importing students...", None, 0, 100, self)
+            self.import_progress.setWindowTitle("Import Students")
+            self.import_progress.setMinimumDuration(0)
+            self.import_progress.setValue(0)
+            self.import_worker = ImportWorker(self.open_database, file_path, dialog.update_existing.isChecked(), self)
+            self.import_worker.progress.connect(self.update_import_progress)
+            self.import_worker.completed.connect(self.show_import_results)
+            self.import_worker.start()
+    
+    def update_import_progress(self, rows, percent):
+        self.import_progress.setLabelText(f"Importing students... {rows} rows read")
+        self.import_progress.setValue(percent)
+    
+    def show_import_results(self, results):
+        self.import_worker.wait()
+        self.import_worker.deleteLater()
+        self.import_worker = None
+        self.import_progress.close()
+        # Pick up the new roster now rather than at the next sync
+        self.db.load_roster()
+        
+        # Show results
+        message = f"Import completed:\n"
+        message += f"Successfully imported: {results['success']}\n"
+        if results.get('updated'):
+            message += f"Updated existing: {results['updated']}\n"
+        message += f"Failed to import: {results['failed']}\n"
+        
+        if results['errors']:
+            message += "\nErrors:\n"
+            for error in results['errors'][:5]:  # Show first 5 errors
+                message += f"- {error}\n"
+            if len(results['errors']) > 5:
+                message += f"... and {len(results['errors']) - 5} more errors"
+        
+        QMessageBox.information(self, "Import Results", message)
+
+    def tick(self):
+        """Update the header and clock, then re-arm for just after the next second (minute while idle)"""
         now = datetime.now()
+        if self.idle_after and not self.idle and time.monotonic() - self.last_activity >= self.idle_after:
+            self.idle = True
+        self.update_header_datetime(now)
+        if self.idle:
+            self.analog_clock.set_time(QTime(now.hour, now.minute), show_seconds=False)
+            delay_ms = (60 - now.second) * 1000 - now.microsecond // 1000
+        else:
+            self.analog_clock.set_time(QTime(now.hour, now.minute, now.second))
+            delay_ms = 1000 - now.microsecond // 1000
+        self.clock_timer.start(delay_ms + TICK_SLACK_MS)
+
+    def note_activity(self):
+        """Input or a tap: restart the idle countdown, waking the clock if it is idle"""
+        self.last_activity = time.monotonic()
+        if self.idle:
+            self.idle = False
+            self.tick()
+
+    def update_header_datetime(self, now=None):
+        now = now or datetime.now()
         date_str = now.strftime('%A, %B %d, %Y')
         time_str = now.strftime('%I:%M %p').lstrip('0')
         self.header.setText(f"{date_str}   {time_str}")
 
     def show_keypad_overlay(self, event):
+        if self.keypad_overlay is None:
+            self.keypad_overlay = KeypadOverlay(self)
         self.keypad_overlay.show_overlay()
 
     def handle_manual_id_entry(self, student_id):
@@ -796,7 +1129,7 @@ class NFCReaderGUI(QMainWindow):
         result = self.db.get_student_by_student_id(student_id)
         if result:
             nfc_uid, student_name = result
-            print(f"[DEBUG] Manual entry resolved student_id {student_id} to nfc_uid {nfc_uid}")
+            logger.debug("Manual entry resolved student_id %s to nfc_uid %s", student_id, nfc_uid)
             identifier = nfc_uid if nfc_uid else student_id
             # Check in using whichever identifier is available
             success, message = self.db.check_in(nfc_uid=nfc_uid if nfc_uid else None, student_id=student_id if not nfc_uid else None)
@@ -809,7 +1142,13 @@ class NFCReaderGUI(QMainWindow):
 
     def eventFilter(self, obj, event):
         if obj == self.header:
-            if event.type() == event.MouseButtonPress:
+            if event.type() == event.Paint:
+                if self._startup_steps is None and not self.first_painted:
+                    # Ready for the first tap; let this paint finish before the deferred work
+                    self.first_painted = True
+                    STARTUP.mark("ready for first tap")
+                    QTimer.singleShot(0, self.finish_startup)
+            elif event.type() == event.MouseButtonPress:
                 self._header_press_time = datetime.now()
                 self._header_timer.start(5000)
             elif event.type() == event.MouseButtonRelease:
@@ -819,12 +1158,28 @@ class NFCReaderGUI(QMainWindow):
         return super().eventFilter(obj, event)
 
     def _show_settings_overlay(self):
+        if self.settings_overlay is None:
+            self.settings_overlay = SettingsOverlay(self)
         self.settings_overlay.show_overlay()
 
     def show_bathroom_overlay(self):
+        if self.bathroom_overlay is None:
+            self.bathroom_overlay = BathroomOverlay(self)
         self.bathroom_overlay.show_overlay()
 
-    def process_bathroom_entry(self, student_id=None, nfc_uid=None):
+    def hide_bathroom_overlay(self):
+        if self.bathroom_overlay is not None:
+            self.bathroom_overlay.hide()
+
+    def expect_feedback(self, trace, widget=None):
+        """Have a scan trace finish when its feedback is painted (no-op unless tracing)"""
+        if not trace:
+            return
+        if self.feedback_probe is None:
+            self.feedback_probe = FeedbackProbe(self)
+        self.feedback_probe.expect(trace, widget)
+
+    def process_bathroom_entry(self, student_id=None, nfc_uid=None, trace=NULL_TRACE):
         # Unified logic: use nfc_uid if available, else use student_id
         if nfc_uid:
             result = self.db.get_student_by_uid(nfc_uid)
@@ -843,14 +1198,17 @@ class NFCReaderGUI(QMainWindow):
         else:
             self.prompt.setText("No student information provided.")
             return
+        trace.mark("resolved")
 
-        print(f"[DEBUG] Bathroom entry using identifier: {identifier}")
+        logger.debug("Bathroom entry using identifier: %s", identifier)
+        self.expect_feedback(trace, self.prompt)
         is_on_break = self.db.is_on_break(identifier)
         if is_on_break:
             success, message = self.db.end_bathroom_break(identifier)
+            trace.mark("committed")
             if success:
                 self.prompt.setText("Bathroom break ended!")
-                QTimer.singleShot(3000, self.bathroom_overlay.hide)
+                QTimer.singleShot(3000, self.hide_bathroom_overlay)
                 QTimer.singleShot(3000, lambda: self.prompt.setText("Tap your ID or enter ID number"))
             else:
                 self.prompt.setText(message)
@@ -859,42 +1217,99 @@ class NFCReaderGUI(QMainWindow):
                 self.prompt.setText("Student is not checked in")
                 return
             success, message = self.db.start_bathroom_break(identifier)
+            trace.mark("committed")
             if success:
                 self.prompt.setText("Bathroom break started!")
-                QTimer.singleShot(3000, self.bathroom_overlay.hide)
+                QTimer.singleShot(3000, self.hide_bathroom_overlay)
                 QTimer.singleShot(3000, lambda: self.prompt.setText("Tap your ID or enter ID number"))
             else:
                 self.prompt.setText(message)
 
-    def read_serial(self):
-        if not self.serial_connection:
+    def process_nurse_entry(self, nfc_uid, trace=NULL_TRACE):
+        """A tap at the nurse office reader starts or ends that student's visit"""
+        if self.db.get_student_by_uid(nfc_uid) is None:
+            self.prompt.setText("No student found with that card.")
             return
+        trace.mark("resolved")
+        self.expect_feedback(trace, self.prompt)
+        if self.db.is_at_nurse(nfc_uid):
+            success, message = self.db.end_nurse_visit(nfc_uid=nfc_uid)
+            done = "Nurse visit ended!"
+        else:
+            success, message = self.db.start_nurse_visit(nfc_uid=nfc_uid)
+            done = "Nurse visit started!"
+        trace.mark("committed")
+        if success:
+            self.prompt.setText(done)
+            QTimer.singleShot(3000, lambda: self.prompt.setText("Tap your ID or enter ID number"))
+        else:
+            self.prompt.setText(message)
+
+    def read_serial(self, uid, trace=NULL_TRACE):
+        """Handle a UID delivered by the background serial reader"""
         try:
-            if self.serial_connection.is_open and self.serial_connection.in_waiting:
-                data = self.serial_connection.readline().decode('utf-8').strip()
-                if data:
-                    uid = self.parse_uid(data)
-                    if uid:
-                        if self.bathroom_overlay.isVisible():
-                            self.bathroom_overlay.process_card(uid)
-                            return
-                        # ... existing logic for normal card scan ...
-                        self.current_student_id = uid
-                        result = self.db.get_student_by_uid(uid)
-                        if result:
-                            student_id, student_name = result
-                            success, message = self.db.check_in(nfc_uid=uid)
-                            if success:
-                                QMessageBox.information(self, "Check In", f"Student: {student_name}\n(ID: {student_id}) checked in.")
-                            else:
-                                QMessageBox.warning(self, "Error", message)
-                        else:
-                            QMessageBox.warning(self, "Error", f"Unknown Student (UID: {uid})")
+            if self.bathroom_overlay is not None and self.bathroom_overlay.isVisible():
+                self.bathroom_overlay.process_card(uid, trace)
+                return
+            self.current_student_id = uid
+            result = self.db.get_student_by_uid(uid)
+            trace.mark("resolved")
+            self.expect_feedback(trace)
+            if result:
+                student_id, student_name = result
+                success, message = self.db.check_in(nfc_uid=uid)
+                trace.mark("committed")
+                if success:
+                    QMessageBox.information(self, "Check In", f"Student: {student_name}\n(ID: {student_id}) checked in.")
+                else:
+                    QMessageBox.warning(self, "Error", message)
+            else:
+                QMessageBox.warning(self, "Error", f"Unknown Student (UID: {uid})")
         except Exception as e:
             QMessageBox.critical(self, "Serial Error", str(e))
 
+def parse_args(argv):
+    """Parse our options, leaving the rest (e.g. -platform) for Qt"""
+    parser = argparse.ArgumentParser(description="Student attendance kiosk")
+    parser.add_argument("--port", default=None,
+                        help="single check-in reader port or pyserial URL, e.g. /dev/ttyUSB0 or "
+                             "socket://127.0.0.1:7000 (overrides --readers)")
+    parser.add_argument("--readers", default=None,
+                        help="reader configuration file (default: readers.json, else one auto-detected reader)")
+    parser.add_argument("--server", default=None,
+                        help="use the database served by attendance_server.py at HOST:PORT instead of a local file "
+                             "(its token is read from $ATTENDANCE_SERVER_TOKEN)")
+    parser.add_argument("--journal", metavar="DIR", default=None,
+                        help="journal every tap durably in DIR first (implies group commit and WAL)")
+    parser.add_argument("--log-level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="logging threshold")
+    parser.add_argument("--trace", action="store_true",
+                        help="time each tap from serial bytes to painted feedback; report on exit")
+    parser.add_argument("--slow-ms", type=float, default=None,
+                        help="keep traces of taps slower than this (default 250)")
+    parser.add_argument("--idle-after", type=float, default=None, metavar="SECONDS",
+                        help="after this long without a tap or touch, update the clock once a minute "
+                             "and hide its second hand until the next one (default: never)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each startup step took once startup has finished, then exit")
+    return parser.parse_known_args(argv[1:])
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = NFCReaderGUI()
+    args, qt_args = parse_args(sys.argv)
+    logging.basicConfig(level=getattr(logging, args.log_level),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    TRACER.configure(enabled=args.trace, slow_ms=args.slow_ms)
+    app = QApplication(sys.argv[:1] + qt_args)
+    STARTUP.mark("QApplication")
+    readers = load_readers(args.readers) if args.readers else None
+    window = NFCReaderGUI(args.port, readers, args.server, args.journal, args.idle_after)
     window.show()
-    sys.exit(app.exec_()) 
\ No newline at end of file
+    STARTUP.mark("shown")
+    if args.profile_startup:
+        window.started_up.connect(window.close)
+    status = app.exec_()
+    if TRACER.enabled:
+        print(TRACER.report())
+    if args.profile_startup:
+        print(STARTUP.report())
+    sys.exit(status) 
\ No newline at end of file
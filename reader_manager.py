@@ -0,0 +1,268 @@
+"""Service every NFC reader attached to the kiosk from one I/O thread.
+
+One machine can run several readers, each with a role that decides what a
+tap means:
+
+    checkin    main door: check the student in
+    bathroom   bathroom pass station: start or end a break
+    nurse      nurse office: start or end a nurse visit
+
+Readers are listed in readers.json next to this file::
+
+    {
+      "readers": [
+        {"name": "Main door", "port": "auto",            "role": "checkin"},
+        {"name": "Bathroom",  "port": "/dev/ttyUSB1",    "role": "bathroom"},
+        {"name": "Nurse",     "port": "rfc2217://nurse-pi:4000", "role": "nurse"}
+      ]
+    }
+
+``port`` is a device path or any pyserial URL (socket://, rfc2217://, ...);
+"auto" picks the first serial port no other reader claims. Without the file
+there is a single auto-detected check-in reader, as before.
+
+ReaderManager waits on all ports at once with a selector; ports without a
+file descriptor (rfc2217://) are polled every POLL_INTERVAL. Each tap is
+emitted with the reader's name and role, so the GUI can route it.
+"""
+
+import json
+import os
+import queue
+import selectors
+import socket
+import time
+from collections import namedtuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from reader_protocol import LineFramer, ProtocolError, encode_command, parse_uid
+from tracing import TRACER
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'readers.json')
+
+BAUD_RATE = 115200
+RECONNECT_DELAY = 1.0    # seconds between attempts to open a port that failed
+POLL_INTERVAL = 0.02     # seconds between reads of ports that cannot be selected on
+READ_CHUNK = 4096
+
+ROLES = ('checkin', 'bathroom', 'nurse')
+AUTO_PORT = 'auto'
+
+ReaderConfig = namedtuple('ReaderConfig', ['name', 'port', 'role'])
+
+
+def find_reader_port(exclude=()):
+    """Return the first serial port that looks like a reader, or None"""
+    import serial.tools.list_ports
+    for port in serial.tools.list_ports.comports():
+        if not port.device.endswith('debugconsole') and port.device not in exclude:
+            return port.device
+    return None
+
+
+def load_readers(path=CONFIG_FILE):
+    """Load the reader list, falling back to one auto-detected check-in reader"""
+    if not path or not os.path.exists(path):
+        return [ReaderConfig('Main door', AUTO_PORT, 'checkin')]
+    with open(path, 'r') as file:
+        config = json.load(file)
+    readers = []
+    for entry in config['readers']:
+        reader = ReaderConfig(entry['name'], entry.get('port') or AUTO_PORT, entry.get('role', 'checkin'))
+        if reader.role not in ROLES:
+            raise ValueError(f"Reader {reader.name!r} has unknown role {reader.role!r}")
+        if any(existing.name == reader.name for existing in readers):
+            raise ValueError(f"Reader name {reader.name!r} is used twice")
+        readers.append(reader)
+    return readers
+
+
+class _Reader:
+    """Connection state for one configured reader"""
+
+    def __init__(self, config):
+        self.config = config
+        self.connection = None
+        self.port = None
+        self.fd = None
+        self.framer = LineFramer()
+        self.retry_at = 0.0
+        self.rejected_frames = 0
+        self.selectable = False
+
+
+class ReaderManager(QThread):
+    """Read all configured readers on one worker thread.
+
+    Every byte a port delivers is framed into lines as soon as it arrives;
+    only parsed UIDs cross over to the GUI thread, tagged with the reader's
+    name and role and carrying the trace started when the bytes arrived.
+    """
+
+    uid_scanned = pyqtSignal(str, str, str, object)     # uid, reader name, role, trace
+    connection_changed = pyqtSignal(str, bool, str)     # reader name, connected, port
+    error = pyqtSignal(str, str)                        # reader name, message
+
+    def __init__(self, readers, baudrate=BAUD_RATE, parent=None):
+        super().__init__(parent)
+        self.readers = [_Reader(config) for config in readers]
+        self.baudrate = baudrate
+        self._running = False
+        self._outgoing = queue.SimpleQueue()
+        self._selector = None
+        # Lets other threads interrupt the selector (commands, stop)
+        self._wake_receiver, self._wake_sender = socket.socketpair()
+        self._wake_receiver.setblocking(False)
+
+    @property
+    def rejected_frames(self):
+        return sum(reader.rejected_frames for reader in self.readers)
+
+    def send_command(self, setting, value=None, reader=None):
+        """Queue a protocol command for one reader (by name) or all of them (safe from any thread)"""
+        self._outgoing.put((reader, encode_command(setting, value).encode('ascii')))
+        self._wake()
+
+    def set_verbose(self, enabled, reader=None):
+        """Switch the readers' human-readable debug output on or off"""
+        self.send_command('VERBOSE', enabled, reader)
+
+    def set_sector_read(self, enabled, reader=None):
+        """Switch the readers' per-tap sector 1 dump on or off"""
+        self.send_command('SECTOR', enabled, reader)
+
+    def stop(self):
+        """Ask the thread to finish and wait for it"""
+        self._running = False
+        self._wake()
+        self.wait()
+        self._wake_receiver.close()
+        self._wake_sender.close()
+
+    def _wake(self):
+        try:
+            self._wake_sender.send(b'\0')
+        except OSError:
+            pass
+
+    def run(self):
+        self._running = True
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wake_receiver, selectors.EVENT_READ, None)
+        try:
+            while self._running:
+                now = time.monotonic()
+                for reader in self.readers:
+                    if reader.connection is None and now >= reader.retry_at:
+                        self._open(reader)
+                self._send_commands()
+                polled = [reader for reader in self.readers
+                          if reader.connection is not None and not reader.selectable]
+                waiting = [reader.retry_at - now for reader in self.readers if reader.connection is None]
+                timeout = min([RECONNECT_DELAY] + [max(0.0, delay) for delay in waiting])
+                if polled:
+                    timeout = min(timeout, POLL_INTERVAL)
+                for key, _ in self._selector.select(timeout):
+                    if key.data is None:
+                        self._drain_wake()
+                    else:
+                        self._read(key.data)
+                for reader in polled:
+                    self._read(reader)
+        finally:
+            for reader in self.readers:
+                self._close(reader)
+            self._selector.close()
+            self._selector = None
+
+    def _drain_wake(self):
+        try:
+            while self._wake_receiver.recv(256):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _send_commands(self):
+        while not self._outgoing.empty():
+            name, data = self._outgoing.get()
+            for reader in self.readers:
+                if reader.connection is not None and name in (None, reader.config.name):
+                    try:
+                        reader.connection.write(data)
+                    except OSError as e:
+                        self._fail(reader, e)
+
+    def _read(self, reader):
+        if reader.connection is None:
+            return
+        try:
+            chunk = reader.connection.read(READ_CHUNK)
+        except OSError as e:
+            self._fail(reader, e)
+            return
+        if not chunk:
+            return
+        arrived = time.perf_counter_ns()
+        for line in reader.framer.feed(chunk):
+            try:
+                uid = parse_uid(line)
+            except ProtocolError:
+                reader.rejected_frames += 1
+                continue
+            if uid:
+                trace = TRACER.start(f"{reader.config.name} {uid}", arrived)
+                trace.mark("parsed")
+                self.uid_scanned.emit(uid, reader.config.name, reader.config.role, trace)
+
+    def _open(self, reader):
+        port = reader.config.port
+        if port == AUTO_PORT:
+            claimed = {other.port for other in self.readers if other is not reader and other.port}
+            claimed.update(other.config.port for other in self.readers)
+            port = find_reader_port(exclude=claimed)
+        reader.retry_at = time.monotonic() + RECONNECT_DELAY
+        if not port:
+            return
+        # Imported here, on the reader thread, to keep pyserial off the kiosk's startup
+        # path; the other handlers catch its SerialException as the OSError it is
+        import serial
+        try:
+            # timeout=0: reads return whatever is buffered without blocking the loop
+            connection = serial.serial_for_url(port, self.baudrate, timeout=0)
+        except (serial.SerialException, OSError, ValueError):
+            return
+        reader.connection = connection
+        reader.port = port
+        reader.framer.reset()
+        try:
+            reader.fd = connection.fileno()
+            self._selector.register(reader.fd, selectors.EVENT_READ, reader)
+            reader.selectable = True
+        except (AttributeError, OSError, ValueError, serial.SerialException):
+            reader.selectable = False
+        self.connection_changed.emit(reader.config.name, True, port)
+
+    def _fail(self, reader, error):
+        self.error.emit(reader.config.name, str(error))
+        self._close(reader)
+        reader.retry_at = time.monotonic() + RECONNECT_DELAY
+
+    def _close(self, reader):
+        connection = reader.connection
+        if connection is None:
+            return
+        if reader.selectable and self._selector is not None:
+            try:
+                self._selector.unregister(reader.fd)
+            except (KeyError, ValueError):
+                pass
+        try:
+            connection.close()
+        except OSError:
+            pass
+        reader.connection = None
+        reader.fd = None
+        reader.selectable = False
+        self.connection_changed.emit(reader.config.name, False, reader.port or "")
+        if reader.config.port == AUTO_PORT:
+            reader.port = None
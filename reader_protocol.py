@@ -0,0 +1,184 @@
+"""Compact line protocol spoken between the ESP32 reader and the host.
+
+Every message is one ASCII line::
+
+    <kind><version>:<payload>*<crc>
+
+``kind`` is a single letter, ``version`` is PROTOCOL_VERSION and ``crc`` is
+the CRC-8 (poly 0x07, init 0x00) of everything before the ``*``, written as
+two upper-case hex digits. Reader to host:
+
+    U1:04A1B2C3*xx        card tapped, UID as zero-padded hex
+    B1:4:00112233...*xx   sector-read mode: one 16-byte block
+    A1:VERBOSE=1*xx       acknowledgement of a command / current setting
+    I1:READY*xx           reader finished booting
+    E1:BADCRC*xx          the reader rejected a command
+
+Host to reader:
+
+    C1:VERBOSE=0|1*xx     human-readable debug output (sent as '#' lines)
+    C1:SECTOR=0|1*xx      authenticate and dump blocks 4-7 after each tap
+    C1:STATUS*xx          report the current settings
+
+Lines that do not start with a frame (boot messages, '#' debug lines) are
+ignored. Older firmware that only prints the verbose ``UID Value:`` block is
+still understood by parse_uid.
+"""
+
+from collections import namedtuple
+
+PROTOCOL_VERSION = 1
+
+UID = 'U'
+BLOCK = 'B'
+ACK = 'A'
+INFO = 'I'
+ERROR = 'E'
+COMMAND = 'C'
+
+SETTINGS = ('VERBOSE', 'SECTOR')
+
+MAX_LINE_LENGTH = 512  # drop garbage that never sees a newline
+
+Frame = namedtuple('Frame', ['kind', 'version', 'payload'])
+
+
+class ProtocolError(ValueError):
+    """Raised when a line looks like a frame but cannot be decoded"""
+
+
+class LineFramer:
+    """Split a raw serial byte stream into complete text lines.
+
+    Bytes are fed in whatever chunks the port hands back; any trailing partial
+    line is kept until the rest of it arrives.
+    """
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        self.max_line_length = max_line_length
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        """Add a chunk of bytes and return the list of completed lines"""
+        self._buffer.extend(chunk)
+        lines = []
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = self._buffer[start:end].decode("utf-8", errors="replace").strip()
+            if line:
+                lines.append(line)
+            start = end + 1
+        del self._buffer[:start]
+        if len(self._buffer) > self.max_line_length:
+            self._buffer.clear()
+        return lines
+
+    def reset(self):
+        self._buffer.clear()
+
+
+def _build_crc_table():
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def crc8(data):
+    """CRC-8 with polynomial 0x07 (same result as the firmware's bitwise loop)"""
+    crc = 0
+    table = _CRC_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+def encode_frame(kind, payload, version=PROTOCOL_VERSION):
+    """Return the text of a frame (without the line terminator)"""
+    body = f"{kind}{version}:{payload}"
+    return f"{body}*{crc8(body.encode('ascii')):02X}"
+
+
+def is_frame(line):
+    """Cheap check for whether a line is meant to be a frame"""
+    return len(line) >= 3 and line[0].isalpha() and line[0].isupper() and ':' in line[1:4]
+
+
+def decode_frame(line):
+    """Decode one line into a Frame, raising ProtocolError if it is damaged"""
+    line = line.strip()
+    body, sep, checksum = line.rpartition('*')
+    if not sep or len(checksum) != 2:
+        raise ProtocolError(f"Missing checksum: {line!r}")
+    try:
+        expected = int(checksum, 16)
+        actual = crc8(body.encode('ascii'))
+    except (ValueError, UnicodeEncodeError):
+        raise ProtocolError(f"Malformed frame: {line!r}")
+    if expected != actual:
+        raise ProtocolError(f"Checksum mismatch: {line!r}")
+    header, sep, payload = body.partition(':')
+    if not sep or len(header) < 2:
+        raise ProtocolError(f"Malformed frame: {line!r}")
+    try:
+        version = int(header[1:])
+    except ValueError:
+        raise ProtocolError(f"Malformed frame: {line!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    return Frame(header[0], version, payload)
+
+
+def uid_string(uid_bytes):
+    """Return the UID string stored in the database for a card.
+
+    Cards were enrolled with the old verbose output, which prints each byte
+    with Serial.print(HEX) and so drops leading zeros. Keep that format so
+    existing registrations keep matching.
+    """
+    return ''.join(f"{byte:X}" for byte in uid_bytes)
+
+
+def parse_legacy_uid(line):
+    """Extract the UID from an old-style 'UID Value: 0x.. 0x..' line"""
+    if "UID Value:" in line:
+        uid_part = line.split("UID Value:")[1].strip()
+        return uid_part.replace("0x", "").replace(" ", "")
+    return None
+
+
+def parse_uid(line):
+    """Return the UID carried by a reader line, or None.
+
+    Raises ProtocolError for a line shaped like a frame that fails to decode,
+    so the caller can count damaged frames; other lines simply return None.
+    """
+    if line.startswith('#'):
+        return None
+    if is_frame(line):
+        frame = decode_frame(line)
+        if frame.kind != UID:
+            return None
+        try:
+            return uid_string(bytes.fromhex(frame.payload))
+        except ValueError:
+            raise ProtocolError(f"Bad UID payload: {frame.payload!r}")
+    return parse_legacy_uid(line)
+
+
+def encode_command(setting, value=None):
+    """Build a host-to-reader command line, e.g. encode_command('VERBOSE', True)"""
+    if setting == 'STATUS':
+        return encode_frame(COMMAND, 'STATUS') + '\n'
+    if setting not in SETTINGS:
+        raise ValueError(f"Unknown reader setting: {setting}")
+    return encode_frame(COMMAND, f"{setting}={1 if value else 0}") + '\n'
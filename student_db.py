@@ -1,127 +1,1380 @@
 import sqlite3
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta, timezone
 import os
 import csv
 import json
+import logging
+import queue
+import re
+import threading
+import time as _time
+from contextlib import contextmanager
+from bell_schedule import load_calendar
 
-PERIODS = [
-    (1, time(7, 25), time(8, 8)),
-    (2, time(8, 12), time(8, 55)),
-    ('HR', time(8, 55), time(9, 1)),
-    (3, time(9, 5), time(9, 48)),
-    (4, time(9, 52), time(10, 35)),
-    (5, time(10, 39), time(11, 22)),
-    (6, time(11, 26), time(12, 9)),
-    (7, time(12, 13), time(12, 56)),
-    (8, time(13, 0), time(13, 43)),
-    (9, time(13, 47), time(14, 30)),
-]
+logger = logging.getLogger(__name__)
+
+# Bell schedules come from bell_schedules.json (see bell_schedule.py).
+# PERIODS is the default schedule, kept for callers that want a single list.
+BELL_CALENDAR = load_calendar()
+PERIODS = BELL_CALENDAR.default.periods
 
 def get_period_for_time(dt):
-    t = dt.time()
-    for period, start, end in PERIODS:
-        if start <= t <= end:
-            return period, end
-    return None, None
+    """Return (period, end time) for a datetime, using the schedule in effect on that date"""
+    return BELL_CALENDAR.period_at(dt)
 
-class StudentDatabase:
-    def __init__(self, db_name="student_attendance.db"):
-        self.db_name = db_name
-        self.conn = None
-        self.init_database()
+def next_period_end(now):
+    """Return the first period end after now (a later school day's once today's are over)"""
+    return BELL_CALENDAR.next_period_end(now)
+
+def last_period_end(now):
+    """Return the latest period end at or before now (an earlier school day's before the first bell)"""
+    return BELL_CALENDAR.last_period_end(now)
+
+# A first check-in later than this after the day's first bell is tardy
+TARDY_GRACE = timedelta(minutes=0)
+
+def is_tardy(check_in):
+    """Return whether a check-in came after the first bell of its day's schedule"""
+    first_bell = BELL_CALENDAR.first_bell(check_in.date())
+    return first_bell is not None and check_in > first_bell + TARDY_GRACE
+
+# Timestamps are stored as integers: microseconds since 1970-01-01 00:00 UTC.
+# The app works in naive local datetimes, as it always has; our connections
+# (see connect) store datetime parameters as epoch microseconds and dates as
+# 'YYYY-MM-DD', and return columns declared EPOCH_US as datetimes, so no
+# query has to parse strings and no other sqlite3 connection is affected.
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+def to_epoch_us(dt):
+    """Epoch microseconds of a datetime (a naive one is local time)"""
+    return (dt.astimezone(timezone.utc) - EPOCH) // ONE_MICROSECOND
+
+def from_epoch_us(value):
+    """The naive local datetime of epoch microseconds"""
+    return datetime.fromtimestamp(value // 1000000).replace(microsecond=value % 1000000)
+
+def minutes_between(start, end):
+    """Whole minutes elapsed from start to end, an hour more or less if the clocks changed in between"""
+    return (to_epoch_us(end) - to_epoch_us(start)) // 60000000
+
+def day_range(day):
+    """Return the [start, end) datetimes covering a calendar day, for range predicates"""
+    start = datetime.combine(day, time())
+    return start, start + timedelta(days=1)
+
+# Until migration 10 times were microseconds since 1970-01-01 00:00 in local
+# wall-clock time; the migrations before it still read and write those
+WALL_CLOCK_EPOCH = datetime(1970, 1, 1)
+
+def _wall_clock_us(dt):
+    return (dt - WALL_CLOCK_EPOCH) // ONE_MICROSECOND
+
+def _from_wall_clock_us(value):
+    return WALL_CLOCK_EPOCH + timedelta(microseconds=value)
+
+def _sql_value(value):
+    if isinstance(value, datetime):
+        return to_epoch_us(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def _sql_params(params):
+    if isinstance(params, dict):
+        return {name: _sql_value(value) for name, value in params.items()}
+    return [_sql_value(value) for value in params]
+
+class _Cursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return super().execute(sql, _sql_params(parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return super().executemany(sql, map(_sql_params, seq_of_parameters))
+
+class _Connection(sqlite3.Connection):
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Only applies to connections opened with detect_types, i.e. ours
+sqlite3.register_converter("EPOCH_US", lambda value: from_epoch_us(int(value)))
+
+def connect(database, **kwargs):
+    """sqlite3.connect for this schema: datetimes in and out as described above"""
+    return sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES, factory=_Connection, **kwargs)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit a migration that has shipped; append a new one instead.
+
+def _create_base_schema(cursor):
+    """Migration 1: the original tables plus the roster version counter"""
+    # Create students table (id = NFC UID, student_id = school number)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS students (
+        id TEXT PRIMARY KEY,              -- NFC card UID
+        student_id TEXT UNIQUE NOT NULL,  -- School 6-digit ID
+        name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
     
-    def init_database(self):
-        """Initialize the database with required tables"""
-        self.conn = sqlite3.connect(self.db_name)
-        cursor = self.conn.cursor()
-        
-        # Create students table (id = NFC UID, student_id = school number)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            id TEXT PRIMARY KEY,              -- NFC card UID
-            student_id TEXT UNIQUE NOT NULL,  -- School 6-digit ID
-            name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+    # Create attendance table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_uid TEXT,
+        date DATE,
+        check_in TIMESTAMP,
+        check_out TIMESTAMP,
+        scheduled_check_out TIMESTAMP,
+        FOREIGN KEY (student_uid) REFERENCES students (id)
+    )
+    ''')
+    
+    # Create bathroom_breaks table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bathroom_breaks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_uid TEXT,
+        break_start TIMESTAMP,
+        break_end TIMESTAMP,
+        duration_minutes INTEGER,
+        FOREIGN KEY (student_uid) REFERENCES students (id)
+    )
+    ''')
+    
+    # Create nurse_visits table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS nurse_visits (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_uid TEXT,
+        visit_start TIMESTAMP,
+        visit_end TIMESTAMP,
+        duration_minutes INTEGER,
+        FOREIGN KEY (student_uid) REFERENCES students (id)
+    )
+    ''')
+
+    # Roster version, bumped by triggers on every change to students so
+    # cached rosters can tell when another process edited it
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS roster_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO roster_version (id, version) VALUES (0, 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS students_{event.lower()}_version
+        AFTER {event} ON students
+        BEGIN
+            UPDATE roster_version SET version = version + 1 WHERE id = 0;
+        END
         ''')
-        
-        # Create attendance table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
+
+def _add_hot_query_indexes(cursor):
+    """Migration 2: indexes for the queries StudentDatabase runs on every tap"""
+    # Day-state rebuild and per-student attendance lookups
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date_student ON attendance (date, student_uid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_student_date ON attendance (student_uid, date)")
+    # Auto-checkout only ever looks at rows that are still open
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_attendance_open
+    ON attendance (date, scheduled_check_out) WHERE check_out IS NULL
+    ''')
+    for table, start, end in (('bathroom_breaks', 'break_start', 'break_end'),
+                              ('nurse_visits', 'visit_start', 'visit_end')):
+        # Open breaks / visits (partial, so it stays tiny)
+        cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_{table}_open
+        ON {table} (student_uid, {start}) WHERE {end} IS NULL
+        ''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_student ON {table} (student_uid, {start})")
+        # Today's list filters on date({start})
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_day ON {table} (date({start}))")
+
+def _text_to_epoch_us(value):
+    """Convert a stored '%Y-%m-%d %H:%M:%S[.%f]' string to epoch microseconds"""
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return _wall_clock_us(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        return None
+
+def _store_timestamps_as_epoch_us(cursor):
+    """Migration 3: timestamp columns become EPOCH_US integers, date filters become ranges"""
+    cursor.connection.create_function("epoch_us", 1, _text_to_epoch_us, deterministic=True)
+    tables = [
+        ('attendance', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_uid TEXT,
-            date DATE,
-            check_in TIMESTAMP,
-            check_out TIMESTAMP,
-            scheduled_check_out TIMESTAMP,
+            date TEXT,                      -- 'YYYY-MM-DD'
+            check_in EPOCH_US,
+            check_out EPOCH_US,
+            scheduled_check_out EPOCH_US,
             FOREIGN KEY (student_uid) REFERENCES students (id)
-        )
-        ''')
-        
-        # Create bathroom_breaks table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bathroom_breaks (
+        ''', "id, student_uid, date, epoch_us(check_in), epoch_us(check_out), epoch_us(scheduled_check_out)"),
+        ('bathroom_breaks', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_uid TEXT,
-            break_start TIMESTAMP,
-            break_end TIMESTAMP,
+            break_start EPOCH_US,
+            break_end EPOCH_US,
             duration_minutes INTEGER,
             FOREIGN KEY (student_uid) REFERENCES students (id)
-        )
-        ''')
-        
-        # Create nurse_visits table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS nurse_visits (
+        ''', "id, student_uid, epoch_us(break_start), epoch_us(break_end), duration_minutes"),
+        ('nurse_visits', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_uid TEXT,
-            visit_start TIMESTAMP,
-            visit_end TIMESTAMP,
+            visit_start EPOCH_US,
+            visit_end EPOCH_US,
             duration_minutes INTEGER,
             FOREIGN KEY (student_uid) REFERENCES students (id)
-        )
+        ''', "id, student_uid, epoch_us(visit_start), epoch_us(visit_end), duration_minutes"),
+    ]
+    # SQLite cannot change a column's declared type, so rebuild each table
+    # (its indexes, including the date() expression indexes, go with it)
+    for table, columns, select in tables:
+        cursor.execute(f"CREATE TABLE {table}_new ({columns})")
+        cursor.execute(f"INSERT INTO {table}_new SELECT {select} FROM {table}")
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    cursor.execute("CREATE INDEX idx_attendance_date_student ON attendance (date, student_uid)")
+    cursor.execute("CREATE INDEX idx_attendance_student_date ON attendance (student_uid, date)")
+    cursor.execute('''
+    CREATE INDEX idx_attendance_open
+    ON attendance (date, scheduled_check_out) WHERE check_out IS NULL
+    ''')
+    for table, start, end in (('bathroom_breaks', 'break_start', 'break_end'),
+                              ('nurse_visits', 'visit_start', 'visit_end')):
+        cursor.execute(f'''
+        CREATE INDEX idx_{table}_open
+        ON {table} (student_uid, {start}) WHERE {end} IS NULL
         ''')
-        
-        self.conn.commit()
+        cursor.execute(f"CREATE INDEX idx_{table}_student ON {table} (student_uid, {start})")
+        # Today's list is a range on {start}
+        cursor.execute(f"CREATE INDEX idx_{table}_start ON {table} ({start})")
+
+def _add_student_key(cursor):
+    """Migration 4: one integer student_key per student, used by every event table.
+
+    Event rows used to store whichever of NFC UID / student_id the student
+    identified with, so every join needed an OR over both columns. Each row
+    now holds the key of the student it resolves to (UID first, then
+    student_id); rows matching no student keep a NULL key. A student with
+    check-ins under both identifiers on one day keeps the earliest.
+    """
+    # Rebuild students with an explicit key (the old rowid, so nothing moves);
+    # a missing card is NULL instead of '' so several students can lack one
+    cursor.execute('''
+    CREATE TABLE students_new (
+        student_key INTEGER PRIMARY KEY,
+        id TEXT UNIQUE,                   -- NFC card UID, NULL if no card
+        student_id TEXT UNIQUE NOT NULL,  -- School 6-digit ID
+        name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    INSERT INTO students_new (student_key, id, student_id, name, created_at)
+    SELECT rowid, NULLIF(id, ''), student_id, name, created_at FROM students
+    ''')
+    cursor.execute("DROP TABLE students")
+    cursor.execute("ALTER TABLE students_new RENAME TO students")
+    # The version triggers went with the old table
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+        CREATE TRIGGER students_{event.lower()}_version
+        AFTER {event} ON students
+        BEGIN
+            UPDATE roster_version SET version = version + 1 WHERE id = 0;
+        END
+        ''')
+    cursor.execute("UPDATE roster_version SET version = version + 1 WHERE id = 0")
+
+    resolve = '''COALESCE((SELECT student_key FROM students WHERE id = student_uid),
+                          (SELECT student_key FROM students WHERE student_id = student_uid))'''
+    tables = [
+        ('attendance', '''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_key INTEGER REFERENCES students (student_key),
+            date TEXT,                      -- 'YYYY-MM-DD'
+            check_in EPOCH_US,
+            check_out EPOCH_US,
+            scheduled_check_out EPOCH_US
+        ''', "id, student_key, date, check_in, check_out, scheduled_check_out",
+         f"id, {resolve}, date, check_in, check_out, scheduled_check_out"),
+        ('bathroom_breaks', '''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_key INTEGER REFERENCES students (student_key),
+            break_start EPOCH_US,
+            break_end EPOCH_US,
+            duration_minutes INTEGER
+        ''', "id, student_key, break_start, break_end, duration_minutes",
+         f"id, {resolve}, break_start, break_end, duration_minutes"),
+        ('nurse_visits', '''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_key INTEGER REFERENCES students (student_key),
+            visit_start EPOCH_US,
+            visit_end EPOCH_US,
+            duration_minutes INTEGER
+        ''', "id, student_key, visit_start, visit_end, duration_minutes",
+         f"id, {resolve}, visit_start, visit_end, duration_minutes"),
+    ]
+    for table, columns, insert, select in tables:
+        cursor.execute(f"CREATE TABLE {table}_new ({columns})")
+        if table == 'attendance':
+            # One attendance row per student per day; created before the copy
+            # so OR IGNORE drops the later of any duplicates
+            cursor.execute("DROP INDEX idx_attendance_date_student")
+            cursor.execute("CREATE UNIQUE INDEX idx_attendance_date_student ON attendance_new (date, student_key)")
+        cursor.execute(f"INSERT OR IGNORE INTO {table}_new ({insert}) SELECT {select} FROM {table} ORDER BY id")
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    cursor.execute('''
+    CREATE INDEX idx_attendance_open
+    ON attendance (scheduled_check_out) WHERE check_out IS NULL
+    ''')
+    for table, start, end in (('bathroom_breaks', 'break_start', 'break_end'),
+                              ('nurse_visits', 'visit_start', 'visit_end')):
+        cursor.execute(f'''
+        CREATE INDEX idx_{table}_open
+        ON {table} (student_key, {start}) WHERE {end} IS NULL
+        ''')
+        cursor.execute(f"CREATE INDEX idx_{table}_student ON {table} (student_key, {start})")
+        cursor.execute(f"CREATE INDEX idx_{table}_start ON {table} ({start})")
+
+def _index_open_rows_by_start(cursor):
+    """Migration 5: open break / visit indexes lead with the start time.
+
+    The dangling-row search at each period end is a range on the start time.
+    Keyed on (student_key, start), the partial index could not serve it, and
+    once ANALYZE had run the planner walked the whole history through
+    idx_{table}_start instead. Per-student lookups use idx_{table}_student.
+    """
+    for table, start, end in (('bathroom_breaks', 'break_start', 'break_end'),
+                              ('nurse_visits', 'visit_start', 'visit_end')):
+        cursor.execute(f"DROP INDEX idx_{table}_open")
+        cursor.execute(f'''
+        CREATE INDEX idx_{table}_open
+        ON {table} ({start}) WHERE {end} IS NULL
+        ''')
+
+def _add_processed_events(cursor):
+    """Migration 6: remember which client event IDs have been applied.
+
+    Written in the same transaction as the event's own change, so a client
+    that resends an event after losing the reply cannot apply it twice
+    (see StudentDatabase.apply_event).
+    """
+    cursor.execute('''
+    CREATE TABLE processed_events (
+        event_id TEXT PRIMARY KEY,
+        result TEXT,                      -- JSON of the method's return value
+        processed_at EPOCH_US
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX idx_processed_events_at ON processed_events (processed_at)")
+
+def _fold_daily_summary(cursor, start=None, end=None, wall_clock=False):
+    """Recompute the daily_summary rows for dates in [start, end) from the event tables.
+
+    Without bounds every date is recomputed. Breaks and visits count on the
+    day they started, once they have ended. wall_clock=True reads times
+    stored before migration 10.
+    """
+    decode, encode = (_from_wall_clock_us, _wall_clock_us) if wall_clock else (from_epoch_us, to_epoch_us)
+    cursor.connection.create_function(
+        "is_tardy_us", 1, lambda value: int(is_tardy(decode(value))) if value is not None else 0)
+    first_day = (start or date.min).isoformat()
+    last_day = (end or date.max).isoformat()
+    first_us = encode(datetime.combine(start, time())) if start else -2 ** 63
+    last_us = encode(datetime.combine(end, time())) if end else 2 ** 63 - 1
+    local_date = "'unixepoch'" if wall_clock else "'unixepoch', 'localtime'"
+    cursor.execute("DELETE FROM daily_summary WHERE date >= ? AND date < ?", (first_day, last_day))
+    cursor.execute('''
+    INSERT INTO daily_summary (date, student_key, first_check_in, tardy)
+    SELECT date, student_key, MIN(check_in), is_tardy_us(MIN(check_in))
+    FROM attendance
+    WHERE student_key IS NOT NULL AND check_in IS NOT NULL AND date >= ? AND date < ?
+    GROUP BY date, student_key
+    ''', (first_day, last_day))
+    for table, start_column, end_column, kind in (('bathroom_breaks', 'break_start', 'break_end', 'break'),
+                                                  ('nurse_visits', 'visit_start', 'visit_end', 'nurse')):
+        cursor.execute(f'''
+        INSERT INTO daily_summary (date, student_key, {kind}_count, {kind}_minutes)
+        SELECT date({start_column} / 1000000, {local_date}), student_key, COUNT(*), COALESCE(SUM(duration_minutes), 0)
+        FROM {table}
+        WHERE student_key IS NOT NULL AND {end_column} IS NOT NULL
+          AND {start_column} >= ? AND {start_column} < ?
+        GROUP BY 1, 2
+        ON CONFLICT (date, student_key) DO UPDATE
+        SET {kind}_count = excluded.{kind}_count, {kind}_minutes = excluded.{kind}_minutes
+        ''', (first_us, last_us))
+
+def _summarize_check_in(cursor, key, check_in):
+    """Fold one check-in into its day's summary row"""
+    cursor.execute('''
+    INSERT INTO daily_summary (date, student_key, first_check_in, tardy) VALUES (?, ?, ?, ?)
+    ON CONFLICT (date, student_key) DO UPDATE
+    SET first_check_in = excluded.first_check_in, tardy = excluded.tardy
+    WHERE first_check_in IS NULL OR excluded.first_check_in < first_check_in
+    ''', (check_in.date(), key, check_in, int(is_tardy(check_in))))
+
+def _summarize_visit(cursor, kind, key, start, minutes):
+    """Fold one ended break (kind 'break') or nurse visit ('nurse') into the summary of the day it started"""
+    cursor.execute(f'''
+    INSERT INTO daily_summary (date, student_key, {kind}_count, {kind}_minutes) VALUES (?, ?, 1, ?)
+    ON CONFLICT (date, student_key) DO UPDATE
+    SET {kind}_count = {kind}_count + 1, {kind}_minutes = {kind}_minutes + excluded.{kind}_minutes
+    ''', (start.date(), key, minutes))
+
+def _add_daily_summary(cursor):
+    """Migration 7: per-student and school-wide per-day summaries, backfilled from history.
+
+    daily_summary is kept current by the write methods (in the transaction
+    of each event) and recomputed for a day when it closes; daily_totals
+    follows daily_summary through triggers. Reports over any range read one
+    row per student per day, or one row per day, instead of the raw events.
+    """
+    cursor.execute('''
+    CREATE TABLE daily_summary (
+        date TEXT NOT NULL,                   -- 'YYYY-MM-DD'
+        student_key INTEGER NOT NULL REFERENCES students (student_key),
+        first_check_in EPOCH_US,              -- NULL: not present
+        tardy INTEGER NOT NULL DEFAULT 0,     -- first check-in after the first bell
+        break_count INTEGER NOT NULL DEFAULT 0,
+        break_minutes INTEGER NOT NULL DEFAULT 0,
+        nurse_count INTEGER NOT NULL DEFAULT 0,
+        nurse_minutes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, student_key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX idx_daily_summary_student ON daily_summary (student_key, date)")
+    _fold_daily_summary(cursor, wall_clock=True)
+    cursor.execute('''
+    CREATE TABLE daily_totals (
+        date TEXT PRIMARY KEY,                -- 'YYYY-MM-DD'
+        present INTEGER NOT NULL,
+        tardies INTEGER NOT NULL,
+        breaks INTEGER NOT NULL,
+        break_minutes INTEGER NOT NULL,
+        nurse_visits INTEGER NOT NULL,
+        nurse_minutes INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    INSERT INTO daily_totals
+    SELECT date, COUNT(first_check_in), SUM(tardy), SUM(break_count), SUM(break_minutes),
+           SUM(nurse_count), SUM(nurse_minutes)
+    FROM daily_summary GROUP BY date
+    ''')
+    # Every change to a daily_summary row is applied to its day's totals as a delta
+    cursor.execute('''
+    CREATE TRIGGER daily_summary_insert_totals AFTER INSERT ON daily_summary
+    BEGIN
+        INSERT INTO daily_totals VALUES (NEW.date, NEW.first_check_in IS NOT NULL, NEW.tardy,
+                                         NEW.break_count, NEW.break_minutes, NEW.nurse_count, NEW.nurse_minutes)
+        ON CONFLICT (date) DO UPDATE SET
+            present = present + excluded.present, tardies = tardies + excluded.tardies,
+            breaks = breaks + excluded.breaks, break_minutes = break_minutes + excluded.break_minutes,
+            nurse_visits = nurse_visits + excluded.nurse_visits, nurse_minutes = nurse_minutes + excluded.nurse_minutes;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER daily_summary_update_totals AFTER UPDATE ON daily_summary
+    BEGIN
+        UPDATE daily_totals SET
+            present = present + (NEW.first_check_in IS NOT NULL) - (OLD.first_check_in IS NOT NULL),
+            tardies = tardies + NEW.tardy - OLD.tardy,
+            breaks = breaks + NEW.break_count - OLD.break_count,
+            break_minutes = break_minutes + NEW.break_minutes - OLD.break_minutes,
+            nurse_visits = nurse_visits + NEW.nurse_count - OLD.nurse_count,
+            nurse_minutes = nurse_minutes + NEW.nurse_minutes - OLD.nurse_minutes
+        WHERE date = NEW.date;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER daily_summary_delete_totals AFTER DELETE ON daily_summary
+    BEGIN
+        UPDATE daily_totals SET
+            present = present - (OLD.first_check_in IS NOT NULL),
+            tardies = tardies - OLD.tardy,
+            breaks = breaks - OLD.break_count,
+            break_minutes = break_minutes - OLD.break_minutes,
+            nurse_visits = nurse_visits - OLD.nurse_count,
+            nurse_minutes = nurse_minutes - OLD.nurse_minutes
+        WHERE date = OLD.date;
+    END
+    ''')
+
+def _add_archives(cursor):
+    """Migration 8: registry of per-term archive databases (see StudentDatabase.archive_term)"""
+    cursor.execute('''
+    CREATE TABLE archives (
+        name TEXT PRIMARY KEY,                -- term, e.g. '2025-26'
+        path TEXT NOT NULL,                   -- archive file, relative to this database's directory
+        first_date TEXT NOT NULL,             -- 'YYYY-MM-DD' range of the events it holds
+        last_date TEXT NOT NULL,
+        archived_at EPOCH_US
+    )
+    ''')
+
+def _add_student_search(cursor):
+    """Migration 9: trigram full-text index over student names, student_ids and card UIDs.
+
+    student_search indexes the students table in place (external content)
+    and follows it through triggers, so add_student, the importers and any
+    other writer keep it current. Trigrams match any 3+ character
+    substring; shorter queries use the name and student_id indexes instead
+    (see StudentDatabase.search_students).
+    """
+    cursor.execute('''
+    CREATE VIRTUAL TABLE student_search USING fts5(
+        name, student_id, id,
+        content='students', content_rowid='student_key', tokenize='trigram'
+    )
+    ''')
+    cursor.execute("INSERT INTO student_search (student_search) VALUES ('rebuild')")
+    cursor.execute('''
+    CREATE TRIGGER students_insert_search AFTER INSERT ON students
+    BEGIN
+        INSERT INTO student_search (rowid, name, student_id, id) VALUES (NEW.student_key, NEW.name, NEW.student_id, NEW.id);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER students_delete_search AFTER DELETE ON students
+    BEGIN
+        INSERT INTO student_search (student_search, rowid, name, student_id, id)
+        VALUES ('delete', OLD.student_key, OLD.name, OLD.student_id, OLD.id);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER students_update_search AFTER UPDATE OF name, student_id, id ON students
+    BEGIN
+        INSERT INTO student_search (student_search, rowid, name, student_id, id)
+        VALUES ('delete', OLD.student_key, OLD.name, OLD.student_id, OLD.id);
+        INSERT INTO student_search (rowid, name, student_id, id) VALUES (NEW.student_key, NEW.name, NEW.student_id, NEW.id);
+    END
+    ''')
+    cursor.execute("CREATE INDEX idx_students_name ON students (name COLLATE NOCASE)")
+
+# user_version of a term archive whose times are UTC epoch microseconds
+ARCHIVE_UTC_VERSION = 1
+
+def _wall_clock_to_utc_us(value):
+    return to_epoch_us(_from_wall_clock_us(value)) if value is not None else None
+
+def _convert_wall_clock_columns(cursor):
+    """Rewrite every EPOCH_US column of the main database from wall-clock to UTC microseconds"""
+    cursor.connection.create_function("utc_us", 1, _wall_clock_to_utc_us, deterministic=True)
+    tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()]
+    for table in tables:
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall() if row[2] == 'EPOCH_US']
+        if columns:
+            cursor.execute(f"UPDATE {table} SET " + ", ".join(f"{column} = utc_us({column})" for column in columns))
+
+def _store_timestamps_as_utc(cursor):
+    """Migration 10: timestamps become UTC epoch microseconds instead of local wall-clock ones.
+
+    Wall-clock microseconds put durations across a DST change an hour out.
+    The term archives are converted too, each in its own transaction; an
+    archive's user_version records that it is done, so a rerun skips it.
+    """
+    _convert_wall_clock_columns(cursor)
+    directory = os.path.dirname(cursor.execute("PRAGMA database_list").fetchone()[2])
+    for (path,) in cursor.execute("SELECT path FROM archives").fetchall():
+        path = os.path.join(directory, path)
+        if not os.path.exists(path):
+            logger.warning("Archive %s is missing; its times were not converted to UTC", path)
+            continue
+        archive = sqlite3.connect(path)
+        try:
+            if archive.execute("PRAGMA user_version").fetchone()[0] < ARCHIVE_UTC_VERSION:
+                with archive:
+                    _convert_wall_clock_columns(archive.cursor())
+                    archive.execute(f"PRAGMA user_version = {ARCHIVE_UTC_VERSION}")
+        finally:
+            archive.close()
+
+MIGRATIONS = [
+    _create_base_schema,
+    _add_hot_query_indexes,
+    _store_timestamps_as_epoch_us,
+    _add_student_key,
+    _index_open_rows_by_start,
+    _add_processed_events,
+    _add_daily_summary,
+    _add_archives,
+    _add_student_search,
+    _store_timestamps_as_utc,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Reports over daily_summary / daily_totals; {schema} is 'main' or an
+# attached archive (see StudentDatabase._report)
+REPORT_QUERIES = {
+    "summary_by_student": """
+            SELECT student_key, COUNT(first_check_in), SUM(tardy), SUM(break_count), SUM(break_minutes),
+                   SUM(nurse_count), SUM(nurse_minutes)
+            FROM {schema}.daily_summary WHERE date >= ? AND date <= ?
+            GROUP BY student_key
+        """,
+    "student_summary": """
+            SELECT student_key, COUNT(first_check_in), SUM(tardy), SUM(break_count), SUM(break_minutes),
+                   SUM(nurse_count), SUM(nurse_minutes)
+            FROM {schema}.daily_summary WHERE student_key = ? AND date >= ? AND date <= ?
+            GROUP BY student_key
+        """,
+    "summary_by_day": """
+            SELECT date, present, tardies, breaks, break_minutes, nurse_visits, nurse_minutes
+            FROM {schema}.daily_totals WHERE date >= ? AND date <= ?
+            ORDER BY date
+        """,
+    "student_days": """
+            SELECT date, first_check_in, tardy, break_count, break_minutes, nurse_count, nurse_minutes
+            FROM {schema}.daily_summary WHERE student_key = ? AND date >= ? AND date <= ?
+            ORDER BY date
+        """,
+}
+
+# Queries run on every tap or every auto-checkout pass; none of them may need
+# a full table scan (see StudentDatabase.find_full_table_scans)
+HOT_QUERIES = {
+    "roster_since": ("SELECT student_key, id, student_id, name FROM students WHERE student_key > ?", (0,)),
+    "checked_in_today": ("SELECT student_key FROM attendance WHERE date = ?", ('2000-01-01',)),
+    "student_checked_in": ("SELECT id FROM attendance WHERE date = ? AND student_key = ?", ('2000-01-01', 0)),
+    "open_breaks": ("SELECT id, student_key, break_start FROM bathroom_breaks WHERE break_end IS NULL", ()),
+    "open_nurse_visits": ("SELECT id, student_key, visit_start FROM nurse_visits WHERE visit_end IS NULL", ()),
+    "student_open_break": ("SELECT id, break_start FROM bathroom_breaks WHERE student_key = ? AND break_end IS NULL", (0,)),
+    "student_open_nurse_visit": ("SELECT id, visit_start FROM nurse_visits WHERE student_key = ? AND visit_end IS NULL", (0,)),
+    "auto_checkout": ("UPDATE attendance SET check_out = scheduled_check_out "
+                      "WHERE check_out IS NULL AND scheduled_check_out <= ?", (0,)),
+    "dangling_breaks": ("SELECT student_key FROM bathroom_breaks WHERE break_end IS NULL AND break_start < ?", (0,)),
+    "dangling_nurse_visits": ("SELECT student_key FROM nurse_visits WHERE visit_end IS NULL AND visit_start < ?", (0,)),
+    "today_breaks": ("""
+            SELECT s.student_id, b.break_start, b.break_end, b.duration_minutes
+            FROM bathroom_breaks b
+            JOIN students s ON s.student_key = b.student_key
+            WHERE b.break_start >= ? AND b.break_start < ?
+            ORDER BY b.break_start DESC
+        """, (0, 0)),
+    "today_nurse_visits": ("""
+            SELECT s.student_id, n.visit_start, n.visit_end, n.duration_minutes
+            FROM nurse_visits n
+            JOIN students s ON s.student_key = n.student_key
+            WHERE n.visit_start >= ? AND n.visit_start < ?
+            ORDER BY n.visit_start DESC
+        """, (0, 0)),
+    # search_students: student_id, then name prefixes in index order (range [text, text + 1))
+    "search_student_id_prefix": ("""
+            SELECT student_key, id, student_id, name FROM students
+            WHERE student_id >= ? AND student_id < ? ORDER BY student_id LIMIT ?
+        """, ('', '', 0)),
+    "search_name_prefix": ("""
+            SELECT student_key, id, student_id, name FROM students
+            WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE ORDER BY name COLLATE NOCASE LIMIT ?
+        """, ('', '', 0)),
+    "processed_event": ("SELECT result FROM processed_events WHERE event_id = ?", ('',)),
+    "summary_check_in": ("SELECT first_check_in FROM daily_summary WHERE date = ? AND student_key = ?",
+                         ('2000-01-01', 0)),
+    "summary_by_student": (REPORT_QUERIES["summary_by_student"].format(schema="main"),
+                           ('2000-01-01', '2000-01-01')),
+    "student_summary": (REPORT_QUERIES["student_summary"].format(schema="main"), (0, '2000-01-01', '2000-01-01')),
+    "summary_by_day": (REPORT_QUERIES["summary_by_day"].format(schema="main"), ('2000-01-01', '2000-01-01')),
+    "student_days": (REPORT_QUERIES["student_days"].format(schema="main"), (0, '2000-01-01', '2000-01-01')),
+}
+
+# Read by warm_cache() so the pages the day's taps write to, which opening the
+# database does not read, are in the OS page cache before the first tap
+WARM_QUERIES = (
+    "SELECT count(*), max(check_out) FROM attendance WHERE date = :today",
+    "SELECT count(*), max(first_check_in) FROM daily_summary WHERE date = :today",
+    "SELECT * FROM daily_totals WHERE date = :today",
+    "SELECT count(*), max(break_end) FROM bathroom_breaks WHERE break_start >= :midnight",
+    "SELECT count(*), max(visit_end) FROM nurse_visits WHERE visit_start >= :midnight",
+    "SELECT max(processed_at) FROM processed_events",
+)
+
+SEARCH_LIMIT = 20         # matches search_students returns by default
+SEARCH_CANDIDATES = 500   # substring matches it ranks at most
+
+# Tables copied into a term archive: the events, their summaries, and a roster snapshot
+# so the archive can be read on its own
+ARCHIVED_TABLES = ('students', 'attendance', 'bathroom_breaks', 'nurse_visits', 'daily_summary', 'daily_totals')
+ARCHIVE_DIR = 'archives'       # next to the database
+MAX_ATTACHED_ARCHIVES = 8      # SQLite attaches at most 10 databases by default
+
+# Seconds between checks for changes committed by another process
+SYNC_INTERVAL = 2.0
+
+# Rows per executemany call during a bulk roster import
+IMPORT_BATCH_SIZE = 1000
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Yield the elements of a top-level JSON array one at a time from a text file"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    expect = '['  # next token: '[' to open, 'value' / 'value]' for an element, ',]' between elements
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position < len(buffer):
+            char = buffer[position]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError("JSON must contain an array of student objects")
+                expect = 'value]'
+                position += 1
+                continue
+            if char == ']' and expect in ('value]', ',]'):
+                return
+            if expect == ',]':
+                if char != ',':
+                    raise ValueError("Expected ',' or ']' between array elements")
+                expect = 'value'
+                position += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    yield value
+                    expect = ',]'
+                    position = end
+                    continue
+        if eof:
+            if expect == '[':
+                raise ValueError("JSON must contain an array of student objects")
+            raise ValueError("JSON array is not terminated")
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def _file_fraction(file):
+    """Return a callable giving how much of an open file has been read (0.0 - 1.0)"""
+    size = os.fstat(file.fileno()).st_size
+    return lambda: min(1.0, file.buffer.tell() / size) if size else 1.0
+
+# Opt-in fast write path, see StudentDatabase(group_commit=True)
+GROUP_COMMIT_WINDOW = 0.003  # seconds a batch stays open for more writes
+BUSY_TIMEOUT_MS = 5000
+
+# Row id a journaled write reports: the row is inserted in the background
+PENDING_ROW = 0
+
+# Days processed event IDs are remembered, see prune_events
+KEEP_EVENTS_DAYS = 7
+
+class GroupCommitter:
+    """Apply write operations on a dedicated connection, committing them in batches.
+
+    Callers block in submit() until the transaction holding their operation
+    has committed, so a success is only reported once it is on disk. Writes
+    that arrive within GROUP_COMMIT_WINDOW of each other share one commit
+    (and one fsync). The window is only waited out while other callers are
+    in flight, so a lone write commits straight away. Each operation runs
+    inside its own savepoint, so one failing operation does not undo the rest
+    of its batch.
+    """
+    def __init__(self, db_name, window=GROUP_COMMIT_WINDOW):
+        self.db_name = db_name
+        self.window = window
+        self.batches = 0
+        self.operations = 0
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation):
+        """Run operation(cursor) in the next batch and return its result once committed"""
+        item = {"operation": operation, "done": threading.Event()}
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            self._queue.put(item)
+            item["done"].wait()
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+        if "error" in item:
+            raise item["error"]
+        return item["result"]
+
+    def post(self, operation, committed=None):
+        """Queue operation(cursor) for the next batch without waiting for it.
+
+        committed() is called on the commit thread once the operation is on
+        disk; a failure is only logged.
+        """
+        self._queue.put({"operation": operation, "committed": committed})
+
+    def data_version(self):
+        """PRAGMA data_version on the committer's connection: it moves only when a
+        connection other than the committer's own commits"""
+        return self.submit(lambda cursor: cursor.execute("PRAGMA data_version").fetchone()[0])
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        conn = connect(self.db_name, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # FULL on this connection only: the WAL is synced once per batch, before callers are released
+        conn.execute("PRAGMA synchronous = FULL")
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = _time.monotonic() + self.window
+            while True:
+                # Keep the batch open only while more callers are on their way
+                remaining = deadline - _time.monotonic()
+                waiting = remaining > 0 and self._pending > len(batch)
+                try:
+                    item = self._queue.get(timeout=remaining) if waiting else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._commit_batch(conn, batch)
+        conn.close()
+
+    def _commit_batch(self, conn, batch):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for item in batch:
+                cursor.execute("SAVEPOINT operation")
+                try:
+                    item["result"] = item["operation"](cursor)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO operation")
+                    item["error"] = e
+                cursor.execute("RELEASE operation")
+            cursor.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for item in batch:
+                item["error"] = e
+        self.batches += 1
+        self.operations += len(batch)
+        for item in batch:
+            if "done" in item:
+                item["done"].set()
+            elif "error" in item:
+                logger.error("Background write failed: %s", item["error"])
+            elif item["committed"] is not None:
+                item["committed"]()
+
+class DayState:
+    """Who is checked in, on a bathroom break or at the nurse on a given day.
+
+    Rebuilt from SQLite at startup, after midnight and whenever another
+    connection commits; otherwise updated in place after each of our own
+    commits, so the hot checks never touch the database.
+    """
+    def __init__(self, day):
+        self.day = day
+        self.checked_in = set()   # student keys with an attendance row for day
+        self.on_break = {}        # student key -> (break id, break_start datetime) of open breaks
+        self.at_nurse = {}        # student key -> (visit id, visit_start datetime) of open visits
+
+class StudentDatabase:
+    def __init__(self, db_name="student_attendance.db", group_commit=False, journal=None):
+        """Open (and migrate) the database.
+
+        group_commit=True opts into WAL journaling, synchronous=NORMAL, a busy
+        timeout and batched commits through a GroupCommitter. Write methods
+        may then be called from several threads at once.
+
+        journal, a tap_journal.TapJournal, implies group_commit and moves
+        SQLite off the tap path: check-ins, breaks and visits are decided
+        from the in-memory state, appended to the journal and reported once
+        the record is on disk, then committed in the background. Records
+        the database does not have yet are replayed first, then event IDs
+        older than KEEP_EVENTS_DAYS are pruned.
+        """
+        self.db_name = db_name
+        self.conn = None
+        self.group_commit = group_commit or journal is not None
+        self.journal = None
+        self._committer = None
+        self._lock = threading.RLock()
+        # In-memory roster: student_key -> (NFC UID, student_id, name), plus
+        # NFC UID -> student_key and student_id -> student_key
+        self._students = {}
+        self._key_by_uid = {}
+        self._key_by_student_id = {}
+        self._max_key = 0
+        self._roster_version = None
+        self._data_version = None
+        self._foreign_version = None   # the committer's data_version, see _sync
+        self._synced_at = 0.0
+        self._day_state = None
+        self._listeners = []
+        # Event ID being applied on this thread, see apply_event
+        self._event = threading.local()
+        self._batch_depth = 0
+        # Archive path -> schema name, for archives attached to self.conn by reports
+        self._attached = {}
+        self._attach_count = 0
+        self.init_database()
+        self.load_roster()
+        self.load_day_state()
+        if journal is not None:
+            self.replay_journal(journal)
+            self.journal = journal
+            self.prune_events(datetime.now() - timedelta(days=KEEP_EVENTS_DAYS))
+        if self.group_commit:
+            self._committer = GroupCommitter(db_name)
+            self._foreign_version = self._committer.data_version()
     
-    def __del__(self):
-        """Clean up database connection when object is destroyed"""
+    def init_database(self):
+        """Open the database and bring its schema up to date"""
+        self.conn = connect(self.db_name, check_same_thread=not self.group_commit)
+        if self.group_commit:
+            self.conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.migrate()
+    
+    def migrate(self):
+        """Apply any migrations newer than the database's user_version"""
+        cursor = self.conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            # Each migration and its version bump commit together
+            cursor.execute("BEGIN")
+            try:
+                MIGRATIONS[number - 1](cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+    
+    def find_full_table_scans(self):
+        """Return {query name: plan lines} for HOT_QUERIES whose plan scans a whole table"""
+        scans = {}
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            full_scans = [line for line in plan if line.startswith("SCAN ") and " USING " not in line]
+            if full_scans:
+                scans[name] = full_scans
+        return scans
+    
+    def close(self):
+        """Flush pending writes and close the database connections"""
+        if self._committer is not None:
+            self._committer.close()
+            self._committer = None
         if self.conn:
             self.conn.close()
+            self.conn = None
+    
+    def __del__(self):
+        """Clean up database connection when object is destroyed"""
+        self.close()
+    
+    def _write(self, operation, tap=None):
+        """Run operation(cursor) in a transaction and return its result once committed.
+
+        tap is (method, kwargs, at): how to redo the write through the public
+        method. With a journal the tap is appended to it instead, the
+        operation is committed in the background and PENDING_ROW returned.
+        """
+        if tap is not None and self.journal is not None:
+            record = self.journal.append(*tap)
+            write = operation
+            def journaled(cursor):
+                result = write(cursor)
+                self._record_event(cursor, record.event_id)
+                return result
+            self._committer.post(journaled, lambda: self.journal.mark_applied(record))
+            return PENDING_ROW
+        event_id = getattr(self._event, 'event_id', None)
+        if event_id is None:
+            return self._commit(operation)
+        # Inside apply_event: the event is marked processed in the same transaction
+        write = operation
+        def recorded(cursor):
+            result = write(cursor)
+            self._record_event(cursor, event_id)
+            return result
+        try:
+            return self._commit(recorded)
+        except Exception:
+            # The method may turn this into a (False, message) result; apply_event
+            # must not record that as the event's outcome
+            self._event.write_failed = True
+            raise
+
+    def _commit(self, operation):
+        """Run operation(cursor) on the committer, in the current batch or in its own transaction"""
+        if self._committer is not None:
+            return self._committer.submit(operation)
+        cursor = self.conn.cursor()
+        if self._batch_depth:
+            # Inside batch(): undo just this write on failure, commit with the batch
+            cursor.execute("SAVEPOINT write")
+            try:
+                result = operation(cursor)
+            except Exception:
+                cursor.execute("ROLLBACK TO write")
+                raise
+            finally:
+                cursor.execute("RELEASE write")
+            return result
+        try:
+            result = operation(cursor)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return result
+
+    @contextmanager
+    def batch(self):
+        """Commit every write made inside the block in one transaction (one fsync).
+
+        Each write still gets its own savepoint, so one that fails does not
+        undo the others. Listeners hear about writes as they are made, before
+        the batch commits; if the commit fails, the in-memory state is
+        reloaded from the database. With group_commit the committer already
+        batches, so this is a no-op.
+        """
+        if self._committer is not None:
+            yield
+            return
+        if not self._batch_depth:
+            self.conn.execute("BEGIN")
+        self._batch_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._abandon_batch()
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            try:
+                self.conn.commit()
+            except Exception:
+                self._abandon_batch()
+                raise
+
+    def _abandon_batch(self):
+        self.conn.rollback()
+        self.load_roster()
+        self.load_day_state()
     
+    def _record_event(self, cursor, event_id):
+        cursor.execute("INSERT OR IGNORE INTO processed_events (event_id, processed_at) VALUES (?, ?)",
+                       (event_id, datetime.now()))
+
+    def apply_event(self, event_id, method, *args, **kwargs):
+        """Call the write method named method at most once per event_id.
+
+        Returns the method's result; if the event was already applied, the
+        result recorded then (as decoded JSON, so tuples come back as lists)
+        instead. The event is recorded in the transaction that makes the
+        change, so even a crash before the result is stored cannot let a
+        resent event apply twice.
+        """
+        return self.settle_event(event_id, method, *args, **kwargs)[0]
+
+    def settle_event(self, event_id, method, *args, **kwargs):
+        """apply_event, also returning whether the event is now settled.
+
+        An event is settled once it is in processed_events: it applied, was
+        rejected (already checked in, not on a break, ...), or was applied
+        before. One whose write failed is not recorded, so it can be tried
+        again.
+        """
+        row = self.conn.execute("SELECT result FROM processed_events WHERE event_id = ?", (event_id,)).fetchone()
+        if row is not None:
+            # A NULL result: the change committed but its outcome was never stored
+            return (json.loads(row[0]) if row[0] is not None else [True, "Already processed"]), True
+        self._event.event_id = event_id
+        self._event.write_failed = False
+        try:
+            result = getattr(self, method)(*args, **kwargs)
+        finally:
+            self._event.event_id = None
+        if self._event.write_failed:
+            return result, False
+        self._write(lambda cursor: cursor.execute('''
+            INSERT INTO processed_events (event_id, result, processed_at) VALUES (?, ?, ?)
+            ON CONFLICT (event_id) DO UPDATE SET result = excluded.result
+        ''', (event_id, json.dumps(result), datetime.now())))
+        return result, True
+
+    def flush(self):
+        """Wait until every write queued for the background committer is on disk"""
+        if self._committer is not None:
+            self._committer.submit(lambda cursor: None)
+
+    def replay_journal(self, journal):
+        """Apply the journal records the database does not have, in order, in one transaction.
+
+        Each record goes through its method with its original time and event
+        ID, so a record whose write did commit is skipped. Only records that
+        applied or were rejected are marked applied in the journal; one whose
+        write failed is replayed again at the next start. Returns how many
+        records were replayed.
+        """
+        records = list(journal.pending())
+        if not records:
+            return 0
+        started = _time.perf_counter()
+        settled = []
+        with self.batch():
+            for record in records:
+                try:
+                    if self.settle_event(record.event_id, record.method, at=record.at, **record.kwargs)[1]:
+                        settled.append(record)
+                    else:
+                        logger.warning("Could not replay journaled %s %s; keeping it", record.method, record.kwargs)
+                except Exception:
+                    logger.exception("Could not replay journaled %s %s", record.method, record.kwargs)
+        for record in settled:
+            journal.mark_applied(record)
+        logger.info("Replayed %d journaled taps in %.0f ms", len(records),
+                    (_time.perf_counter() - started) * 1000)
+        return len(records)
+
+    def prune_events(self, before):
+        """Forget processed event IDs recorded before the given datetime; returns how many"""
+        return self._write(lambda cursor: cursor.execute(
+            "DELETE FROM processed_events WHERE processed_at < ?", (before,)
+        ).rowcount)
+
+    def load_roster(self):
+        """(Re)load the in-memory UID and student_id lookup maps from the database"""
+        self._students = {}
+        self._key_by_uid = {}
+        self._key_by_student_id = {}
+        self._max_key = 0
+        self._cache_new_students()
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self._synced_at = _time.monotonic()
+        self._notify('roster_reloaded')
+
+    def _read_roster_version(self):
+        return self.conn.execute("SELECT version FROM roster_version WHERE id = 0").fetchone()[0]
+
+    def load_day_state(self):
+        """Rebuild today's check-in / break / nurse state from the database"""
+        today = datetime.now().date()
+        state = DayState(today)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT student_key FROM attendance WHERE date = ?", (today,))
+        state.checked_in = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT id, student_key, break_start FROM bathroom_breaks WHERE break_end IS NULL")
+        state.on_break = {key: (break_id, start) for break_id, key, start in cursor.fetchall()}
+        cursor.execute("SELECT id, student_key, visit_start FROM nurse_visits WHERE visit_end IS NULL")
+        state.at_nurse = {key: (visit_id, start) for visit_id, key, start in cursor.fetchall()}
+        self._day_state = state
+        self._notify('day_reloaded')
+
+    def add_listener(self, callback):
+        """Register callback(kind, details) to hear about every committed change.
+
+        kind is one of 'student_added', 'roster_reloaded', 'day_reloaded',
+        'checked_in', 'checked_out', 'break_started', 'break_ended',
+        'nurse_started' or 'nurse_ended'; details is a dict with the
+        student_key, identifier and times involved. Callbacks run on the thread that made
+        the change, after it committed. The *_reloaded kinds mean "anything
+        may have changed" (another process wrote, the day rolled over, or a
+        bulk import finished).
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, kind, **details):
+        for callback in list(self._listeners):
+            callback(kind, details)
+
+    def key_for(self, identifier):
+        """Return the student_key for an NFC UID or student_id from the cache, or None"""
+        key = self._key_by_uid.get(identifier)
+        if key is None:
+            key = self._key_by_student_id.get(identifier)
+        return key
+
+    def student_by_key(self, key):
+        """Return (nfc_uid, student_id, name) for a student_key from the cache, or None"""
+        return self._students.get(key)
+
+    def student_for(self, identifier):
+        """Return (nfc_uid, student_id, name) for an NFC UID or student_id from the cache, or None"""
+        return self._students.get(self.key_for(identifier))
+
+    def roster_since(self, key=0):
+        """Return (roster version, [(student_key, nfc_uid, student_id, name)] for keys above key)"""
+        self._sync()
+        return self._roster_version, [(k, *student) for k, student in self._students.items() if k > key]
+
+    def day_state(self):
+        """Return today's in-memory state, rebuilding it after midnight"""
+        self._sync()
+        if self._day_state.day != datetime.now().date():
+            closed_day = self._day_state.day
+            self.load_day_state()
+            # End-of-day close: settle the finished day's summaries from its events
+            self.rebuild_daily_summary(closed_day, closed_day)
+        return self._day_state
+
+    def _sync(self):
+        """Pick up changes another connection committed (checked at most every SYNC_INTERVAL)"""
+        now = _time.monotonic()
+        if now - self._synced_at < SYNC_INTERVAL:
+            return
+        with self._lock:
+            self._synced_at = now
+            # data_version only moves when a *different* connection commits
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            if self._committer is not None:
+                # self.conn also sees the committer's batches, i.e. our own writes, which
+                # the in-memory state already has: only reload if the committer's
+                # connection saw someone else commit. The probe queues behind journaled
+                # taps, so none are left uncommitted to vanish from a rebuilt state.
+                foreign_version = self._committer.data_version()
+                if foreign_version == self._foreign_version:
+                    return
+                self._foreign_version = foreign_version
+            if self._read_roster_version() != self._roster_version:
+                self.load_roster()
+            self.load_day_state()
+
+    def _cache_new_students(self):
+        """Add students committed since the last load to the in-memory roster.
+
+        Keys only grow, so this reads just the rows past the highest key seen.
+        """
+        rows = self.conn.execute("SELECT student_key, id, student_id, name FROM students WHERE student_key > ?",
+                                 (self._max_key,)).fetchall()
+        if rows:
+            # Built a map at a time: the whole roster is loaded this way at startup
+            self._students.update({key: (nfc_uid, student_id, name) for key, nfc_uid, student_id, name in rows})
+            self._key_by_uid.update({nfc_uid: key for key, nfc_uid, _, _ in rows if nfc_uid})
+            self._key_by_student_id.update({student_id: key for key, _, student_id, _ in rows})
+            self._max_key = max(self._max_key, max(row[0] for row in rows))
+        self._roster_version = self._read_roster_version()
+
+    def _resolve(self, nfc_uid=None, student_id=None):
+        """Return (student_key, identifier) for whichever identifier was given, syncing first"""
+        self._sync()
+        identifier = self.get_identifier(nfc_uid, student_id)
+        if nfc_uid:
+            return self._key_by_uid.get(nfc_uid), identifier
+        return self._key_by_student_id.get(student_id), identifier
+
+    def _student_name(self, key):
+        """Return the name for a student_key, or None if unknown"""
+        student = self._students.get(key)
+        return student[2] if student else None
+
     def add_student(self, nfc_uid, student_id, name):
-        """Add a new student to the database"""
+        """Add a new student to the database (an empty NFC UID is stored as NULL)"""
+        nfc_uid = nfc_uid or None
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(
+            self._write(lambda cursor: cursor.execute(
                 "INSERT INTO students (id, student_id, name) VALUES (?, ?, ?)",
                 (nfc_uid, student_id, name)
-            )
-            self.conn.commit()
+            ))
+            with self._lock:
+                self._cache_new_students()
+            key = self._key_by_student_id.get(student_id)
+            self._notify('student_added', student_key=key, identifier=nfc_uid or student_id,
+                         student_id=student_id, name=name)
             return True
         except sqlite3.IntegrityError:
             return False
-    
+
     def get_student_by_uid(self, nfc_uid):
         """Get student information by NFC UID"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT student_id, name FROM students WHERE id = ?",
-            (nfc_uid,)
-        )
-        result = cursor.fetchone()
-        return result if result else None
-    
+        self._sync()
+        student = self._students.get(self._key_by_uid.get(nfc_uid))
+        return (student[1], student[2]) if student else None
+
     def get_student_by_student_id(self, student_id):
         """Get student information by school student_id"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT id, name FROM students WHERE student_id = ?",
-            (student_id,)
-        )
-        result = cursor.fetchone()
-        return result if result else None
+        self._sync()
+        student = self._students.get(self._key_by_student_id.get(student_id))
+        return (student[0], student[2]) if student else None
     
+    def search_students(self, text, limit=SEARCH_LIMIT):
+        """Students matching text, best first: [(nfc_uid, student_id, name)].
+
+        student_id prefixes come first (an exact student_id leading), then
+        name prefixes, both read in index order. Then come students whose
+        name, student_id or card UID contains every word, from the trigram
+        index (which needs a word of three or more characters): names with
+        a word starting with text ahead of the rest, then by name. Only the
+        first SEARCH_CANDIDATES substring matches are ranked, so a very
+        common substring stays fast.
+        """
+        words = text.split()
+        if not words:
+            return []
+        needle = " ".join(words)
+        upper = needle[:-1] + chr(ord(needle[-1]) + 1)
+        found = {}
+        for query in ("search_student_id_prefix", "search_name_prefix"):
+            for key, nfc_uid, student_id, name in self.conn.execute(HOT_QUERIES[query][0], (needle, upper, limit)):
+                found.setdefault(key, (nfc_uid, student_id, name))
+        long_words = [word for word in words if len(word) >= 3]
+        if len(found) >= limit or not long_words:
+            return list(found.values())[:limit]
+        # Each word as an FTS5 string, which the trigram tokenizer matches as a substring
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in long_words)
+        short_words = [word for word in words if len(word) < 3]
+        contains = "".join("AND instr(lower(s.name || ' ' || s.student_id || ' ' || COALESCE(s.id, '')), lower(?)) "
+                           for _ in short_words)
+        sql = f'''
+            SELECT s.student_key, s.id, s.student_id, s.name
+            FROM (SELECT rowid FROM student_search WHERE student_search MATCH ? LIMIT ?) AS f
+            JOIN students s ON s.student_key = f.rowid
+            WHERE 1 {contains}
+            ORDER BY instr(' ' || lower(s.name), ' ' || lower(?)) > 0 DESC, s.name
+        '''
+        for key, nfc_uid, student_id, name in self.conn.execute(sql, (match, SEARCH_CANDIDATES, *short_words, needle)):
+            found.setdefault(key, (nfc_uid, student_id, name))
+        return list(found.values())[:limit]
+
     def get_identifier(self, nfc_uid=None, student_id=None):
         """Return the identifier to use for attendance/breaks: NFC UID if present, else student_id."""
         if nfc_uid:
@@ -131,66 +1384,79 @@ class StudentDatabase:
         else:
             return None
 
-    def check_in(self, nfc_uid=None, student_id=None):
-        """Record student check-in using a consistent identifier."""
-        cursor = self.conn.cursor()
-        today = datetime.now().date()
-        current_time = datetime.now()
-        identifier = self.get_identifier(nfc_uid, student_id)
+    def check_in(self, nfc_uid=None, student_id=None, at=None):
+        """Record student check-in against the student's key, whichever identifier was used.
+
+        at is the time of the tap (default now); replayed taps pass their original time.
+        """
+        current_time = at or datetime.now()
+        today = current_time.date()
+        key, identifier = self._resolve(nfc_uid, student_id)
         if not identifier:
             return False, "No student identifier provided"
         # Check if student exists
-        if nfc_uid:
-            cursor.execute("SELECT name FROM students WHERE id = ?", (nfc_uid,))
-        else:
-            cursor.execute("SELECT name FROM students WHERE student_id = ?", (student_id,))
-        student = cursor.fetchone()
-        if not student:
+        if key is None:
             return False, "Student not found in database"
-        # Check if already checked in
-        cursor.execute(
-            "SELECT id FROM attendance WHERE student_uid = ? AND date = ?",
-            (identifier, today)
-        )
-        if cursor.fetchone():
-            return False, "Already checked in today"
+        # Check if already checked in, and claim the check-in so a
+        # concurrent tap cannot record it twice while this one commits
+        with self._lock:
+            state = self.day_state()
+            if state.day != today:
+                # A replayed tap from another day: only the database knows
+                if self.conn.execute("SELECT id FROM attendance WHERE date = ? AND student_key = ?",
+                                     (today, key)).fetchone():
+                    return False, "Already checked in today"
+            elif key in state.checked_in:
+                return False, "Already checked in today"
+            else:
+                state.checked_in.add(key)
         # Determine scheduled check-out time
         _, period_end = get_period_for_time(current_time)
         scheduled_check_out = None
         if period_end:
             scheduled_check_out = current_time.replace(hour=period_end.hour, minute=period_end.minute, second=0, microsecond=0)
         try:
-            cursor.execute(
-                "INSERT INTO attendance (student_uid, date, check_in, scheduled_check_out) VALUES (?, ?, ?, ?)",
-                (identifier, today, current_time.strftime("%Y-%m-%d %H:%M:%S.%f"), scheduled_check_out.strftime("%Y-%m-%d %H:%M:%S") if scheduled_check_out else None)
-            )
-            self.conn.commit()
-            return True, "Checked in successfully"
+            def record(cursor):
+                cursor.execute(
+                    "INSERT INTO attendance (student_key, date, check_in, scheduled_check_out) VALUES (?, ?, ?, ?)",
+                    (key, today, current_time, scheduled_check_out)
+                )
+                _summarize_check_in(cursor, key, current_time)
+            self._write(record, ("check_in", {"nfc_uid": nfc_uid, "student_id": student_id}, current_time))
         except Exception as e:
+            with self._lock:
+                if state.day == today:
+                    state.checked_in.discard(key)
             return False, f"Error during check-in: {str(e)}"
-    
+        with self._lock:
+            if self._day_state.day == today:
+                self._day_state.checked_in.add(key)
+        self._notify('checked_in', student_key=key, identifier=identifier, time=current_time)
+        return True, "Checked in successfully"
+
     def is_checked_in(self, identifier):
         """Check if student is checked in today by identifier (NFC UID or student_id)"""
-        cursor = self.conn.cursor()
-        today = datetime.now().date()
-        cursor.execute(
-            "SELECT id FROM attendance WHERE student_uid = ? AND date = ?",
-            (identifier, today)
-        )
-        result = cursor.fetchone()
-        return result is not None
-    
+        return self.key_for(identifier) in self.day_state().checked_in
+
     def is_on_break(self, identifier):
         """Check if student is currently on a break by identifier (NFC UID or student_id)"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, break_start 
-            FROM bathroom_breaks 
-            WHERE student_uid = ? 
-            AND break_end IS NULL
-        """, (identifier,))
-        result = cursor.fetchone()
-        return result is not None
+        return self.key_for(identifier) in self.day_state().on_break
+
+    def _checked_in_on(self, key, day):
+        """Whether a student checked in on day: today's from memory, another day's
+        (a replayed tap) from the database, as check_in does"""
+        state = self.day_state()
+        if state.day == day:
+            return key in state.checked_in
+        return self.conn.execute("SELECT id FROM attendance WHERE date = ? AND student_key = ?",
+                                 (day, key)).fetchone() is not None
+
+    def _open_on(self, table, start, end, day):
+        """Student keys with a break / nurse visit (table and its start / end columns)
+        started on day, a replayed tap's, that is still open"""
+        return {row[0] for row in self.conn.execute(
+            f"SELECT student_key FROM {table} WHERE {end} IS NULL AND {start} >= ? AND {start} < ?",
+            day_range(day))}
     
     def get_today_attendance(self):
         """Get today's attendance records"""
@@ -198,6 +1464,7 @@ class StudentDatabase:
         today = datetime.now().date()
         
         # Get all students and their attendance for today
+        # (check_in / check_out come back as datetimes, see connect)
         cursor.execute('''
         SELECT 
             s.student_id,
@@ -205,320 +1472,327 @@ class StudentDatabase:
             a.check_in,
             a.check_out
         FROM students s
-        LEFT JOIN attendance a ON s.student_id = a.student_id AND a.date = ?
+        LEFT JOIN attendance a ON a.date = ? AND a.student_key = s.student_key
         ORDER BY s.name
         ''', (today,))
         
-        results = cursor.fetchall()
-        
-        # Convert string timestamps to datetime objects
-        processed_results = []
-        for student_id, name, check_in, check_out in results:
-            try:
-                # Try parsing with microseconds first
-                check_in_dt = datetime.strptime(check_in, "%Y-%m-%d %H:%M:%S.%f") if check_in else None
-                check_out_dt = datetime.strptime(check_out, "%Y-%m-%d %H:%M:%S.%f") if check_out else None
-            except ValueError:
-                try:
-                    # If that fails, try without microseconds
-                    check_in_dt = datetime.strptime(check_in, "%Y-%m-%d %H:%M:%S") if check_in else None
-                    check_out_dt = datetime.strptime(check_out, "%Y-%m-%d %H:%M:%S") if check_out else None
-                except (ValueError, TypeError) as e:
-                    print(f"Error processing timestamps for student {name}: {e}")
-                    check_in_dt = None
-                    check_out_dt = None
-            
-            processed_results.append((student_id, name, check_in_dt, check_out_dt))
-        
-        return processed_results
+        return cursor.fetchall()
     
-    def check_out(self, student_id):
-        """Record student check-out"""
+    def check_out(self, student_id, at=None):
+        """Record student check-out (student_id may also be an NFC UID)"""
         cursor = self.conn.cursor()
-        today = datetime.now().date()
-        current_time = datetime.now()
+        current_time = at or datetime.now()
+        today = current_time.date()
+        key = self.key_for(student_id)
         
         # Check if student is checked in
         cursor.execute(
-            "SELECT id FROM attendance WHERE student_id = ? AND date = ? AND check_out IS NULL",
-            (student_id, today)
+            "SELECT id FROM attendance WHERE date = ? AND student_key = ? AND check_out IS NULL",
+            (today, key)
         )
         attendance = cursor.fetchone()
         if not attendance:
             return False, "Not checked in today"
         
         # Record check-out
-        cursor.execute(
+        self._write(lambda cursor: cursor.execute(
             "UPDATE attendance SET check_out = ? WHERE id = ?",
-            (current_time.strftime("%Y-%m-%d %H:%M:%S.%f"), attendance[0])
-        )
-        self.conn.commit()
+            (current_time, attendance[0])
+        ), ("check_out", {"student_id": student_id}, current_time))
+        self._notify('checked_out', student_key=key, identifier=student_id, time=current_time)
         return True, "Checked out successfully"
     
-    def start_bathroom_break(self, identifier):
+    def start_bathroom_break(self, identifier, at=None):
         """Start a bathroom break for a student by identifier (NFC UID or student_id)"""
-        if not self.is_checked_in(identifier):
+        key = self.key_for(identifier)
+        break_start = at or datetime.now()
+        if key is None or not self._checked_in_on(key, break_start.date()):
             return False, "Student is not checked in"
-        try:
-            cursor = self.conn.cursor()
+        with self._lock:
+            state = self.day_state()
+            # A replayed tap from another day is checked against that day's breaks
+            if state.day == break_start.date():
+                on_break = state.on_break
+            else:
+                on_break = self._open_on('bathroom_breaks', 'break_start', 'break_end', break_start.date())
             # Check if any student is currently on a break
-            cursor.execute("""
-                SELECT s.name 
-                FROM bathroom_breaks b
-                JOIN students s ON b.student_uid = s.id OR b.student_uid = s.student_id
-                WHERE b.break_end IS NULL
-            """)
-            active_break = cursor.fetchone()
-            if active_break:
-                return False, f"Another student ({active_break[0]}) is already on a break"
+            for other in on_break:
+                other_name = self._student_name(other)
+                if other_name:
+                    return False, f"Another student ({other_name}) is already on a break"
             # Check if this student has an active break
-            cursor.execute("""
-                SELECT id FROM bathroom_breaks 
-                WHERE student_uid = ? 
-                AND break_end IS NULL
-            """, (identifier,))
-            if cursor.fetchone():
+            if key in on_break:
                 return False, "Student is already on a break"
+            # Claim the break; its row id is filled in once committed
+            state.on_break[key] = (None, break_start)
+        try:
             # Start new break
-            current_time = datetime.now()
-            cursor.execute("""
-                INSERT INTO bathroom_breaks (student_uid, break_start)
+            break_id = self._write(lambda cursor: cursor.execute("""
+                INSERT INTO bathroom_breaks (student_key, break_start)
                 VALUES (?, ?)
-            """, (identifier, current_time.strftime("%Y-%m-%d %H:%M:%S.%f")))
-            self.conn.commit()
-            return True, "Break started"
+            """, (key, break_start)).lastrowid,
+                ("start_bathroom_break", {"identifier": identifier}, break_start))
         except Exception as e:
-            self.conn.rollback()
+            with self._lock:
+                state.on_break.pop(key, None)
             return False, str(e)
+        with self._lock:
+            self._day_state.on_break[key] = (break_id, break_start)
+        self._notify('break_started', student_key=key, identifier=identifier, start=break_start)
+        return True, "Break started"
     
-    def end_bathroom_break(self, identifier):
+    def end_bathroom_break(self, identifier, at=None):
         """End a bathroom break for a student by identifier (NFC UID or student_id)"""
-        try:
-            cursor = self.conn.cursor()
-            # Get the active break
-            cursor.execute("""
-                SELECT id, break_start 
-                FROM bathroom_breaks
-                WHERE student_uid = ? 
-                AND break_end IS NULL
-            """, (identifier,))
-            result = cursor.fetchone()
-            if not result:
+        key = self.key_for(identifier)
+        with self._lock:
+            state = self.day_state()
+            # Get the active break (and claim it)
+            result = state.on_break.get(key)
+            if not result or result[0] is None:
                 return False, "Student is not on a break"
-            break_id, break_start = result
-            break_end = datetime.now()
-            # Calculate duration
-            try:
-                start_dt = datetime.strptime(break_start, "%Y-%m-%d %H:%M:%S.%f")
-            except ValueError:
-                start_dt = datetime.strptime(break_start, "%Y-%m-%d %H:%M:%S")
-            duration = int((break_end - start_dt).total_seconds() / 60)
-            cursor.execute("""
-                UPDATE bathroom_breaks
-                SET break_end = ?, duration_minutes = ?
-                WHERE id = ?
-            """, (break_end.strftime("%Y-%m-%d %H:%M:%S.%f"), duration, break_id))
-            self.conn.commit()
-            return True, "Break ended"
+            del state.on_break[key]
+        try:
+            _, break_start = result
+            break_end = at or datetime.now()
+            duration = minutes_between(break_start, break_end)
+            # By student rather than row id: a journaled start may not have its row yet
+            def record(cursor):
+                if cursor.execute("""
+                    UPDATE bathroom_breaks
+                    SET break_end = ?, duration_minutes = ?
+                    WHERE student_key = ? AND break_end IS NULL
+                """, (break_end, duration, key)).rowcount:
+                    _summarize_visit(cursor, 'break', key, break_start, duration)
+            self._write(record, ("end_bathroom_break", {"identifier": identifier}, break_end))
         except Exception as e:
-            self.conn.rollback()
+            with self._lock:
+                state.on_break[key] = result
             return False, str(e)
+        with self._lock:
+            self._day_state.on_break.pop(key, None)
+        self._notify('break_ended', student_key=key, identifier=identifier, start=break_start, end=break_end, duration=duration)
+        return True, "Break ended"
     
     def get_today_breaks(self):
         """Get all bathroom breaks for today"""
         cursor = self.conn.cursor()
         today = datetime.now().date()
         
-        # Debug: Print the current date we're searching for
-        print(f"Searching for breaks on date: {today}")
-        
         cursor.execute("""
             SELECT s.student_id, b.break_start, b.break_end, b.duration_minutes
             FROM bathroom_breaks b
-            JOIN students s ON b.student_id = s.student_id
-            WHERE date(b.break_start) = ?
+            JOIN students s ON s.student_key = b.student_key
+            WHERE b.break_start >= ? AND b.break_start < ?
             ORDER BY b.break_start DESC
-        """, (today.strftime("%Y-%m-%d"),))
+        """, day_range(today))
         
         results = cursor.fetchall()
-        print(f"Found {len(results)} breaks for today")  # Debug log
-        
-        # Debug: Print raw results
-        for result in results:
-            print(f"Raw break data: {result}")
-        
-        # Convert string timestamps to datetime objects
-        formatted_results = []
-        for student_id, start, end, duration in results:
-            try:
-                # Try parsing with microseconds first
-                start_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S.%f") if start else None
-                end_dt = datetime.strptime(end, "%Y-%m-%d %H:%M:%S.%f") if end else None
-            except ValueError:
-                try:
-                    # If that fails, try without microseconds
-                    start_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S") if start else None
-                    end_dt = datetime.strptime(end, "%Y-%m-%d %H:%M:%S") if end else None
-                except ValueError as e:
-                    print(f"Error processing timestamps for student {student_id}: {str(e)}")
-                    continue
-            
-            formatted_results.append((student_id, start_dt, end_dt, duration))
-            print(f"Processed break for {student_id}: start={start_dt}, end={end_dt}, duration={duration}")  # Debug log
-        
-        return formatted_results
+        logger.debug("Found %d breaks for %s", len(results), today)
+        return results
     
-    def import_from_csv(self, csv_file):
+    def import_from_csv(self, csv_file, upsert=False, progress=None):
         """Import students from a CSV file
         Expected CSV format:
         id,student_id,name
+        The file is read as a stream; see import_students for upsert and progress.
         """
-        results = {"success": 0, "failed": 0, "errors": []}
         try:
-            with open(csv_file, 'r') as file:
+            with open(csv_file, 'r', newline='') as file:
                 reader = csv.DictReader(file)
-                if not all(col in reader.fieldnames for col in ['id', 'student_id', 'name']):
+                if not reader.fieldnames or not all(col in reader.fieldnames for col in ['id', 'student_id', 'name']):
                     raise ValueError("CSV must contain 'id', 'student_id', and 'name' columns")
-                cursor = self.conn.cursor()
-                for row in reader:
-                    try:
-                        nfc_uid = row.get('id')
-                        student_id = row.get('student_id')
-                        name = row.get('name')
-                        if not nfc_uid or not student_id or not name:
-                            results["failed"] += 1
-                            results["errors"].append(f"Missing data in row: {row}")
-                            continue
-                        cursor.execute(
-                            "INSERT INTO students (id, student_id, name) VALUES (?, ?, ?)",
-                            (nfc_uid, student_id, name)
-                        )
-                        results["success"] += 1
-                    except sqlite3.IntegrityError:
-                        results["failed"] += 1
-                        results["errors"].append(f"Duplicate NFC UID or student ID: {nfc_uid}, {student_id}")
-                    except Exception as e:
-                        results["failed"] += 1
-                        results["errors"].append(f"Error processing row {row}: {str(e)}")
-                self.conn.commit()
+                return self.import_students(reader, upsert, progress, _file_fraction(file), ("row", "row"))
         except Exception as e:
-            results["errors"].append(f"File error: {str(e)}")
-            return results
-        return results
+            return {"success": 0, "failed": 0, "updated": 0, "errors": [f"File error: {str(e)}"]}
     
-    def import_from_json(self, json_file):
+    def import_from_json(self, json_file, upsert=False, progress=None):
         """Import students from a JSON file
         Expected JSON format:
         [
             {"id": "nfc_uid", "student_id": "123456", "name": "John Doe"},
             ...
         ]
+        The array is decoded one object at a time, so the file is never held in memory.
         """
-        results = {"success": 0, "failed": 0, "errors": []}
         try:
             with open(json_file, 'r') as file:
-                students = json.load(file)
-                if not isinstance(students, list):
-                    raise ValueError("JSON must contain an array of student objects")
-                cursor = self.conn.cursor()
-                for student in students:
-                    try:
-                        nfc_uid = student.get('id')
-                        student_id = student.get('student_id')
-                        name = student.get('name')
-                        if not nfc_uid or not student_id or not name:
-                            results["failed"] += 1
-                            results["errors"].append(f"Missing data in object: {student}")
-                            continue
-                        cursor.execute(
-                            "INSERT INTO students (id, student_id, name) VALUES (?, ?, ?)",
-                            (nfc_uid, student_id, name)
-                        )
-                        results["success"] += 1
-                    except sqlite3.IntegrityError:
+                students = iter_json_array(file)
+                return self.import_students(students, upsert, progress, _file_fraction(file))
+        except Exception as e:
+            return {"success": 0, "failed": 0, "updated": 0, "errors": [f"File error: {str(e)}"]}
+    
+    def import_students(self, students, upsert=False, progress=None, fraction=None, labels=("object", "student")):
+        """Bulk import an iterable of {"id", "student_id", "name"} mappings in one transaction.
+
+        Rows are checked against the roster cache as they stream in, so a
+        duplicate becomes an error entry instead of failing its batch, and
+        accepted rows are written with executemany every IMPORT_BATCH_SIZE
+        rows. With upsert=True a row whose student_id already exists updates
+        that student's NFC UID and name. progress(rows_read, fraction_done)
+        is called after each batch, fraction() giving the share of the input
+        consumed. Returns {"success", "failed", "updated", "errors"}.
+        """
+        results = {"success": 0, "failed": 0, "updated": 0, "errors": []}
+        self._sync()
+        # Who owns each UID / student_id, kept current as rows are accepted
+        uid_owner = {nfc_uid: student_id for nfc_uid, student_id, _ in self._students.values() if nfc_uid}
+        student_uid = {student_id: nfc_uid for nfc_uid, student_id, _ in self._students.values()}
+        sql = "INSERT INTO students (id, student_id, name) VALUES (?, ?, ?)"
+        if upsert:
+            sql += " ON CONFLICT (student_id) DO UPDATE SET id = excluded.id, name = excluded.name"
+        batch = []
+        imported = 0
+        rows_read = 0
+        cursor = self.conn.cursor()
+        cursor.execute("SAVEPOINT import" if self._batch_depth else "BEGIN")
+        try:
+            for student in students:
+                rows_read += 1
+                try:
+                    nfc_uid = student.get('id')
+                    student_id = student.get('student_id')
+                    name = student.get('name')
+                    if not nfc_uid or not student_id or not name:
                         results["failed"] += 1
-                        results["errors"].append(f"Duplicate NFC UID or student ID: {nfc_uid}, {student_id}")
-                    except Exception as e:
+                        results["errors"].append(f"Missing data in {labels[0]}: {student}")
+                        continue
+                    exists = student_id in student_uid
+                    if (exists and not upsert) or uid_owner.get(nfc_uid, student_id) != student_id:
                         results["failed"] += 1
-                        results["errors"].append(f"Error processing student {student}: {str(e)}")
+                        results["errors"].append(f"Duplicate NFC UID or student ID: {nfc_uid}, {student_id}")
+                        continue
+                    if exists:
+                        uid_owner.pop(student_uid[student_id], None)
+                    uid_owner[nfc_uid] = student_id
+                    student_uid[student_id] = nfc_uid
+                    batch.append(((nfc_uid, student_id, name), exists))
+                except Exception as e:
+                    results["failed"] += 1
+                    results["errors"].append(f"Error processing {labels[1]} {student}: {str(e)}")
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    imported += self._import_batch(cursor, sql, batch, results)
+                    batch = []
+                    if progress:
+                        progress(rows_read, fraction() if fraction else 0.0)
+            imported += self._import_batch(cursor, sql, batch, results)
+            event_id = getattr(self._event, 'event_id', None)
+            if event_id is not None:
+                self._record_event(cursor, event_id)
+            if self._batch_depth:
+                cursor.execute("RELEASE import")
+            else:
                 self.conn.commit()
-        except Exception as e:
-            results["errors"].append(f"File error: {str(e)}")
-            return results
+        except Exception:
+            if self._batch_depth:
+                cursor.execute("ROLLBACK TO import")
+                cursor.execute("RELEASE import")
+            else:
+                self.conn.rollback()
+            raise
+        if results["updated"]:
+            # UIDs may have moved between students; rebuild rather than patch
+            self.load_roster()
+        elif imported:
+            # New students all got keys past the highest cached one
+            self._cache_new_students()
+            self._notify('roster_reloaded')
+        if progress:
+            progress(rows_read, 1.0)
         return results
     
+    def _import_batch(self, cursor, sql, batch, results):
+        """Write one batch of (row, is_update) pairs; return how many were written"""
+        if not batch:
+            return 0
+        rows = [row for row, _ in batch]
+        cursor.execute("SAVEPOINT import_batch")
+        try:
+            cursor.executemany(sql, rows)
+            written = batch
+        except sqlite3.IntegrityError:
+            # The database changed under the cache; redo row by row to find the culprits
+            cursor.execute("ROLLBACK TO import_batch")
+            written = []
+            for row, is_update in batch:
+                try:
+                    cursor.execute(sql, row)
+                    written.append((row, is_update))
+                except sqlite3.IntegrityError:
+                    results["failed"] += 1
+                    results["errors"].append(f"Duplicate NFC UID or student ID: {row[0]}, {row[1]}")
+        cursor.execute("RELEASE import_batch")
+        results["success"] += len(written)
+        results["updated"] += sum(1 for _, is_update in written if is_update)
+        return len(written)
+    
     def is_at_nurse(self, identifier):
         """Check if student is currently at the nurse by identifier (NFC UID or student_id)"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, visit_start 
-            FROM nurse_visits 
-            WHERE student_uid = ? 
-            AND visit_end IS NULL
-        """, (identifier,))
-        result = cursor.fetchone()
-        return result is not None
+        return self.key_for(identifier) in self.day_state().at_nurse
     
-    def start_nurse_visit(self, nfc_uid=None, student_id=None):
+    def start_nurse_visit(self, nfc_uid=None, student_id=None, at=None):
         """Start a nurse visit for a student by identifier (NFC UID or student_id)"""
-        identifier = self.get_identifier(nfc_uid, student_id)
-        if not self.is_checked_in(identifier):
+        key, identifier = self._resolve(nfc_uid, student_id)
+        visit_start = at or datetime.now()
+        if key is None or not self._checked_in_on(key, visit_start.date()):
             return False, "Student is not checked in"
-        try:
-            cursor = self.conn.cursor()
+        with self._lock:
+            state = self.day_state()
+            # A replayed tap from another day is checked against that day's visits
+            if state.day == visit_start.date():
+                at_nurse = state.at_nurse
+            else:
+                at_nurse = self._open_on('nurse_visits', 'visit_start', 'visit_end', visit_start.date())
             # Check if this student has an active nurse visit
-            cursor.execute("""
-                SELECT id FROM nurse_visits 
-                WHERE student_uid = ? 
-                AND visit_end IS NULL
-            """, (identifier,))
-            if cursor.fetchone():
+            if key in at_nurse:
                 return False, "Student is already at the nurse"
+            # Claim the visit; its row id is filled in once committed
+            state.at_nurse[key] = (None, visit_start)
+        try:
             # Start new nurse visit
-            current_time = datetime.now()
-            cursor.execute("""
-                INSERT INTO nurse_visits (student_uid, visit_start)
+            visit_id = self._write(lambda cursor: cursor.execute("""
+                INSERT INTO nurse_visits (student_key, visit_start)
                 VALUES (?, ?)
-            """, (identifier, current_time.strftime("%Y-%m-%d %H:%M:%S.%f")))
-            self.conn.commit()
-            return True, "Nurse visit started"
+            """, (key, visit_start)).lastrowid,
+                ("start_nurse_visit", {"nfc_uid": nfc_uid, "student_id": student_id}, visit_start))
         except Exception as e:
-            self.conn.rollback()
+            with self._lock:
+                state.at_nurse.pop(key, None)
             return False, str(e)
+        with self._lock:
+            self._day_state.at_nurse[key] = (visit_id, visit_start)
+        self._notify('nurse_started', student_key=key, identifier=identifier, start=visit_start)
+        return True, "Nurse visit started"
     
-    def end_nurse_visit(self, nfc_uid=None, student_id=None):
+    def end_nurse_visit(self, nfc_uid=None, student_id=None, at=None):
         """End a nurse visit for a student by identifier (NFC UID or student_id)"""
-        identifier = self.get_identifier(nfc_uid, student_id)
-        try:
-            cursor = self.conn.cursor()
-            # Get the active nurse visit
-            cursor.execute("""
-                SELECT id, visit_start 
-                FROM nurse_visits
-                WHERE student_uid = ? 
-                AND visit_end IS NULL
-            """, (identifier,))
-            result = cursor.fetchone()
-            if not result:
+        key, identifier = self._resolve(nfc_uid, student_id)
+        with self._lock:
+            state = self.day_state()
+            # Get the active nurse visit (and claim it)
+            result = state.at_nurse.get(key)
+            if not result or result[0] is None:
                 return False, "Student is not at the nurse"
-            visit_id, visit_start = result
-            visit_end = datetime.now()
-            # Calculate duration
-            try:
-                start_dt = datetime.strptime(visit_start, "%Y-%m-%d %H:%M:%S.%f")
-            except ValueError:
-                start_dt = datetime.strptime(visit_start, "%Y-%m-%d %H:%M:%S")
-            duration = int((visit_end - start_dt).total_seconds() / 60)
-            cursor.execute("""
-                UPDATE nurse_visits
-                SET visit_end = ?, duration_minutes = ?
-                WHERE id = ?
-            """, (visit_end.strftime("%Y-%m-%d %H:%M:%S.%f"), duration, visit_id))
-            self.conn.commit()
-            return True, "Nurse visit ended"
+            del state.at_nurse[key]
+        try:
+            _, visit_start = result
+            visit_end = at or datetime.now()
+            duration = minutes_between(visit_start, visit_end)
+            def record(cursor):
+                if cursor.execute("""
+                    UPDATE nurse_visits
+                    SET visit_end = ?, duration_minutes = ?
+                    WHERE student_key = ? AND visit_end IS NULL
+                """, (visit_end, duration, key)).rowcount:
+                    _summarize_visit(cursor, 'nurse', key, visit_start, duration)
+            self._write(record, ("end_nurse_visit", {"nfc_uid": nfc_uid, "student_id": student_id}, visit_end))
         except Exception as e:
-            self.conn.rollback()
+            with self._lock:
+                state.at_nurse[key] = result
             return False, str(e)
+        with self._lock:
+            self._day_state.at_nurse.pop(key, None)
+        self._notify('nurse_ended', student_key=key, identifier=identifier, start=visit_start, end=visit_end, duration=duration)
+        return True, "Nurse visit ended"
     
     def get_today_nurse_visits(self):
         """Get all nurse visits for today (returns student_id, start, end, duration)"""
@@ -527,44 +1801,296 @@ class StudentDatabase:
         cursor.execute("""
             SELECT s.student_id, n.visit_start, n.visit_end, n.duration_minutes
             FROM nurse_visits n
-            JOIN students s ON n.student_uid = s.id OR n.student_uid = s.student_id
-            WHERE date(n.visit_start) = ?
+            JOIN students s ON s.student_key = n.student_key
+            WHERE n.visit_start >= ? AND n.visit_start < ?
             ORDER BY n.visit_start DESC
-        """, (today.strftime("%Y-%m-%d"),))
-        results = cursor.fetchall()
-        formatted_results = []
-        for student_id, start, end, duration in results:
-            try:
-                start_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S.%f") if start else None
-                end_dt = datetime.strptime(end, "%Y-%m-%d %H:%M:%S.%f") if end else None
-            except ValueError:
-                try:
-                    start_dt = datetime.strptime(start, "%Y-%m-%d %H:%M:%S") if start else None
-                    end_dt = datetime.strptime(end, "%Y-%m-%d %H:%M:%S") if end else None
-                except ValueError as e:
-                    continue
-            formatted_results.append((student_id, start_dt, end_dt, duration))
-        return formatted_results
+        """, day_range(today))
+        return cursor.fetchall()
+    
+    def warm_cache(self):
+        """Read the pages today's writes will touch (WARM_QUERIES) into the OS page cache.
+
+        Uses its own read-only connection, so it may run on any thread; the
+        kiosk runs it in the background once its window is up.
+        """
+        now = datetime.now()
+        params = {"today": now.date().isoformat(),
+                  "midnight": to_epoch_us(datetime.combine(now.date(), time.min))}
+        conn = sqlite3.connect(f"file:{self.db_name}?mode=ro", uri=True)
+        try:
+            for sql in WARM_QUERIES:
+                conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
     
     def auto_checkout_students(self):
-        """Automatically check out students whose scheduled_check_out time has passed and check_out is NULL."""
-        cursor = self.conn.cursor()
+        """End-of-period pass: check out every student whose scheduled_check_out has passed
+        and close bathroom breaks / nurse visits left open across a period end,
+        all in one transaction.
+
+        Check-outs are stamped with their scheduled time, and dangling breaks /
+        visits with the period end they outlived. Returns (checked_out,
+        breaks_closed, visits_closed).
+        """
         now = datetime.now()
-        today = now.date()
-        cursor.execute(
-            "SELECT id, student_uid, scheduled_check_out FROM attendance WHERE date = ? AND check_out IS NULL AND scheduled_check_out IS NOT NULL",
-            (today,)
-        )
-        rows = cursor.fetchall()
-        for row in rows:
-            att_id, student_uid, scheduled_str = row
+        period_end = last_period_end(now)
+
+        def close_period(cursor):
+            cursor.execute(
+                "UPDATE attendance SET check_out = scheduled_check_out "
+                "WHERE check_out IS NULL AND scheduled_check_out <= ?",
+                (now,)
+            )
+            checked_out = cursor.rowcount
+            closed = []
+            for table, start, end, kind in (('bathroom_breaks', 'break_start', 'break_end', 'break'),
+                                            ('nurse_visits', 'visit_start', 'visit_end', 'nurse')):
+                cursor.execute(f"SELECT student_key, {start} FROM {table} WHERE {end} IS NULL AND {start} < ?", (period_end,))
+                rows = cursor.fetchall()
+                closed.append(rows)
+                cursor.execute(f"""
+                    UPDATE {table}
+                    SET {end} = ?, duration_minutes = (? - {start}) / 60000000
+                    WHERE {end} IS NULL AND {start} < ?
+                """, (period_end, period_end, period_end))
+                for key, started in rows:
+                    if key is not None:
+                        _summarize_visit(cursor, kind, key, started, minutes_between(started, period_end))
+            return checked_out, closed[0], closed[1]
+
+        checked_out, breaks, visits = self._write(close_period)
+        with self._lock:
+            state = self._day_state
+            for key, _ in breaks:
+                state.on_break.pop(key, None)
+            for key, _ in visits:
+                state.at_nurse.pop(key, None)
+        for kind, closed in (('break_ended', breaks), ('nurse_ended', visits)):
+            for key, start in closed:
+                student = self._students.get(key)
+                identifier = (student[0] or student[1]) if student else None
+                duration = minutes_between(start, period_end)
+                self._notify(kind, student_key=key, identifier=identifier, start=start, end=period_end, duration=duration)
+        return checked_out, len(breaks), len(visits)
+    
+    def rebuild_daily_summary(self, start, end):
+        """Recompute the summaries of dates start..end (inclusive) from the event tables"""
+        self._write(lambda cursor: _fold_daily_summary(cursor, start, end + timedelta(days=1)))
+    
+    def summary_by_student(self, start, end, identifier=None):
+        """Attendance totals per student for dates start..end (inclusive), from daily_summary.
+
+        Returns (student_id, name, days_present, tardies, breaks, break_minutes,
+        nurse_visits, nurse_minutes) rows ordered by name; identifier (NFC UID
+        or student_id) limits it to one student.
+        """
+        if identifier is None:
+            results = self._report("summary_by_student", start, end)
+        else:
+            results = self._report("student_summary", start, end, self.key_for(identifier))
+        # A range reaching into archives has a row per student from each of them
+        by_key = {}
+        for key, *totals in results:
+            if key in by_key:
+                by_key[key] = [total + more for total, more in zip(by_key[key], totals)]
+            else:
+                by_key[key] = totals
+        rows = []
+        for key, totals in by_key.items():
+            student = self._students.get(key)
+            if student:
+                rows.append((student[1], student[2], *totals))
+        rows.sort(key=lambda row: row[1])
+        return rows
+    
+    def summary_by_day(self, start, end):
+        """School-wide totals per date for start..end (inclusive): (date, present, tardies,
+        breaks, break_minutes, nurse_visits, nurse_minutes), from daily_totals"""
+        return self._report("summary_by_day", start, end)
+    
+    def student_days(self, identifier, start, end):
+        """One student's days for start..end (inclusive): (date, first_check_in, tardy,
+        breaks, break_minutes, nurse_visits, nurse_minutes)"""
+        return self._report("student_days", start, end, self.key_for(identifier))
+    
+    def _report(self, name, start, end, *params):
+        """Run REPORT_QUERIES[name] over the archives holding dates start..end, then the current
+        database; returns the rows of all of them, oldest source first"""
+        with self._lock:
+            rows = []
+            for schema in self._report_schemas(start, end):
+                rows.extend(self.conn.execute(REPORT_QUERIES[name].format(schema=schema), (*params, start, end)))
+            return rows
+
+    def _report_schemas(self, start, end):
+        archives = [self._resolve_archive(path) for (path,) in self.conn.execute(
+            "SELECT path FROM archives WHERE first_date <= ? AND last_date >= ? ORDER BY first_date",
+            (end, start))]
+        if len(archives) > MAX_ATTACHED_ARCHIVES:
+            raise ValueError(f"Dates {start}..{end} span more than {MAX_ATTACHED_ARCHIVES} archives")
+        if len(set(archives) | set(self._attached)) > MAX_ATTACHED_ARCHIVES:
+            self._detach_archives()
+        return [self._attach_archive(path) for path in archives] + ["main"]
+
+    def _resolve_archive(self, path):
+        """Archive paths are stored relative to the database's directory"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_name)), path)
+
+    def _attach_archive(self, path):
+        """Attach an archive to self.conn (once) and return its schema name"""
+        schema = self._attached.get(path)
+        if schema is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Archive {path} is missing")
+            self._attach_count += 1
+            schema = f"archive_{self._attach_count}"
+            self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            self._attached[path] = schema
+        return schema
+
+    def _detach_archives(self):
+        for schema in self._attached.values():
+            self.conn.execute(f"DETACH DATABASE {schema}")
+        self._attached = {}
+
+    def archives(self):
+        """Return [(name, path, first_date, last_date, archived_at)] of the term archives, oldest first"""
+        return self.conn.execute(
+            "SELECT name, path, first_date, last_date, archived_at FROM archives ORDER BY first_date").fetchall()
+
+    def archive_path(self, name):
+        """Default archive file for a term: archives/<database name>-<term>.db next to the database"""
+        stem = os.path.splitext(os.path.basename(self.db_name))[0]
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_name)), ARCHIVE_DIR, f"{stem}-{name}.db")
+
+    def archive_term(self, name, through, path=None, vacuum=False):
+        """Term rollover: move every day up to through (inclusive) into the archive database for name.
+
+        Attendance rows, ended breaks and visits, and their daily summaries
+        move; open breaks and visits, and the roster, stay. The archive gets
+        the same tables plus a roster snapshot, and reports covering its
+        days attach it on demand. Running it again for the same term moves
+        any later days into the same file.
+
+        Rows are copied and committed in the archive before they are deleted
+        here, so a crash in between leaves them in both and a rerun finishes
+        the move. vacuum=True then shrinks the database file. Returns
+        {table: rows moved}.
+        """
+        if through >= datetime.now().date():
+            raise ValueError("Only days before today can be archived")
+        path = os.path.abspath(path or self.archive_path(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cutoff_day = through + timedelta(days=1)
+        cutoff = datetime.combine(cutoff_day, time())
+        moves = [
+            ('attendance', "date < ?", cutoff_day),
+            ('bathroom_breaks', "break_start < ? AND break_end IS NOT NULL", cutoff),
+            ('nurse_visits', "visit_start < ? AND visit_end IS NOT NULL", cutoff),
+            # daily_summary before daily_totals: its delete triggers adjust the totals
+            ('daily_summary', "date < ?", cutoff_day),
+            ('daily_totals', "date < ?", cutoff_day),
+        ]
+        self.flush()
+        with self._lock:
+            self._detach_archives()
+            cursor = self.conn.cursor()
+            cursor.execute("ATTACH DATABASE ? AS term_archive", (path,))
             try:
-                scheduled_dt = datetime.strptime(scheduled_str, "%Y-%m-%d %H:%M:%S")
-            except Exception:
-                continue
-            if scheduled_dt <= now:
-                cursor.execute(
-                    "UPDATE attendance SET check_out = ? WHERE id = ?",
-                    (now.strftime("%Y-%m-%d %H:%M:%S.%f"), att_id)
-                )
-        self.conn.commit() 
\ No newline at end of file
+                cursor.execute("BEGIN")
+                try:
+                    self._create_archive_schema(cursor)
+                    # Roster rows are matched on student_key. An archived row is brought up
+                    # to date unless its new card or student ID is held by another archived
+                    # student, and is never replaced: its history still points at it
+                    cursor.execute("""
+                        UPDATE OR IGNORE term_archive.students AS a
+                        SET id = s.id, student_id = s.student_id, name = s.name
+                        FROM main.students AS s WHERE s.student_key = a.student_key
+                    """)
+                    cursor.execute("INSERT OR IGNORE INTO term_archive.students SELECT * FROM main.students")
+                    for table, where, bound in moves:
+                        # Rows keep their ids, so copying again after a crash adds nothing twice
+                        cursor.execute(f"INSERT OR IGNORE INTO term_archive.{table} "
+                                       f"SELECT * FROM main.{table} WHERE {where}", (bound,))
+                    self._check_archived_roster(cursor)
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                cursor.execute("BEGIN")
+                try:
+                    moved = {table: cursor.execute(f"DELETE FROM main.{table} WHERE {where}", (bound,)).rowcount
+                             for table, where, bound in moves}
+                    first_date = cursor.execute("""
+                        SELECT MIN(date) FROM (SELECT MIN(date) AS date FROM term_archive.attendance
+                                               UNION ALL SELECT MIN(date) FROM term_archive.daily_totals)
+                    """).fetchone()[0] or through.isoformat()
+                    cursor.execute("""
+                        INSERT INTO archives (name, path, first_date, last_date, archived_at) VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (name) DO UPDATE SET
+                            path = excluded.path, first_date = excluded.first_date,
+                            last_date = MAX(last_date, excluded.last_date), archived_at = excluded.archived_at
+                    """, (name, os.path.relpath(path, os.path.dirname(os.path.abspath(self.db_name))),
+                          first_date, through, datetime.now()))
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+            finally:
+                cursor.execute("DETACH DATABASE term_archive")
+            if vacuum:
+                cursor.execute("VACUUM")
+        logger.info("Archived %s through %s into %s: %s", name, through, path, moved)
+        return moved
+
+    def _check_archived_roster(self, cursor):
+        """Refuse to archive history of students the archive's roster has no row for.
+
+        That happens when a student's card UID or student ID is still held by
+        another student in the archive (one since removed from the roster,
+        say): the archived row is kept, so this student's could not be added.
+        """
+        missing = [row[0] for row in cursor.execute("""
+            SELECT student_key FROM main.students
+            WHERE student_key NOT IN (SELECT student_key FROM term_archive.students)
+        """)]
+        if not missing:
+            return
+        placeholders = ", ".join("?" * len(missing))
+        orphaned = set()
+        for table in ('attendance', 'bathroom_breaks', 'nurse_visits', 'daily_summary'):
+            orphaned.update(row[0] for row in cursor.execute(
+                f"SELECT DISTINCT student_key FROM term_archive.{table} WHERE student_key IN ({placeholders})",
+                missing))
+        if orphaned:
+            names = sorted(self._students[key][1] for key in orphaned if key in self._students)
+            raise ValueError("The archive already holds other students with the card or student ID of "
+                             f"{', '.join(names)}; archive this term into a new file")
+
+    def _create_archive_schema(self, cursor):
+        """Create ARCHIVED_TABLES and their indexes in term_archive, defined as they are here"""
+        if not cursor.execute("SELECT 1 FROM term_archive.sqlite_master").fetchone():
+            cursor.execute(f"PRAGMA term_archive.user_version = {ARCHIVE_UTC_VERSION}")
+        placeholders = ", ".join("?" * len(ARCHIVED_TABLES))
+        definitions = cursor.execute(f"""
+            SELECT type, sql FROM main.sqlite_master
+            WHERE tbl_name IN ({placeholders}) AND type IN ('table', 'index') AND sql IS NOT NULL
+            ORDER BY type = 'index'
+        """, ARCHIVED_TABLES).fetchall()
+        for kind, sql in definitions:
+            if kind == 'table':
+                sql = re.sub(r'^CREATE TABLE ', 'CREATE TABLE IF NOT EXISTS term_archive.', sql)
+            else:
+                sql = re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX IF NOT EXISTS term_archive.', sql)
+            cursor.execute(sql)
+
+    def school_days(self, start, end):
+        """Number of weekdays from start to end (inclusive) with a bell schedule, to turn presence into absences"""
+        days = 0
+        day = start
+        while day <= end:
+            if day.weekday() < 5 and BELL_CALENDAR.first_bell(day) is not None:
+                days += 1
+            day += timedelta(days=1)
+        return days
@@ -0,0 +1,277 @@
+"""Durable, append-only journal of accepted taps.
+
+Every tap is appended here, and is on disk, before it is applied to the
+database; if SQLite is locked or corrupt (or the attendance server is
+unreachable) when the tap is applied, the record is still here and is
+replayed at the next start (StudentDatabase.replay_journal).
+
+The journal is a directory with one log per day, taps-YYYY-MM-DD.log. A log
+is a sequence of records
+
+    uint32 payload length | uint32 crc32(payload) | payload
+
+(little-endian), the payload being compact JSON [event_id, at, method,
+kwargs]: the StudentDatabase write method to call with its keyword
+arguments, and when the tap happened (epoch microseconds, as the database
+stores times). A record torn by a crash mid-append fails its length or CRC
+check and is cut off when the journal is opened.
+
+taps-YYYY-MM-DD.applied holds the offset below which every record of that
+log is known to be in the database. Replay starts there; records past it
+that did reach the database are skipped by their event IDs
+(StudentDatabase.apply_event), so the checkpoint may lag safely.
+
+Appends are fsync-batched the way GroupCommitter batches commits: append()
+returns once its record is on disk, and records appended while another
+caller waits share one fdatasync.
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from student_db import from_epoch_us, to_epoch_us
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<II")   # payload length, crc32 of payload
+MAX_RECORD = 64 * 1024                 # a longer length field means a torn or corrupt record
+FSYNC_WINDOW = 0.002                   # seconds an fsync waits for more appends, while callers are in flight
+CHECKPOINT_INTERVAL = 1.0              # seconds between checkpoint file writes
+KEEP_DAYS = 7                          # fully applied logs older than this are deleted
+
+JournalRecord = namedtuple('JournalRecord', ['path', 'offset', 'end', 'event_id', 'at', 'method', 'kwargs'])
+
+_sync = getattr(os, 'fdatasync', os.fsync)
+
+
+def encode_record(event_id, at, method, kwargs):
+    """Return the bytes of one journal record"""
+    payload = json.dumps([event_id, to_epoch_us(at), method, kwargs], separators=(',', ':')).encode('utf-8')
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path, start=0):
+    """Yield the intact records of a log from offset start, stopping at the first damaged one"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read()
+    position = 0
+    while position + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, position)
+        body = position + RECORD_HEADER.size
+        payload = data[body:body + length]
+        if length > MAX_RECORD or len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        event_id, at, method, kwargs = json.loads(payload)
+        yield JournalRecord(path, start + position, start + body + length,
+                            event_id, from_epoch_us(at), method, kwargs)
+        position = body + length
+
+
+class TapJournal:
+    """The journal directory: append() for the hot path, pending() and mark_applied() for replay"""
+
+    def __init__(self, directory, window=FSYNC_WINDOW, keep_days=KEEP_DAYS):
+        self.directory = directory
+        self.window = window
+        self.appends = 0
+        self.syncs = 0
+        os.makedirs(directory, exist_ok=True)
+        self._applied = {}            # log path -> checkpoint offset
+        self._completed = {}          # log path -> {offset: end} of records applied past the checkpoint
+        self._dirty = set()           # logs whose checkpoint moved since it was written
+        self._checkpointed_at = 0.0
+        self._lock = threading.Lock()
+        for path in self.logs():
+            self._repair(path)
+        self.prune(keep_days)
+        self._file = None
+        self._path = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="tap-journal", daemon=True)
+        self._thread.start()
+
+    def log_path(self, day):
+        return os.path.join(self.directory, f"taps-{day.isoformat()}.log")
+
+    def logs(self):
+        """Every log in the journal, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, "taps-*.log")))
+
+    def append(self, method, kwargs, at=None, event_id=None):
+        """Append one tap and return its JournalRecord once it is on disk"""
+        at = at or datetime.now()
+        item = {"record": (event_id or uuid.uuid4().hex, at, method, kwargs), "done": threading.Event()}
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            self._queue.put(item)
+            item["done"].wait()
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+        if "error" in item:
+            raise item["error"]
+        return item["result"]
+
+    def pending(self):
+        """Yield every record past its log's checkpoint, oldest first"""
+        for path in self.logs():
+            yield from read_records(path, self.applied_offset(path))
+
+    def applied_offset(self, path):
+        with self._lock:
+            if path not in self._applied:
+                self._applied[path] = self._read_checkpoint(path)
+            return self._applied[path]
+
+    def mark_applied(self, record):
+        """Note that a record is in the database (safe from any thread).
+
+        Records may be applied out of order; the checkpoint moves to the end
+        of the longest unbroken run of applied records, so a record that
+        failed to apply is replayed next time, together with everything
+        after it.
+        """
+        offset = self.applied_offset(record.path)
+        with self._lock:
+            if record.offset < offset:
+                return
+            completed = self._completed.setdefault(record.path, {})
+            completed[record.offset] = record.end
+            while offset in completed:
+                offset = completed.pop(offset)
+            if offset != self._applied[record.path]:
+                self._applied[record.path] = offset
+                self._dirty.add(record.path)
+            if time.monotonic() - self._checkpointed_at >= CHECKPOINT_INTERVAL:
+                self._write_checkpoints()
+
+    def prune(self, keep_days=KEEP_DAYS):
+        """Delete fully applied logs older than keep_days; returns how many"""
+        cutoff = self.log_path(datetime.now().date() - timedelta(days=keep_days))
+        removed = 0
+        for path in self.logs():
+            if path < cutoff and self.applied_offset(path) >= os.path.getsize(path):
+                os.remove(path)
+                if os.path.exists(path[:-4] + ".applied"):
+                    os.remove(path[:-4] + ".applied")
+                with self._lock:
+                    self._applied.pop(path, None)
+                    self._completed.pop(path, None)
+                removed += 1
+        return removed
+
+    def close(self):
+        """Finish pending appends, save checkpoints and close the log"""
+        self._queue.put(None)
+        self._thread.join()
+        with self._lock:
+            self._write_checkpoints()
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path[:-4] + ".applied", 'r') as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_checkpoints(self):
+        # Not fsynced: a checkpoint lost in a crash only makes replay start earlier
+        for path in self._dirty:
+            checkpoint = path[:-4] + ".applied"
+            with open(checkpoint + ".tmp", 'w') as file:
+                file.write(str(self._applied[path]))
+            os.replace(checkpoint + ".tmp", checkpoint)
+        self._dirty.clear()
+        self._checkpointed_at = time.monotonic()
+
+    def _repair(self, path):
+        """Cut a torn or corrupt tail off a log"""
+        end = 0
+        for record in read_records(path):
+            end = record.end
+        size = os.path.getsize(path)
+        if end < size:
+            logger.warning("Truncating %s from %d to %d bytes (damaged final record)", path, size, end)
+            with open(path, 'r+b') as file:
+                file.truncate(end)
+                _sync(file.fileno())
+
+    def _open(self, path):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, 'ab')
+        self._path = path
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while True:
+                # Hold the fsync only while more appenders are on their way
+                remaining = deadline - time.monotonic()
+                waiting = remaining > 0 and self._pending > len(batch)
+                try:
+                    item = self._queue.get(timeout=remaining) if waiting else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch):
+        start = (self._path, self._file.tell()) if self._file is not None else None
+        try:
+            for item in batch:
+                event_id, at, method, kwargs = item["record"]
+                path = self.log_path(at.date())
+                if path != self._path:
+                    if self._file is not None:
+                        _sync(self._file.fileno())
+                    self._open(path)
+                data = encode_record(event_id, at, method, kwargs)
+                offset = self._file.tell()
+                self._file.write(data)
+                item["result"] = JournalRecord(path, offset, offset + len(data), event_id, at, method, kwargs)
+            self._file.flush()
+            _sync(self._file.fileno())
+            self.syncs += 1
+        except Exception as e:
+            logger.error("Journal append failed: %s", e)
+            for item in batch:
+                item["error"] = e
+            # Later appends must not land behind a half-written record
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._path = None
+            for path in {item["result"].path for item in batch if "result" in item} | ({start[0]} if start else set()):
+                try:
+                    self._repair(path)
+                except OSError:
+                    pass
+        self.appends += len(batch)
+        for item in batch:
+            item["done"].set()
@@ -0,0 +1,53 @@
+"""Term rollover: move finished days out of the live database into an archive.
+
+    python term_archive.py archive 2025-26 --through 2026-06-12 --vacuum
+    python term_archive.py list
+
+Each term gets its own database file (archives/<database>-<term>.db by
+default) with the same attendance, break, nurse and summary tables, so the
+live database only carries the current term. Reports and exports over
+archived days attach the archive files on demand (see
+StudentDatabase.archive_term). Run it on the machine that holds the
+database, with the kiosks idle or connected through attendance_server.py.
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date
+
+from student_db import StudentDatabase
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive finished terms into separate database files")
+    parser.add_argument("--db", default="student_attendance.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="move every day up to --through into the term's archive")
+    archive.add_argument("term", help="archive name, e.g. 2025-26 or 2026-fall")
+    archive.add_argument("--through", type=date.fromisoformat, required=True,
+                         help="last day of the term (YYYY-MM-DD, before today)")
+    archive.add_argument("--path", default=None, help="archive file (default: archives/<database>-<term>.db)")
+    archive.add_argument("--vacuum", action="store_true", help="shrink the live database file afterwards")
+
+    commands.add_parser("list", help="show the archives and the days they hold")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = StudentDatabase(args.db)
+    try:
+        if args.command == "archive":
+            moved = db.archive_term(args.term, args.through, args.path, args.vacuum)
+            for table, count in moved.items():
+                print(f"{table:16} {count} rows moved")
+        else:
+            for name, path, first_date, last_date, archived_at in db.archives():
+                print(f"{name:12} {first_date} .. {last_date}  {path}  (archived {archived_at:%Y-%m-%d %H:%M})")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""AttendanceServer on localhost with several RemoteStudentDatabase kiosks"""
+
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+from attendance_server import AttendanceServer, RemoteError, RemoteStudentDatabase
+from tap_journal import TapJournal
+
+CLIENTS = 4
+TAPS = 50        # check-ins per kiosk
+FIRST = 100      # student numbers FIRST.. are imported for the concurrent taps
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = AttendanceServer(str(tmp_path / "server.db"), host="127.0.0.1", port=0)
+    thread = server.start()
+    yield server
+    server.stop()
+    thread.join()
+
+
+@pytest.fixture
+def kiosks(server):
+    kiosks = [RemoteStudentDatabase("%s:%d" % server.address) for _ in range(CLIENTS)]
+    first = kiosks[0]
+    assert first.add_student("AA000001", "000001", "Test Student")
+    results = first.import_students({"id": f"UID{n:05d}", "student_id": f"{n:06d}", "name": f"Student {n}"}
+                                    for n in range(FIRST, FIRST + CLIENTS * TAPS))
+    assert results["success"] == CLIENTS * TAPS, results
+    yield kiosks
+    for kiosk in kiosks:
+        kiosk.close()
+
+
+def refresh(kiosk):
+    """Have a kiosk poll the server now instead of after SYNC_INTERVAL"""
+    kiosk._synced_at = 0.0
+    kiosk._sync()
+
+
+def test_duplicate_student_is_refused(kiosks):
+    assert not kiosks[0].add_student("AA000001", "000001", "Test Student")
+
+
+def test_every_kiosk_sees_new_students(kiosks):
+    for kiosk in kiosks:
+        refresh(kiosk)
+        assert kiosk.get_student_by_uid(f"UID{FIRST:05d}") == (f"{FIRST:06d}", f"Student {FIRST}")
+
+
+def test_concurrent_batched_check_ins(kiosks):
+    outcomes = []
+
+    def tap_all(index, kiosk):
+        uids = [f"UID{n:05d}" for n in range(FIRST + index * TAPS, FIRST + (index + 1) * TAPS)]
+        outcomes.extend(kiosk.submit_events([("check_in", (uid,), {}, None) for uid in uids]))
+
+    workers = [threading.Thread(target=tap_all, args=(index, kiosk)) for index, kiosk in enumerate(kiosks)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(outcomes) == CLIENTS * TAPS
+    assert all(outcome[0] for outcome in outcomes), outcomes[:3]
+    attendance = kiosks[1].get_today_attendance()
+    assert sum(1 for row in attendance if row[2] is not None) == CLIENTS * TAPS
+
+
+def test_resent_event_is_applied_once(kiosks):
+    first = kiosks[0]
+    event = ("check_in", ("AA000001",), {}, uuid.uuid4().hex)
+    assert first.submit_events([event]) == [[True, "Checked in successfully"]]
+    assert first.submit_events([event]) == [[True, "Checked in successfully"]]
+    assert first.check_in("AA000001") == (False, "Already checked in today")
+
+
+def test_break_and_nurse_flows(kiosks):
+    first = kiosks[0]
+    assert first.check_in("AA000001") == (True, "Checked in successfully")
+    assert first.start_bathroom_break("AA000001") == (True, "Break started")
+    assert kiosks[1].is_on_break("000001")
+    assert first.end_bathroom_break("AA000001") == (True, "Break ended")
+    assert first.start_nurse_visit(student_id="000001") == (True, "Nurse visit started")
+    assert first.end_nurse_visit(nfc_uid="AA000001") == (True, "Nurse visit ended")
+    assert len(first.get_today_breaks()) == 1
+    assert len(first.get_today_nurse_visits()) == 1
+    attendance = [row for row in first.get_today_attendance() if row[0] == "000001"]
+    assert isinstance(attendance[0], tuple) and isinstance(attendance[0][2], datetime)
+
+
+def test_listeners_hear_other_kiosks(kiosks):
+    heard = []
+    kiosks[-1].add_listener(lambda kind, details: heard.append(kind))
+    refresh(kiosks[-1])
+    first = kiosks[0]
+    assert first.check_in("AA000001")[0]
+    assert first.start_bathroom_break("AA000001")[0]
+    assert first.start_nurse_visit(nfc_uid="AA000001")[0]
+    assert first.end_nurse_visit(nfc_uid="AA000001")[0]
+    refresh(kiosks[-1])
+    assert heard.count('checked_in') == 1
+    assert 'break_started' in heard and 'nurse_ended' in heard
+
+
+def test_reconnects_after_a_dropped_connection(kiosks):
+    assert kiosks[0].check_in("AA000001")[0]
+    kiosks[1]._sock.close()
+    assert kiosks[1].is_checked_in("000001")
+
+
+def test_journal_keeps_a_tap_the_server_could_not_write(server, kiosks, tmp_path):
+    with sqlite3.connect(server.db_name) as conn:
+        conn.execute("""
+            CREATE TRIGGER fail_breaks BEFORE INSERT ON bathroom_breaks
+            BEGIN SELECT RAISE(ABORT, 'disk trouble'); END
+        """)
+    journal = TapJournal(str(tmp_path / "journal"))
+    kiosk = RemoteStudentDatabase("%s:%d" % server.address, journal=journal)
+    try:
+        assert kiosk.check_in("AA000001") == (True, "Checked in successfully")
+        assert kiosk.start_bathroom_break("AA000001")[0]
+        assert [record.method for record in journal.pending()] == ["start_bathroom_break"]
+        assert not kiosks[0].is_on_break("000001")
+
+        with sqlite3.connect(server.db_name) as conn:
+            conn.execute("DROP TRIGGER fail_breaks")
+        assert kiosk.end_bathroom_break("AA000001") == (True, "Break ended")
+        assert list(journal.pending()) == []
+        assert len(kiosks[0].get_today_breaks()) == 1
+    finally:
+        kiosk.close()
+        journal.close()
+
+
+def test_a_token_is_needed_to_listen_beyond_loopback(tmp_path):
+    with pytest.raises(ValueError):
+        AttendanceServer(str(tmp_path / "server.db"), host="0.0.0.0", port=0)
+
+
+def test_requests_without_the_token_are_refused(tmp_path, monkeypatch):
+    monkeypatch.delenv("ATTENDANCE_SERVER_TOKEN", raising=False)
+    server = AttendanceServer(str(tmp_path / "server.db"), host="127.0.0.1", port=0, token="s3cret")
+    thread = server.start()
+    address = "%s:%d" % server.address
+    try:
+        with pytest.raises(RemoteError, match="Not authorized"):
+            RemoteStudentDatabase(address)
+        with pytest.raises(RemoteError, match="Not authorized"):
+            RemoteStudentDatabase(address, token="guess")
+        kiosk = RemoteStudentDatabase(address, token="s3cret")
+        assert kiosk.add_student("AA000001", "000001", "Test Student")
+        kiosk.close()
+    finally:
+        server.stop()
+        thread.join()
@@ -0,0 +1,50 @@
+"""Reloading the in-memory day state when another connection writes (StudentDatabase._sync)"""
+
+import pytest
+
+from student_db import StudentDatabase
+
+STUDENTS = [{"id": f"04{i:06X}", "student_id": f"{100000 + i}", "name": f"Student {i}"} for i in range(4)]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db_name = str(tmp_path / "attendance.db")
+    setup = StudentDatabase(db_name)
+    setup.import_students(STUDENTS)
+    setup.close()
+    db = StudentDatabase(db_name, group_commit=True)
+    db.reloads = 0
+    load_day_state = db.load_day_state
+
+    def counting_load_day_state():
+        db.reloads += 1
+        load_day_state()
+
+    monkeypatch.setattr(db, "load_day_state", counting_load_day_state)
+    yield db
+    db.close()
+
+
+def sync(db):
+    db._synced_at = 0.0
+    db._sync()
+
+
+def test_own_group_commits_do_not_reload(db):
+    for student in STUDENTS[:3]:
+        db.check_in(nfc_uid=student["id"])
+    sync(db)
+    sync(db)
+    assert db.reloads == 0
+
+
+def test_another_connections_write_reloads_once(db):
+    db.check_in(nfc_uid=STUDENTS[0]["id"])
+    other = StudentDatabase(db.db_name)
+    other.check_in(nfc_uid=STUDENTS[1]["id"])
+    other.close()
+    sync(db)
+    sync(db)
+    assert db.reloads == 1
+    assert len(db._day_state.checked_in) == 2
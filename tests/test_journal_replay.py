@@ -0,0 +1,98 @@
+"""Replaying the tap journal at startup (StudentDatabase.replay_journal)"""
+
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from student_db import StudentDatabase
+from tap_journal import TapJournal
+
+UID = "04A1B2C3"
+
+
+@pytest.fixture
+def paths(tmp_path):
+    db_name = str(tmp_path / "attendance.db")
+    db = StudentDatabase(db_name)
+    db.import_students([{"id": UID, "student_id": "123456", "name": "Ada Lovelace"}])
+    db.close()
+    return db_name, str(tmp_path / "journal")
+
+
+def journal_taps(directory, taps):
+    journal = TapJournal(directory)
+    for method, kwargs, at in taps:
+        journal.append(method, kwargs, at)
+    journal.close()
+
+
+def yesterdays_taps():
+    morning = datetime.combine(datetime.now().date() - timedelta(days=1), time(9, 0))
+    return [
+        ("check_in", {"nfc_uid": UID, "student_id": None}, morning),
+        ("start_bathroom_break", {"identifier": UID}, morning + timedelta(minutes=30)),
+        ("end_bathroom_break", {"identifier": UID}, morning + timedelta(minutes=40)),
+        ("start_nurse_visit", {"nfc_uid": UID, "student_id": None}, morning + timedelta(minutes=60)),
+    ]
+
+
+def counts(db):
+    return tuple(db.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                 for table in ("attendance", "bathroom_breaks", "nurse_visits"))
+
+
+def test_replays_an_earlier_days_taps(paths):
+    db_name, directory = paths
+    journal_taps(directory, yesterdays_taps())
+
+    journal = TapJournal(directory)
+    db = StudentDatabase(db_name, journal=journal)
+    try:
+        db.flush()
+        assert counts(db) == (1, 1, 1)
+        assert db.conn.execute("SELECT duration_minutes FROM bathroom_breaks").fetchone()[0] == 10
+        assert list(journal.pending()) == []
+    finally:
+        db.close()
+        journal.close()
+
+
+def test_keeps_a_record_whose_write_failed(paths):
+    db_name, directory = paths
+    journal_taps(directory, yesterdays_taps()[:2])
+    db = StudentDatabase(db_name)
+    db.conn.execute("""
+        CREATE TRIGGER fail_breaks BEFORE INSERT ON bathroom_breaks
+        BEGIN SELECT RAISE(ABORT, 'disk trouble'); END
+    """)
+    db.conn.commit()
+
+    journal = TapJournal(directory)
+    assert db.replay_journal(journal) == 2
+    assert counts(db) == (1, 0, 0)
+    assert [record.method for record in journal.pending()] == ["start_bathroom_break"]
+
+    db.conn.execute("DROP TRIGGER fail_breaks")
+    db.conn.commit()
+    db.replay_journal(journal)
+    assert counts(db) == (1, 1, 0)
+    assert list(journal.pending()) == []
+    db.close()
+    journal.close()
+
+
+def test_opening_with_a_journal_prunes_old_event_ids(paths):
+    db_name, directory = paths
+    db = StudentDatabase(db_name)
+    db.conn.executemany("INSERT INTO processed_events (event_id, processed_at) VALUES (?, ?)",
+                        [("old", datetime.now() - timedelta(days=30)), ("recent", datetime.now())])
+    db.conn.commit()
+    db.close()
+
+    journal = TapJournal(directory)
+    db = StudentDatabase(db_name, journal=journal)
+    try:
+        assert [row[0] for row in db.conn.execute("SELECT event_id FROM processed_events")] == ["recent"]
+    finally:
+        db.close()
+        journal.close()
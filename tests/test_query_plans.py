@@ -0,0 +1,58 @@
+"""Every HOT_QUERIES plan uses an index, before and after ANALYZE"""
+
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from student_db import StudentDatabase
+
+STUDENTS = 300
+DAYS = 5
+
+# Hot queries allowed to scan a whole table, with the reason; none so far
+ALLOWED_SCANS = {}
+
+
+def uid(number):
+    return f"UID{number:05d}"
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = StudentDatabase(str(tmp_path / "attendance.db"))
+    db.import_students([{"id": uid(number), "student_id": f"{number:06d}", "name": f"Student {number}"}
+                        for number in range(STUDENTS)])
+    yield db
+    db.close()
+
+
+def load_history(db):
+    """A few school days of check-ins, breaks and nurse visits, then today's open ones"""
+    today = datetime.now().date()
+    with db.batch():
+        for days_ago in range(DAYS, -1, -1):
+            morning = datetime.combine(today - timedelta(days=days_ago), time(8, 0))
+            for number in range(0, STUDENTS, 2):
+                db.check_in(nfc_uid=uid(number), at=morning + timedelta(seconds=number))
+            for number in range(0, 40, 4):
+                start = morning + timedelta(hours=1, minutes=number)
+                db.start_bathroom_break(uid(number), at=start)
+                db.end_bathroom_break(uid(number), at=start + timedelta(minutes=3))
+                db.start_nurse_visit(nfc_uid=uid(number), at=start)
+                db.end_nurse_visit(nfc_uid=uid(number), at=start + timedelta(minutes=10))
+    db.auto_checkout_students()
+
+
+def test_no_full_scans_on_a_new_database(db):
+    scans = db.find_full_table_scans()
+    assert set(scans) == set(ALLOWED_SCANS), scans
+
+
+def test_no_full_scans_after_analyze(db):
+    load_history(db)
+    assert db.conn.execute("SELECT count(*) FROM bathroom_breaks").fetchone()[0] == 10 * (DAYS + 1)
+    db.conn.execute("ANALYZE")
+    db.conn.commit()
+    scans = db.find_full_table_scans()
+    assert set(scans) == set(ALLOWED_SCANS), scans
+
@@ -0,0 +1,28 @@
+"""TapJournal checkpoints"""
+
+from tap_journal import TapJournal
+
+
+def test_checkpoint_follows_records_applied_out_of_order(tmp_path):
+    journal = TapJournal(str(tmp_path))
+    first, second, third = [journal.append("check_in", {"nfc_uid": uid}) for uid in ("A", "B", "C")]
+    journal.mark_applied(second)
+    assert [record.event_id for record in journal.pending()] == [first.event_id, second.event_id, third.event_id]
+    journal.mark_applied(first)
+    assert [record.event_id for record in journal.pending()] == [third.event_id]
+    journal.mark_applied(third)
+    journal.close()
+    reopened = TapJournal(str(tmp_path))
+    assert list(reopened.pending()) == []
+    reopened.close()
+
+
+def test_checkpoint_stops_at_an_unapplied_record(tmp_path):
+    journal = TapJournal(str(tmp_path))
+    first, second, third = [journal.append("check_in", {"nfc_uid": uid}) for uid in ("A", "B", "C")]
+    journal.mark_applied(first)
+    journal.mark_applied(third)
+    journal.close()
+    reopened = TapJournal(str(tmp_path))
+    assert [record.event_id for record in reopened.pending()] == [second.event_id, third.event_id]
+    reopened.close()
@@ -0,0 +1,65 @@
+"""Term rollover (StudentDatabase.archive_term) and exporting archived history"""
+
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from attendance_export import attach_archives, iter_records, open_readonly
+from student_db import StudentDatabase
+
+CARD = "04A1B2C3"
+
+
+def morning(days_ago):
+    return datetime.combine(datetime.now().date() - timedelta(days=days_ago), time(9, 0))
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = StudentDatabase(str(tmp_path / "attendance.db"))
+    assert db.add_student(CARD, "000001", "Ada Lovelace")
+    assert db.add_student("04D4E5F6", "000002", "Charles Babbage")
+    assert db.check_in(nfc_uid=CARD, at=morning(3))[0]
+    db.archive_term("fall", morning(3).date())
+    yield db
+    db.close()
+
+
+def exported_names(db):
+    conn = open_readonly(db.db_name)
+    try:
+        schemas = attach_archives(conn, db.db_name)
+        return [record[3] for record in iter_records(conn, kinds=("attendance",), schemas=schemas)]
+    finally:
+        conn.close()
+
+
+def give_card_to_new_student(db):
+    """Ada leaves the roster and her card goes to Grace"""
+    db.conn.execute("DELETE FROM students WHERE student_id = '000001'")
+    db.conn.commit()
+    db.load_roster()
+    assert db.add_student(CARD, "000003", "Grace Hopper")
+
+
+def test_rerun_keeps_the_archived_student_of_a_reassigned_card(db):
+    give_card_to_new_student(db)
+    db.archive_term("fall", morning(3).date())
+    assert exported_names(db) == ["Ada Lovelace"]
+
+
+def test_refuses_history_the_archived_roster_cannot_name(db):
+    give_card_to_new_student(db)
+    assert db.check_in(nfc_uid=CARD, at=morning(2))[0]
+    with pytest.raises(ValueError, match="000003"):
+        db.archive_term("fall", morning(2).date())
+    assert db.conn.execute("SELECT count(*) FROM attendance").fetchone()[0] == 1
+    assert exported_names(db) == ["Ada Lovelace", "Grace Hopper"]
+
+
+def test_a_replaced_card_can_be_reissued(db):
+    db.import_students([{"id": "04FFFFFF", "student_id": "000001", "name": "Ada Lovelace"}], upsert=True)
+    assert db.add_student(CARD, "000003", "Grace Hopper")
+    assert db.check_in(nfc_uid=CARD, at=morning(2))[0]
+    db.archive_term("fall", morning(2).date())
+    assert exported_names(db) == ["Ada Lovelace", "Grace Hopper"]
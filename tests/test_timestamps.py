@@ -0,0 +1,71 @@
+"""Timestamps stored as UTC epoch microseconds (student_db.connect, migration 10)"""
+
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from student_db import MIGRATIONS, StudentDatabase, from_epoch_us, to_epoch_us
+
+UID = "04A1B2C3"
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Local time with DST; clocks went forward at 2:00 on 2026-03-08"""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def db(tmp_path, new_york):
+    db = StudentDatabase(str(tmp_path / "attendance.db"))
+    db.import_students([{"id": UID, "student_id": "123456", "name": "Ada Lovelace"}])
+    yield db
+    db.close()
+
+
+def test_a_break_across_the_dst_change_lasts_its_real_minutes(db):
+    assert db.check_in(nfc_uid=UID, at=datetime(2026, 3, 8, 1, 0))[0]
+    assert db.start_bathroom_break(UID, at=datetime(2026, 3, 8, 1, 50))[0]
+    assert db.end_bathroom_break(UID, at=datetime(2026, 3, 8, 3, 10))[0]
+    assert db.conn.execute("SELECT duration_minutes FROM bathroom_breaks").fetchone()[0] == 20
+
+
+def test_times_are_stored_as_utc_and_read_as_local(db):
+    assert db.check_in(nfc_uid=UID, at=datetime(2026, 7, 1, 8, 30))[0]
+    raw = sqlite3.connect(db.db_name)
+    stored = raw.execute("SELECT check_in FROM attendance").fetchone()[0]
+    raw.close()
+    assert stored == to_epoch_us(datetime(2026, 7, 1, 12, 30, tzinfo=timezone.utc))
+    assert db.conn.execute("SELECT check_in FROM attendance").fetchone()[0] == datetime(2026, 7, 1, 8, 30)
+    assert from_epoch_us(stored) == datetime(2026, 7, 1, 8, 30)
+
+
+def test_other_connections_keep_sqlite3_defaults(db):
+    assert sqlite3.adapters.get((datetime, sqlite3.PrepareProtocol)) is not to_epoch_us
+
+
+def test_migration_converts_wall_clock_times(tmp_path, new_york):
+    db_name = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    for migration in MIGRATIONS[:9]:
+        migration(cursor)
+    cursor.execute("PRAGMA user_version = 9")
+    cursor.execute("INSERT INTO students (id, student_id, name) VALUES (?, '123456', 'Ada Lovelace')", (UID,))
+    wall_clock = (datetime(2026, 7, 1, 8, 30) - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+    cursor.execute("INSERT INTO attendance (student_key, date, check_in) VALUES (1, '2026-07-01', ?)", (wall_clock,))
+    cursor.execute("COMMIT")
+    conn.close()
+
+    db = StudentDatabase(db_name)
+    try:
+        assert db.conn.execute("SELECT check_in FROM attendance").fetchone()[0] == datetime(2026, 7, 1, 8, 30)
+    finally:
+        db.close()
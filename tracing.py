@@ -0,0 +1,203 @@
+"""Opt-in latency tracing for the scan pipeline.
+
+A Trace follows one tap from the serial bytes arriving to the feedback being
+painted, timestamping each stage with time.perf_counter_ns():
+
+    serial    bytes holding the tap were read from the port
+    parsed    parse_uid() accepted the frame
+    resolved  the student was looked up in the roster
+    committed check_in / the break or visit write returned (it is on disk)
+    painted   the confirmation was first painted on screen
+
+The Tracer keeps, per stage, a histogram of the time since the previous
+stage (plus one for the whole tap), and a ring buffer of the most recent
+traces slower than slow_ms. Tracing is off unless enabled; while it is off
+start() hands out NULL_TRACE, whose mark() does nothing, so instrumented
+code pays one attribute lookup and a no-op call per stage.
+
+    python nfc_reader_gui.py --trace --slow-ms 100
+
+A StartupProfile times the kiosk's start instead: imports, window
+construction, first paint (ready for the first tap) and the work deferred
+until after it.
+
+    python nfc_reader_gui.py --profile-startup
+"""
+
+import bisect
+import itertools
+import threading
+import time
+from collections import deque
+
+STAGES = ("serial", "parsed", "resolved", "committed", "painted")
+TOTAL = "total"
+
+SLOW_TRACE_BUFFER = 50   # slow traces kept for inspection
+DEFAULT_SLOW_MS = 250.0
+
+# Histogram bucket upper bounds in microseconds: 1-2-5 steps from 10us to 50s
+BUCKET_BOUNDS_US = [base * 10 ** exponent for exponent in range(1, 8) for base in (1, 2, 5)]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (microseconds); percentiles are bucket upper bounds"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_US) + 1)   # last bucket: above the top bound
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record(self, elapsed_us):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_US, elapsed_us)] += 1
+        self.count += 1
+        self.total_us += elapsed_us
+        self.max_us = max(self.max_us, elapsed_us)
+
+    def percentile(self, fraction):
+        """Return the bucket bound holding the given fraction (0.0 - 1.0) of samples"""
+        if not self.count:
+            return 0
+        wanted = max(1, round(self.count * fraction))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(BUCKET_BOUNDS_US[index], self.max_us) if index < len(BUCKET_BOUNDS_US) else self.max_us
+        return self.max_us
+
+    def mean(self):
+        return self.total_us / self.count if self.count else 0.0
+
+
+class Trace:
+    """Stage timestamps for one tap"""
+
+    __slots__ = ("trace_id", "label", "marks")
+
+    def __init__(self, trace_id, label, start_ns):
+        self.trace_id = trace_id
+        self.label = label
+        self.marks = [("serial", start_ns)]
+
+    def __bool__(self):
+        return True
+
+    def mark(self, stage):
+        self.marks.append((stage, time.perf_counter_ns()))
+
+    def stage_latencies_us(self):
+        """Return [(stage, microseconds since the previous stage)] for every mark after the first"""
+        return [(stage, (at - previous) // 1000)
+                for (_, previous), (stage, at) in zip(self.marks, self.marks[1:])]
+
+    def total_us(self):
+        return (self.marks[-1][1] - self.marks[0][1]) // 1000
+
+    def __repr__(self):
+        stages = ", ".join(f"{stage} +{elapsed / 1000:.2f}ms" for stage, elapsed in self.stage_latencies_us())
+        return f"Trace({self.trace_id} {self.label!r}: {stages}; total {self.total_us() / 1000:.2f}ms)"
+
+
+class _NullTrace:
+    """Stand-in handed out while tracing is disabled"""
+
+    __slots__ = ()
+    label = None
+
+    def __bool__(self):
+        return False
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Tracer:
+    """Collects finished traces into per-stage histograms and a slow-trace ring buffer"""
+
+    def __init__(self, enabled=False, slow_ms=DEFAULT_SLOW_MS, keep=SLOW_TRACE_BUFFER):
+        self.enabled = enabled
+        self.slow_us = int(slow_ms * 1000)
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES[1:] + (TOTAL,)}
+        self.slow_traces = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=True, slow_ms=None):
+        self.enabled = enabled
+        if slow_ms is not None:
+            self.slow_us = int(slow_ms * 1000)
+
+    def start(self, label=None, start_ns=None):
+        """Begin a trace at start_ns (default now); returns NULL_TRACE while disabled"""
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(next(self._ids), label, start_ns if start_ns is not None else time.perf_counter_ns())
+
+    def finish(self, trace):
+        """Record a completed trace (safe from any thread; NULL_TRACE is ignored)"""
+        if not trace:
+            return
+        latencies = trace.stage_latencies_us()
+        total = trace.total_us()
+        with self._lock:
+            for stage, elapsed in latencies:
+                histogram = self.histograms.get(stage)
+                if histogram is not None:
+                    histogram.record(elapsed)
+            self.histograms[TOTAL].record(total)
+            if total >= self.slow_us:
+                self.slow_traces.append(trace)
+
+    def report(self):
+        """Return a text summary of the histograms and recent slow traces"""
+        lines = [f"{'stage':<10} {'count':>7} {'mean ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                if not histogram.count:
+                    continue
+                lines.append(f"{stage:<10} {histogram.count:>7} {histogram.mean() / 1000:>9.2f} "
+                             f"{histogram.percentile(0.5) / 1000:>8.2f} {histogram.percentile(0.99) / 1000:>8.2f} "
+                             f"{histogram.max_us / 1000:>8.2f}")
+            slow = list(self.slow_traces)
+        if slow:
+            lines.append(f"slowest recent taps (>= {self.slow_us / 1000:.0f}ms):")
+            lines.extend(f"  {trace!r}" for trace in slow)
+        return "\n".join(lines)
+
+
+# Process-wide tracer, configured from the command line
+TRACER = Tracer()
+
+
+class StartupProfile:
+    """Milestones of one kiosk start-up, timed from when the profile was created.
+
+    Marking is cheap enough to leave on; nfc_reader_gui.py --profile-startup
+    prints the report once the deferred start-up work has finished. Marks
+    may come from any thread.
+    """
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.marks = []
+        self._lock = threading.Lock()
+
+    def mark(self, milestone):
+        with self._lock:
+            self.marks.append((milestone, time.perf_counter_ns()))
+
+    def report(self):
+        """Return the milestones in order, with the time since the previous one and since the start"""
+        lines = [f"{'milestone':<24} {'step ms':>9} {'total ms':>9}"]
+        previous = self.start_ns
+        with self._lock:
+            marks = sorted(self.marks, key=lambda mark: mark[1])
+        for milestone, at in marks:
+            lines.append(f"{milestone:<24} {(at - previous) / 1e6:>9.1f} {(at - self.start_ns) / 1e6:>9.1f}")
+            previous = at
+        return "\n".join(lines)
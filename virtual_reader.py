@@ -0,0 +1,451 @@
+"""Virtual NFC reader: replays tap streams to the kiosk over a pty or a socket.
+
+A VirtualReader wraps nfc_emulator.ReaderEmulator, so every byte it sends is
+exactly what esp32_nfc_reader.ino prints, and it answers the host's
+commands. The bytes go out on one of two transports the unmodified
+ReaderManager can open:
+
+    pty      a pseudo-terminal pair; the kiosk opens the slave, e.g. /dev/pts/7
+    socket   a local TCP server; the kiosk opens socket://127.0.0.1:<port>
+
+(pyserial's loop:// handler cannot be used: each serial_for_url('loop://')
+call creates its own private loop, so nothing outside the kiosk can feed it.)
+
+Taps come from a roster database, a recorded serial capture or random UIDs,
+and are replayed at a steady rate or in bell-time bursts:
+
+    python virtual_reader.py serve --source roster:student_attendance.db --rate 5
+    python nfc_reader_gui.py --port /dev/pts/7
+
+The loadtest command drives the real ReaderManager -> StudentDatabase path
+(plus the dashboard's attendance model) headless against a scratch roster at
+increasing rates and reports the highest rate the kiosk keeps up with:
+
+    python virtual_reader.py loadtest --rates 20,50,100,200,500,1000
+"""
+
+import argparse
+import os
+import random
+import select
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+from nfc_emulator import ReaderEmulator, random_uid
+from reader_protocol import LineFramer, ProtocolError, UID, decode_frame, is_frame, uid_string
+
+CHUNK = 4096
+KEEP_UP_RATIO = 0.95   # share of the offered tap rate the kiosk must process
+
+
+class PtyTransport:
+    """A pseudo-terminal pair; the kiosk opens .port (the slave device)"""
+
+    def __init__(self):
+        self._master, self._slave = os.openpty()
+        # Raw mode, so no CR/LF translation or echo gets between the two ends
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+    def wait_for_host(self, timeout=None):
+        return True
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self._master, view)
+            view = view[written:]
+
+    def read_available(self):
+        data = bytearray()
+        while select.select([self._master], [], [], 0)[0]:
+            try:
+                chunk = os.read(self._master, CHUNK)
+            except OSError:
+                break
+            if not chunk:
+                break
+            data.extend(chunk)
+        return bytes(data)
+
+    def close(self):
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class SocketTransport:
+    """A one-client TCP server; the kiosk opens .port (a socket:// URL)"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = socket.create_server((host, port))
+        self.port = "socket://%s:%d" % self._server.getsockname()[:2]
+        self._client = None
+
+    def wait_for_host(self, timeout=None):
+        """Block until the kiosk connects; return False on timeout"""
+        if self._client is None:
+            self._server.settimeout(timeout)
+            try:
+                self._client, _ = self._server.accept()
+            except socket.timeout:
+                return False
+            self._client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return True
+
+    def write(self, data):
+        if self._client is not None:
+            self._client.sendall(data)
+
+    def read_available(self):
+        data = bytearray()
+        while self._client is not None and select.select([self._client], [], [], 0)[0]:
+            chunk = self._client.recv(CHUNK)
+            if not chunk:
+                break
+            data.extend(chunk)
+        return bytes(data)
+
+    def close(self):
+        for sock in (self._client, self._server):
+            if sock is not None:
+                sock.close()
+
+
+TRANSPORTS = {"pty": PtyTransport, "socket": SocketTransport}
+
+
+class VirtualReader:
+    """Feed a ReaderEmulator's output to a transport and its commands back in"""
+
+    def __init__(self, transport, emulator=None):
+        self.transport = transport
+        self.emulator = emulator or ReaderEmulator()
+        self.taps = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.transport.port
+
+    def flush(self):
+        """Answer any host commands, then send everything the emulator printed"""
+        with self._lock:
+            commands = self.transport.read_available()
+            if commands:
+                self.emulator.write(commands)
+            if self.emulator.in_waiting:
+                self.transport.write(self.emulator.read(self.emulator.in_waiting))
+
+    def tap(self, uid):
+        """Send one tap (bytes or zero-padded hex) and return when it was written (perf_counter)"""
+        with self._lock:
+            self.emulator.tap(uid)
+            data = self.emulator.read(self.emulator.in_waiting)
+            sent = time.perf_counter()
+            self.transport.write(data)
+            self.taps += 1
+        return sent
+
+    def replay(self, uids, schedule, on_sent=None):
+        """Tap uids[i] at schedule[i] seconds from now; on_sent(uid, perf_counter) after each write"""
+        start = time.perf_counter()
+        for uid, offset in zip(uids, schedule):
+            while not self._stop.is_set():
+                remaining = start + offset - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.flush()
+                time.sleep(min(remaining, 0.01))
+            if self._stop.is_set():
+                return
+            sent = self.tap(uid)
+            if on_sent:
+                on_sent(uid, sent)
+        self.flush()
+
+    def start_replay(self, uids, schedule, on_sent=None):
+        """Run replay() on a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.replay, args=(uids, schedule, on_sent),
+                                        name="virtual-reader", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.transport.close()
+
+
+# Schedules: seconds from the start of the replay for each tap
+
+def steady_schedule(count, rate):
+    return [index / rate for index in range(count)]
+
+
+def burst_schedule(count, burst_size, window, gap, seed=0):
+    """Bell-time bursts: burst_size taps at random moments within window seconds, gap seconds apart"""
+    rng = random.Random(seed)
+    schedule = []
+    burst_start = 0.0
+    while len(schedule) < count:
+        size = min(burst_size, count - len(schedule))
+        schedule.extend(sorted(burst_start + rng.uniform(0, window) for _ in range(size)))
+        burst_start += window + gap
+    return schedule
+
+
+# Tap sources
+
+def uid_bytes(text):
+    """Return card bytes that the host turns back into the stored UID string.
+
+    Stored UIDs drop leading zeros per byte (see reader_protocol.uid_string),
+    so a short string is split into 4 or 7 one- or two-digit bytes.
+    """
+    text = text.upper()
+    for length in (4, 7, 10):
+        parts = _split_uid(text, length)
+        if parts is not None:
+            return bytes(int(part, 16) for part in parts)
+    raise ValueError(f"Cannot express {text!r} as a card UID")
+
+
+def _split_uid(text, length):
+    if length == 0:
+        return [] if not text else None
+    for size in (2, 1):
+        part = text[:size]
+        if len(part) == size and (size == 1 or part[0] != '0'):
+            rest = _split_uid(text[size:], length - 1)
+            if rest is not None:
+                return [part] + rest
+    return None
+
+
+def roster_uids(db_path):
+    """The card UIDs enrolled in a student database, as bytes"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT id FROM students WHERE id IS NOT NULL AND id != ''").fetchall()
+    finally:
+        conn.close()
+    return [uid_bytes(uid) for uid, in rows]
+
+
+def recorded_uids(path):
+    """The UIDs in a raw serial capture (framed or legacy verbose output), as bytes"""
+    framer = LineFramer()
+    uids = []
+    with open(path, 'rb') as file:
+        for line in framer.feed(file.read()):
+            if is_frame(line):
+                try:
+                    frame = decode_frame(line)
+                except ProtocolError:
+                    continue
+                if frame.kind == UID:
+                    uids.append(bytes.fromhex(frame.payload))
+            elif "UID Value:" in line and not line.startswith('#'):
+                uids.append(bytes(int(token, 16) for token in line.split("UID Value:")[1].split()))
+    return uids
+
+
+def synthetic_uids(count, seed=0):
+    """count distinct random 4- and 7-byte UIDs"""
+    rng = random.Random(seed)
+    uids = {}
+    while len(uids) < count:
+        uid = random_uid(rng, rng.choice((4, 7)))
+        uids.setdefault(uid_string(uid), uid)
+    return list(uids.values())
+
+
+def load_source(source, count=None, seed=0):
+    """Resolve a --source value: roster:<db>, recorded:<capture> or synthetic:<count>"""
+    kind, _, argument = source.partition(':')
+    if kind == 'roster':
+        uids = roster_uids(argument or "student_attendance.db")
+    elif kind == 'recorded':
+        uids = recorded_uids(argument)
+    elif kind == 'synthetic':
+        uids = synthetic_uids(int(argument or count or 100), seed)
+    else:
+        raise ValueError(f"Unknown tap source {source!r}")
+    if not uids:
+        raise ValueError(f"No taps in {source!r}")
+    if count:
+        uids = [uids[index % len(uids)] for index in range(count)]
+    return uids
+
+
+# Headless load test
+
+def run_load_test(rates, taps_per_rate, transport="pty", max_lag_ms=500.0, drain_seconds=10.0, directory=None):
+    """Tap fresh students at each rate through ReaderManager -> check_in and report how it kept up"""
+    from PyQt5.QtCore import QCoreApplication, QEventLoop
+    from reader_manager import ReaderConfig, ReaderManager
+    from student_db import StudentDatabase
+    from dashboard_models import AttendanceModel, ChangeFeed
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    path = os.path.join(directory or tempfile.gettempdir(), "virtual_reader_load.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    uids = synthetic_uids(taps_per_rate * len(rates))
+    db = StudentDatabase(path)
+    db.conn.executemany("INSERT INTO students (id, student_id, name) VALUES (?, ?, ?)",
+                        [(uid_string(uid), f"{index:06d}", f"Student {index:06d}") for index, uid in enumerate(uids)])
+    db.conn.commit()
+    db.load_roster()
+    model = AttendanceModel(db, ChangeFeed(db))
+
+    reader = VirtualReader(TRANSPORTS[transport]())
+    manager = ReaderManager([ReaderConfig('Load test', reader.port, 'checkin')])
+    sent_at = {}
+    done_at = {}
+    failures = []
+
+    def handle(uid, reader_name, role, trace=None):
+        # What read_serial does, minus the message boxes
+        if db.get_student_by_uid(uid) is None:
+            failures.append(uid)
+            return
+        success, message = db.check_in(nfc_uid=uid)
+        if not success:
+            failures.append(message)
+        done_at[uid] = time.perf_counter()
+
+    connected = []
+    manager.uid_scanned.connect(handle)
+    manager.connection_changed.connect(lambda name, is_open, port: connected.append(is_open))
+    manager.start()
+    # Opening a port discards its input, so wait until the reader thread is attached
+    ready = reader.transport.wait_for_host(timeout=10)
+    deadline = time.perf_counter() + 10
+    while ready and not connected and time.perf_counter() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 50)
+    if not connected:
+        manager.stop()
+        reader.close()
+        raise RuntimeError(f"Kiosk side never connected to {reader.port}")
+    results = []
+    try:
+        for step, rate in enumerate(rates):
+            batch = uids[step * taps_per_rate:(step + 1) * taps_per_rate]
+            keys = [uid_string(uid) for uid in batch]
+            thread = reader.start_replay(batch, steady_schedule(len(batch), rate),
+                                         lambda uid, sent: sent_at.__setitem__(uid_string(uid), sent))
+            deadline = time.perf_counter() + len(batch) / rate + drain_seconds
+            while time.perf_counter() < deadline and not all(key in done_at for key in keys):
+                app.processEvents(QEventLoop.AllEvents, 50)
+            thread.join()
+            finished = [key for key in keys if key in done_at and key in sent_at]
+            latencies = sorted((done_at[key] - sent_at[key]) * 1000 for key in finished)
+            first = min(sent_at[key] for key in keys if key in sent_at)
+            last = max((done_at[key] for key in finished), default=first)
+            step_result = {
+                "rate": rate,
+                "taps": len(batch),
+                "processed": len(finished),
+                "taps_per_second": len(finished) / (last - first) if last > first else 0.0,
+                "p50_ms": statistics.median(latencies) if latencies else None,
+                "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else None,
+                "max_ms": latencies[-1] if latencies else None,
+            }
+            # Keeping up means every tap landed, throughput matched the offered
+            # rate and no tap waited longer than max_lag_ms
+            step_result["kept_up"] = (step_result["processed"] == len(batch)
+                                      and step_result["taps_per_second"] >= rate * KEEP_UP_RATIO
+                                      and step_result["p99_ms"] <= max_lag_ms)
+            results.append(step_result)
+    finally:
+        manager.stop()
+        reader.close()
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return {"steps": results, "failures": len(failures), "checked_in": model.rowCount()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual NFC reader for testing the kiosk without hardware")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="expose a virtual reader and replay taps to it")
+    serve.add_argument("--transport", choices=sorted(TRANSPORTS), default="pty")
+    serve.add_argument("--source", default="synthetic:100",
+                       help="roster:<db>, recorded:<capture file> or synthetic:<count>")
+    serve.add_argument("--count", type=int, default=None, help="taps to send (cycles through the source)")
+    serve.add_argument("--rate", type=float, default=2.0, help="steady taps per second")
+    serve.add_argument("--burst", type=int, default=None, help="taps per bell-time burst (replaces --rate)")
+    serve.add_argument("--window", type=float, default=5.0, help="seconds each burst is spread over")
+    serve.add_argument("--gap", type=float, default=30.0, help="seconds between bursts")
+    serve.add_argument("--delay", type=float, default=3.0, help="seconds to wait before the first tap")
+    serve.add_argument("--verbose", action="store_true", help="start the emulated reader in verbose mode")
+
+    load = commands.add_parser("loadtest", help="measure sustained taps per second, headless")
+    load.add_argument("--transport", choices=sorted(TRANSPORTS), default="pty")
+    load.add_argument("--rates", default="20,50,100,200,500,1000", help="comma-separated taps per second")
+    load.add_argument("--taps", type=int, default=300, help="taps per rate step")
+    load.add_argument("--max-lag-ms", type=float, default=500.0, help="p99 tap-to-commit latency that still counts as keeping up")
+    load.add_argument("--dir", default=None, help="directory for the scratch database")
+    args = parser.parse_args()
+
+    if args.command == "loadtest":
+        rates = [float(rate) for rate in args.rates.split(",") if rate]
+        report = run_load_test(rates, args.taps, args.transport, args.max_lag_ms, directory=args.dir)
+        sustained = 0.0
+        for step in report["steps"]:
+            p50 = f"{step['p50_ms']:.2f}" if step['p50_ms'] is not None else "-"
+            p99 = f"{step['p99_ms']:.2f}" if step['p99_ms'] is not None else "-"
+            print(f"rate {step['rate']:>7.0f}/s  processed {step['processed']}/{step['taps']}  "
+                  f"{step['taps_per_second']:>7.0f} taps/s  p50 {p50}ms  p99 {p99}ms  "
+                  f"{'ok' if step['kept_up'] else 'FELL BEHIND'}")
+            if step["kept_up"]:
+                sustained = max(sustained, step["rate"])
+        print(f"highest sustained rate: {sustained:.0f} taps/s ({report['failures']} failed taps)")
+        return
+
+    uids = load_source(args.source, args.count)
+    if args.burst:
+        schedule = burst_schedule(len(uids), args.burst, args.window, args.gap)
+    else:
+        schedule = steady_schedule(len(uids), args.rate)
+    reader = VirtualReader(TRANSPORTS[args.transport](), ReaderEmulator(verbose=args.verbose))
+    print(f"virtual reader on {reader.port}; start the kiosk with --port {reader.port}")
+    try:
+        reader.transport.wait_for_host()
+        reader.flush()
+        time.sleep(args.delay)
+        reader.replay(uids, schedule)
+        print(f"sent {reader.taps} taps; Ctrl-C to stop")
+        while True:
+            reader.flush()
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == '__main__':
+    main()